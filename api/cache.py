@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from src.version_stamp import VERSION_FILE, read_version_stamp
+from src.instrumentation import record
+
+# Cache Config
+API_CACHE_BACKEND = os.getenv("API_CACHE_BACKEND", "memory")  # "memory" or "redis"
+API_CACHE_TTL = int(os.getenv("API_CACHE_TTL", 300))  # Seconds
+API_CACHE_MAXSIZE = int(os.getenv("API_CACHE_MAXSIZE", 512))  # Entries, memory backend only
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class InMemoryBackend:
+    """Per-process LRU cache with a TTL per entry."""
+
+    def __init__(self, maxsize=512, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        self.entries[key] = (self.clock() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+class RedisBackend:
+    """
+    Shared backend for multiple API workers. Takes any client exposing async
+    get(key) / set(key, value, ex=ttl), e.g. redis.asyncio.Redis.
+    """
+
+    def __init__(self, client, prefix="api-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+class VersionReader:
+    """Reads the warehouse version stamp, re-reading the file only when its mtime changes."""
+
+    def __init__(self, path=VERSION_FILE):
+        self.path = path
+        self._mtime = None
+        self._version = "0"
+
+    def __call__(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return "0"
+        if mtime != self._mtime:
+            self._version = read_version_stamp(self.path)
+            self._mtime = mtime
+        return self._version
+
+class ResultCache:
+    """
+    Caches report results per endpoint + query params + warehouse version.
+    A new version stamp (written once dbt has rebuilt the marts) changes
+    every key, so stale entries are never served and simply age out.
+    The ETag is derived from the same key, so a client revalidating an
+    unchanged report gets a 304 without the query running.
+    """
+
+    def __init__(self, backend, ttl=300, version=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.version = version or VersionReader()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def make_key(self, endpoint, params):
+        payload = json.dumps(
+            {"endpoint": endpoint, "params": params, "version": self.version()},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_compute(self, request: Request, response: Response, endpoint, params, compute):
+        key = self.make_key(endpoint, params)
+        etag = f'"{key[:32]}"'
+
+        if etag in request.headers.get("if-none-match", ""):
+            self.stats["not_modified"] += 1
+            record(cache_not_modified=1)
+            return Response(status_code=304, headers={"ETag": etag})
+
+        value = await self.backend.get(key)
+        if value is None:
+            self.stats["misses"] += 1
+            record(cache_misses=1)
+            value = await compute()
+            await self.backend.set(key, value, self.ttl)
+        else:
+            self.stats["hits"] += 1
+            record(cache_hits=1)
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        return value
+
+def build_cache():
+    if API_CACHE_BACKEND == "redis":
+        import redis.asyncio as redis  # Optional dependency, only needed for the shared backend
+        return ResultCache(RedisBackend(redis.from_url(REDIS_URL)), ttl=API_CACHE_TTL)
+    return ResultCache(InMemoryBackend(API_CACHE_MAXSIZE), ttl=API_CACHE_TTL)
+
+result_cache = build_cache()
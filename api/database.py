@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -13,16 +15,127 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "medical_warehouse")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Pool Config
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# Sync engine, for scripts and anything that still needs a blocking Session
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+    **POOL_OPTIONS
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (asyncpg) used by the API endpoints, so a slow query does not
+# hold one of Starlette's threadpool workers
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    **POOL_OPTIONS
+)
+
 Base = declarative_base()
 
+class PoolMetrics:
+    """
+    Connection pool counters. A high checkout wait with an idle database means
+    the pool (API side) is the bottleneck; a low wait with slow queries points
+    at the database.
+    """
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_wait_seconds = 0.0
+        self.max_checkout_wait_seconds = 0.0
+
+    def record_wait(self, seconds):
+        self.checkout_wait_seconds += seconds
+        self.max_checkout_wait_seconds = max(self.max_checkout_wait_seconds, seconds)
+
+    def snapshot(self, pool):
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "checkout_wait_seconds_total": round(self.checkout_wait_seconds, 6),
+            "checkout_wait_seconds_avg": round(self.checkout_wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+            "checkout_wait_seconds_max": round(self.max_checkout_wait_seconds, 6),
+        }
+
+pool_metrics = PoolMetrics()
+
+@event.listens_for(async_engine.sync_engine.pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+@event.listens_for(async_engine.sync_engine.pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+
+@event.listens_for(async_engine.sync_engine.pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.checkins += 1
+
+class TimedAsyncSession(AsyncSession):
+    """
+    Acquires its connection lazily, on the first statement, and records how long
+    that took waiting on the pool. Requests answered from the result cache never
+    check out a connection at all.
+    """
+
+    _connection_timed = False
+
+    async def _acquire_connection(self):
+        if not self._connection_timed:
+            self._connection_timed = True
+            started = time.perf_counter()
+            await self.connection()
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+    async def execute(self, *args, **kwargs):
+        await self._acquire_connection()
+        return await super().execute(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        await self._acquire_connection()
+        return await super().stream(*args, **kwargs)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=TimedAsyncSession, expire_on_commit=False, autoflush=False
+)
+
+def get_pool_metrics():
+    return pool_metrics.snapshot(async_engine.sync_engine.pool)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
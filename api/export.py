@@ -0,0 +1,117 @@
+import io
+import os
+import csv
+import json
+from datetime import date, datetime
+
+import pyarrow as pa
+from fastapi import HTTPException
+
+# Export Config
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))  # Rows fetched from the server-side cursor at a time
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+EXPORT_COLUMNS = [
+    "message_id", "channel_name", "message_date", "message_text",
+    "views", "forwards", "has_media", "image_path",
+]
+
+EXPORT_SCHEMA = pa.schema([
+    ("message_id", pa.int64()),
+    ("channel_name", pa.string()),
+    ("message_date", pa.timestamp("us")),
+    ("message_text", pa.string()),
+    ("views", pa.int64()),
+    ("forwards", pa.int64()),
+    ("has_media", pa.bool_()),
+    ("image_path", pa.string()),
+])
+
+def negotiate_format(requested=None, accept=None):
+    """
+    Picks the export format from an explicit ?format= or the Accept header
+    (first supported media type wins), defaulting to NDJSON. Raises 406 for
+    an Accept header that names none of them.
+    """
+    if requested:
+        if requested not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {requested}")
+        return requested
+    if not accept:
+        return "ndjson"
+
+    by_media_type = {media_type: name for name, media_type in EXPORT_FORMATS.items()}
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in by_media_type:
+            return by_media_type[media_type]
+        if media_type in ("*/*", "application/*", "application/json"):
+            return "ndjson"
+    raise HTTPException(
+        status_code=406, detail=f"Supported export types: {', '.join(EXPORT_FORMATS.values())}"
+    )
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+def encode_ndjson(rows):
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=_json_value) + "\n"
+        for row in rows
+    ).encode("utf-8")
+
+class BatchEncoder:
+    """
+    Turns batches of row tuples (in EXPORT_COLUMNS order) into chunks of the
+    chosen format. Rows are serialized as they arrive, without per-row model
+    validation; only the current batch is held in memory.
+    """
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.buffer = io.StringIO() if fmt == "csv" else io.BytesIO()
+        self.writer = None
+
+    def start(self):
+        """Bytes that open the stream (CSV header, Arrow schema message)."""
+        if self.fmt == "csv":
+            self.writer = csv.writer(self.buffer)
+            self.writer.writerow(EXPORT_COLUMNS)
+            return self._drain()
+        if self.fmt == "arrow":
+            self.writer = pa.ipc.new_stream(self.buffer, EXPORT_SCHEMA)
+            return self._drain()
+        return b""
+
+    def encode(self, rows):
+        if self.fmt == "ndjson":
+            return encode_ndjson(rows)
+        if self.fmt == "csv":
+            self.writer.writerows(rows)
+            return self._drain()
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        self.writer.write_batch(pa.record_batch(
+            [pa.array(values, type=field.type) for values, field in zip(columns, EXPORT_SCHEMA)],
+            schema=EXPORT_SCHEMA
+        ))
+        return self._drain()
+
+    def finish(self):
+        """Bytes that close the stream (Arrow end-of-stream marker)."""
+        if self.fmt == "arrow":
+            self.writer.close()
+            return self._drain()
+        return b""
+
+    def _drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data.encode("utf-8") if isinstance(data, str) else data
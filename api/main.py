@@ -1,16 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import os
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import List
+from sqlalchemy.exc import ProgrammingError
+from typing import List, Optional
+from datetime import date, datetime
 
-from .database import get_db
+from .database import get_async_db, get_pool_metrics, AsyncSessionLocal
 from .schemas import (
     TopProductResponse, 
     ChannelActivityResponse, 
     VisualContentResponse, 
     SearchResponse,
-    MessageBase
+    SearchResultMessage,
+    PoolMetricsResponse,
+    CacheStatsResponse
 )
+from .pagination import encode_cursor, decode_cursor, escape_like
+from .cache import result_cache
+from .export import EXPORT_FORMATS, EXPORT_BATCH_SIZE, BatchEncoder, negotiate_format
+from src.instrumentation import span, registry
+
+# Expose span/counter aggregates at /metrics in the Prometheus text format
+PROMETHEUS_METRICS = os.getenv("PROMETHEUS_METRICS", "false").lower() == "true"
+UNDEFINED_TABLE = "42P01"  # Postgres SQLSTATE for a missing relation
 
 app = FastAPI(
     title="Medical Telegram Warehouse API",
@@ -18,123 +32,335 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Times every request in an api.request span labelled with its route template and status."""
+    with span("api.request", method=request.method) as request_span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        request_span.labels.update(route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
+if PROMETHEUS_METRICS:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Medical Telegram Warehouse API. Visit /docs for documentation."}
 
 # --- Endpoint 1: Top Products ---
 @app.get("/api/reports/top-products", response_model=List[TopProductResponse])
-def get_top_products(limit: int = 10, db: Session = Depends(get_db)):
+async def get_top_products(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    channel_name: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    products_only: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Returns the most frequently mentioned medical terms/products.
-    Note: Ideally this uses a pre-calculated NLP table. 
-    For now, we will perform a simple keyword frequency on the message text.
+    Reads the pre-aggregated agg_product_mentions_daily mart (built by dbt from
+    fct_product_mentions), so cost depends on the days/channels requested, not
+    on the size of fct_messages. Set products_only=false to include every
+    non-stopword term, not just the product vocabulary.
+    Results are cached until the next warehouse load (see api/cache.py).
     """
-    # This is a simplified example. In production, you'd use a dedicated 'products' dimension or NLP results.
-    # Here we assume products are significant words in the text.
-    query = text("""
+    filters = []
+    params = {"limit": limit}
+    if products_only:
+        filters.append("a.is_product")
+    if channel_name:
+        filters.append("c.channel_name = :channel_name")
+        params["channel_name"] = channel_name
+    if start:
+        filters.append("a.mention_date >= :start")
+        params["start"] = start
+    if end:
+        filters.append("a.mention_date <= :end")
+        params["end"] = end
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    channel_join = "JOIN public.dim_channels c ON a.channel_key = c.channel_key" if channel_name else ""
+
+    query = text(f"""
         SELECT 
-            substring(lower(message_text) from '\\w+') as product_name, 
-            COUNT(*) as mention_count
-        FROM public.fct_messages
-        WHERE message_text IS NOT NULL
-        GROUP BY product_name
-        ORDER BY mention_count DESC
+            a.product_name, 
+            SUM(a.mention_count) as mention_count
+        FROM public.agg_product_mentions_daily a
+        {channel_join}
+        {where}
+        GROUP BY a.product_name
+        ORDER BY mention_count DESC, a.product_name
         LIMIT :limit
     """)
-    results = db.execute(query, {"limit": limit}).fetchall()
-    return [{"product_name": r[0], "mention_count": r[1]} for r in results]
+
+    async def compute():
+        results = (await db.execute(query, params)).fetchall()
+        return [{"product_name": r[0], "mention_count": int(r[1])} for r in results]
+
+    return await result_cache.get_or_compute(request, response, "top-products", params, compute)
 
 # --- Endpoint 2: Channel Activity ---
 @app.get("/api/channels/{channel_name}/activity", response_model=List[ChannelActivityResponse])
-def get_channel_activity(channel_name: str, db: Session = Depends(get_db)):
+async def get_channel_activity(
+    channel_name: str,
+    request: Request,
+    response: Response,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Returns daily posting activity and total views for a specific channel.
+    Returns daily posting activity, views, forwards and media share for a specific channel.
+    Reads the agg_channel_daily mart (one row per channel and day), so cost
+    depends on the date range requested. Results are cached until the next
+    warehouse load.
     """
-    query = text("""
+    filters = ["c.channel_name = :channel_name"]
+    params = {"channel_name": channel_name}
+    if start:
+        filters.append("a.activity_date >= :start")
+        params["start"] = start
+    if end:
+        filters.append("a.activity_date <= :end")
+        params["end"] = end
+
+    query = text(f"""
         SELECT 
-            d.full_date::text as date,
-            COUNT(m.message_id) as message_count,
-            SUM(m.view_count) as total_views
-        FROM public.fct_messages m
-        JOIN public.dim_channels c ON m.channel_key = c.channel_key
-        JOIN public.dim_dates d ON m.date_key = d.date_key
-        WHERE c.channel_name = :channel_name
-        GROUP BY d.full_date
-        ORDER BY d.full_date ASC
+            a.activity_date,
+            a.message_count,
+            a.total_views,
+            a.total_forwards,
+            a.media_share
+        FROM public.agg_channel_daily a
+        JOIN public.dim_channels c ON a.channel_key = c.channel_key
+        WHERE {' AND '.join(filters)}
+        ORDER BY a.activity_date ASC
     """)
-    results = db.execute(query, {"channel_name": channel_name}).fetchall()
-    
-    if not results:
-        raise HTTPException(status_code=404, detail="Channel not found or no data available")
-        
-    return [
-        {"date": str(r[0]), "message_count": r[1], "total_views": r[2] or 0} 
-        for r in results
-    ]
+
+    async def compute():
+        results = (await db.execute(query, params)).fetchall()
+
+        if not results:
+            raise HTTPException(status_code=404, detail="Channel not found or no data available")
+
+        return [
+            {
+                "date": r[0].isoformat(),
+                "message_count": r[1],
+                "total_views": int(r[2]),
+                "total_forwards": int(r[3]),
+                "media_share": float(r[4]),
+            }
+            for r in results
+        ]
+
+    return await result_cache.get_or_compute(request, response, "channel-activity", params, compute)
 
 # --- Endpoint 3: Message Search ---
+SEARCH_COLUMNS = """
+    m.message_id,
+    c.channel_name,
+    m.message_date,
+    m.message_text,
+    m.view_count as views,
+    m.forward_count as forwards,
+    m.channel_key
+"""
+
 @app.get("/api/search/messages", response_model=SearchResponse)
-def search_messages(
+async def search_messages(
     query: str, 
-    limit: int = 20, 
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100), 
+    mode: str = Query("fts", pattern="^(fts|substring)$"),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Searches for messages containing a specific keyword.
+    - fts (default): full-text match on the GIN-indexed search_vector, ranked by ts_rank_cd.
+    - substring: literal ILIKE match served by the pg_trgm index, newest first.
+    Pass the returned next_cursor back as `cursor` to fetch the next page.
     """
-    sql_query = text("""
-        SELECT 
-            m.message_id,
-            c.channel_name,
-            d.full_date + m.created_at::time as message_date,
-            m.message_text,
-            m.view_count as views,
-            m.forward_count as forwards
+    params = {"query": query, "limit": limit}
+
+    if mode == "fts":
+        match = "m.search_vector @@ websearch_to_tsquery('simple', :query)"
+        sort_key = "ts_rank_cd(m.search_vector, websearch_to_tsquery('simple', :query))"
+        count_params = {"query": query}
+    else:
+        match = "m.message_text ILIKE :pattern"
+        sort_key = "m.message_date"
+        params["pattern"] = f"%{escape_like(query)}%"
+        count_params = {"pattern": params["pattern"]}
+
+    keyset = ""
+    if cursor:
+        # (rank, channel_key, message_id) or (message_date, channel_key, message_id)
+        last_sort, last_channel_key, last_message_id = decode_cursor(
+            cursor, (float if mode == "fts" else datetime, str, int)
+        )
+        if mode == "fts":
+            keyset = f"AND ({sort_key}, m.channel_key, m.message_id) < (CAST(:last_sort AS real), :last_channel_key, :last_message_id)"
+        else:
+            keyset = "AND (m.message_date, m.channel_key, m.message_id) < (CAST(:last_sort AS timestamp), :last_channel_key, :last_message_id)"
+        params.update(last_sort=last_sort, last_channel_key=last_channel_key, last_message_id=last_message_id)
+
+    sql_query = text(f"""
+        SELECT {SEARCH_COLUMNS}, {sort_key} as sort_key
         FROM public.fct_messages m
         JOIN public.dim_channels c ON m.channel_key = c.channel_key
-        JOIN public.dim_dates d ON m.date_key = d.date_key
-        WHERE m.message_text ILIKE :search_query
-        ORDER BY d.full_date DESC
+        WHERE {match}
+        {keyset}
+        ORDER BY sort_key DESC, m.channel_key DESC, m.message_id DESC
         LIMIT :limit
     """)
-    results = db.execute(sql_query, {"search_query": f"%{query}%", "limit": limit}).fetchall()
+    results = (await db.execute(sql_query, params)).fetchall()
+
+    count_query = text(f"SELECT COUNT(*) FROM public.fct_messages m WHERE {match}")
+    total_results = (await db.execute(count_query, count_params)).scalar_one()
     
     messages = [
-        MessageBase(
-            message_id=r[0],
-            channel_name=r[1],
-            message_date=r[2],
-            message_text=r[3],
-            views=r[4],
-            forwards=r[5]
+        SearchResultMessage(
+            message_id=r.message_id,
+            channel_name=r.channel_name,
+            message_date=r.message_date,
+            message_text=r.message_text,
+            views=r.views or 0,
+            forwards=r.forwards or 0,
+            rank=r.sort_key if mode == "fts" else None
         ) for r in results
     ]
+
+    next_cursor = None
+    if len(results) == limit:
+        last = results[-1]
+        next_cursor = encode_cursor(last.sort_key, last.channel_key, last.message_id)
     
-    return SearchResponse(total_results=len(messages), results=messages)
+    return SearchResponse(total_results=total_results, results=messages, next_cursor=next_cursor)
 
 # --- Endpoint 4: Visual Content Stats ---
 @app.get("/api/reports/visual-content", response_model=List[VisualContentResponse])
-def get_visual_content_stats(db: Session = Depends(get_db)):
+async def get_visual_content_stats(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Returns statistics about image usage across channels based on YOLO detection.
+    Results are cached until the next warehouse load.
     """
-    # Check if table exists first (in case Task 3 hasn't run yet)
     try:
-        query = text("""
-            SELECT 
-                image_category,
-                COUNT(*) as count,
-                AVG(confidence_scores::float) as avg_confidence -- Simplified casting, assuming single score for primary object
-            FROM public.fct_image_detections
-            GROUP BY image_category
-            ORDER BY count DESC
-        """)
-        results = db.execute(query).fetchall()
-        return [
-            {"image_category": r[0], "count": r[1], "avg_confidence": r[2] or 0.0} 
-            for r in results
-        ]
-    except Exception:
-        # Fallback if table doesn't exist yet
+        return await result_cache.get_or_compute(
+            request, response, "visual-content", {}, lambda: _visual_content_stats(db)
+        )
+    except ProgrammingError as e:
+        # The detections mart does not exist until Task 3 has run. The empty
+        # fallback bypasses the cache, so stats appear as soon as it does.
+        if getattr(e.orig, "sqlstate", None) != UNDEFINED_TABLE:
+            raise
         return []
+
+async def _visual_content_stats(db: AsyncSession):
+    query = text("""
+        SELECT 
+            image_category,
+            COUNT(*) as count,
+            AVG(NULLIF(split_part(confidence_scores, '|', 1), '')::float) as avg_confidence -- Score of the primary (first) object
+        FROM public.fct_image_detections
+        GROUP BY image_category
+        ORDER BY count DESC
+    """)
+    results = (await db.execute(query)).fetchall()
+    return [
+        {"image_category": r[0], "count": r[1], "avg_confidence": r[2] or 0.0}
+        for r in results
+    ]
+
+# --- Endpoint 5: Bulk Export ---
+@app.get("/api/export/messages")
+async def export_messages(
+    request: Request,
+    channel: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv|arrow)$")
+):
+    """
+    Streams messages for whole channel/date slices as NDJSON, CSV or Arrow IPC
+    (?format=, or negotiated from the Accept header; NDJSON by default).
+    Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE and are
+    serialized without per-row model validation, so memory use stays constant
+    however large the extract. `channel` can be repeated; start/end filter
+    on the message date (inclusive).
+    """
+    fmt = negotiate_format(format, request.headers.get("accept"))
+
+    filters = ["TRUE"]
+    params = {}
+    if channel:
+        filters.append("c.channel_name = ANY(:channels)")
+        params["channels"] = channel
+    # date_key (YYYYMMDD) is indexed together with channel_key
+    if start:
+        filters.append("m.date_key >= :start_key")
+        params["start_key"] = int(start.strftime("%Y%m%d"))
+    if end:
+        filters.append("m.date_key <= :end_key")
+        params["end_key"] = int(end.strftime("%Y%m%d"))
+
+    query = text(f"""
+        SELECT
+            m.message_id,
+            c.channel_name,
+            m.message_date,
+            m.message_text,
+            m.view_count,
+            m.forward_count,
+            m.has_media,
+            m.image_path
+        FROM public.fct_messages m
+        JOIN public.dim_channels c ON m.channel_key = c.channel_key
+        WHERE {' AND '.join(filters)}
+        ORDER BY m.channel_key, m.date_key, m.message_id
+    """)
+
+    async def body():
+        encoder = BatchEncoder(fmt)
+        # The request span closes when the headers are sent; this one covers the whole stream
+        with span("api.export", format=fmt) as export_span:
+            # Owned by the stream rather than the request, so it stays open until the last batch
+            async with AsyncSessionLocal() as db:
+                # stream() runs the query on a server-side cursor
+                result = await db.stream(query, params)
+                yield encoder.start()
+                async for rows in result.partitions(EXPORT_BATCH_SIZE):
+                    chunk = encoder.encode(rows)
+                    export_span.add(rows=len(rows), bytes=len(chunk))
+                    yield chunk
+                yield encoder.finish()
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="messages.{fmt}"'}
+    )
+
+# --- Operational: Connection Pool ---
+@app.get("/api/health/pool", response_model=PoolMetricsResponse)
+async def get_pool_stats():
+    """
+    Returns connection pool usage and checkout wait times for the async engine.
+    """
+    return get_pool_metrics()
+
+@app.get("/api/health/cache", response_model=CacheStatsResponse)
+async def get_cache_stats():
+    """
+    Returns result cache hit/miss counts and the warehouse version currently served.
+    """
+    return {**result_cache.stats, "warehouse_version": result_cache.version()}
@@ -0,0 +1,39 @@
+import json
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+
+def encode_cursor(*values):
+    """Opaque keyset cursor: URL-safe base64 of the last row's sort key."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def _cursor_value(value, kind):
+    """Checks one decoded value against its expected type (datetime, float, int or str)."""
+    if kind is datetime:
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+    elif kind is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif isinstance(value, kind) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"Expected {kind.__name__}")
+
+def decode_cursor(cursor, types):
+    """
+    Decodes a cursor produced by encode_cursor into values of the given types
+    (datetimes are parsed from ISO strings), raising 400 if it is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Wrong cursor length")
+        return [_cursor_value(value, kind) for value, kind in zip(values, types)]
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def escape_like(term):
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
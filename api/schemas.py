@@ -25,12 +25,38 @@ class ChannelActivityResponse(BaseModel):
     date: str
     message_count: int
     total_views: int
+    total_forwards: int
+    media_share: float
 
 class VisualContentResponse(BaseModel):
     image_category: str
     count: int
     avg_confidence: float
 
+class SearchResultMessage(MessageBase):
+    rank: Optional[float] = None
+
 class SearchResponse(BaseModel):
     total_results: int
-    results: List[MessageBase]
+    results: List[SearchResultMessage]
+    next_cursor: Optional[str] = None
+
+# --- Operational Models ---
+
+class PoolMetricsResponse(BaseModel):
+    pool_size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    connects: int
+    checkouts: int
+    checkins: int
+    checkout_wait_seconds_total: float
+    checkout_wait_seconds_avg: float
+    checkout_wait_seconds_max: float
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    not_modified: int
+    warehouse_version: str
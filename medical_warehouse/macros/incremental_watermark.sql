@@ -0,0 +1,10 @@
+{% macro incremental_watermark(column) %}
+    {#-
+        Lower bound for the rows an incremental run reprocesses: the high-water mark
+        of `column` in the existing table, minus the `incremental_lookback` overlap.
+        Load timestamps are taken at transaction start, so a load that commits after
+        a build can carry timestamps below that build's high-water mark; the overlap
+        picks such rows up again, and the model's unique_key merge keeps them unique.
+    -#}
+    (select coalesce(max({{ column }}), '1900-01-01') - interval '{{ var("incremental_lookback") }}' from {{ this }})
+{% endmacro %}
@@ -0,0 +1,44 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_key', 'activity_date'],
+    indexes=[
+        {'columns': ['channel_key', 'activity_date'], 'unique': True}
+    ]
+) }}
+
+-- Daily posting activity per channel, read by /api/channels/{channel_name}/activity.
+-- Incremental runs recompute only the (channel, day) groups that received new or
+-- engagement-refreshed messages.
+
+with messages as (
+    select * from {{ ref('fct_messages') }}
+),
+
+{% if is_incremental() %}
+touched as (
+    select distinct channel_key, message_date::date as activity_date
+    from messages
+    where updated_at >= {{ incremental_watermark('updated_at') }}
+),
+{% endif %}
+
+daily as (
+    select
+        m.channel_key,
+        m.message_date::date as activity_date,
+        min(m.date_key) as date_key,
+        count(*) as message_count,
+        coalesce(sum(m.view_count), 0) as total_views,
+        coalesce(sum(m.forward_count), 0) as total_forwards,
+        count(*) filter (where m.has_media) as media_count,
+        round(count(*) filter (where m.has_media)::numeric / count(*), 4) as media_share,
+        max(m.created_at) as created_at,
+        max(m.updated_at) as updated_at
+    from messages m
+    {% if is_incremental() %}
+    join touched t on m.channel_key = t.channel_key and m.message_date::date = t.activity_date
+    {% endif %}
+    group by 1, 2
+)
+
+select * from daily
@@ -0,0 +1,41 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_key', 'mention_date', 'product_name'],
+    indexes=[
+        {'columns': ['mention_date', 'channel_key']},
+        {'columns': ['is_product', 'product_name']}
+    ]
+) }}
+
+-- Daily mention counts per channel and product, read by /api/reports/top-products.
+-- Incremental runs recompute only the (channel, day) groups that received new mentions.
+
+with mentions as (
+    select * from {{ ref('fct_product_mentions') }}
+),
+
+{% if is_incremental() %}
+touched as (
+    select distinct channel_key, mention_date
+    from mentions
+    where created_at >= {{ incremental_watermark('created_at') }}
+),
+{% endif %}
+
+daily as (
+    select
+        m.channel_key,
+        m.mention_date,
+        m.product_name,
+        bool_or(m.is_product) as is_product,
+        max(m.category) as category,
+        count(distinct m.message_id) as mention_count,
+        max(m.created_at) as created_at
+    from mentions m
+    {% if is_incremental() %}
+    join touched t on m.channel_key = t.channel_key and m.mention_date = t.mention_date
+    {% endif %}
+    group by 1, 2, 3
+)
+
+select * from daily
@@ -1,19 +1,71 @@
-with stg as (
-    select * from {{ ref('stg_telegram_messages') }}
+{{ config(
+    materialized='incremental',
+    unique_key='channel_name',
+    indexes=[
+        {'columns': ['channel_key'], 'unique': True}
+    ]
+) }}
+
+-- Incremental runs fold the fct_messages rows merged since the last build into
+-- each channel's row: post and view deltas add to the totals, and first/last
+-- extraction times combine with the current ones. fct_messages records a delta
+-- once per merge, so dim_channels must be built in every run that builds
+-- fct_messages, and fully refreshed together with it.
+
+with messages as (
+    select * from {{ ref('fct_messages') }}
+    {% if is_incremental() %}
+    where merged_at > (select coalesce(max(merged_at), '1900-01-01') from {{ this }})
+    {% endif %}
 ),
 
 channel_stats as (
     select
+        channel_key,
         channel_name,
-        count(*) as total_posts,
+        sum(post_count_delta) as total_posts,
         min(created_at) as first_extracted_at,
         max(created_at) as last_extracted_at,
-        avg(view_count) as avg_views
-    from stg
-    group by 1
+        max(updated_at) as last_updated_at,
+        sum(view_count_delta) as total_views,
+        max(merged_at) as merged_at
+    from messages
+    group by 1, 2
+),
+
+merged as (
+    select
+        s.channel_key,
+        s.channel_name,
+        {% if is_incremental() %}
+        coalesce(c.total_posts, 0) + s.total_posts as total_posts,
+        -- least/greatest ignore the nulls of a channel seen for the first time
+        least(c.first_extracted_at, s.first_extracted_at) as first_extracted_at,
+        greatest(c.last_extracted_at, s.last_extracted_at) as last_extracted_at,
+        greatest(c.last_updated_at, s.last_updated_at) as last_updated_at,
+        coalesce(c.total_views, 0) + s.total_views as total_views,
+        {% else %}
+        s.total_posts,
+        s.first_extracted_at,
+        s.last_extracted_at,
+        s.last_updated_at,
+        s.total_views,
+        {% endif %}
+        s.merged_at
+    from channel_stats s
+    {% if is_incremental() %}
+    left join {{ this }} c on c.channel_key = s.channel_key
+    {% endif %}
 )
 
-select 
-    {{ dbt_utils.generate_surrogate_key(['channel_name']) }} as channel_key,
-    *
-from channel_stats
+select
+    channel_key,
+    channel_name,
+    total_posts,
+    first_extracted_at,
+    last_extracted_at,
+    last_updated_at,
+    total_views::numeric / nullif(total_posts, 0) as avg_views,
+    total_views,
+    merged_at
+from merged
@@ -2,11 +2,13 @@ with dates as (
     {{ dbt_utils.date_spine(
         datepart="day",
         start_date="cast('2024-01-01' as date)",
-        end_date="cast('2026-01-01' as date)"
+        end_date="cast(date_trunc('year', current_date) + interval '2 years' as date)"
     )
     }}
 )
 select
+    to_char(date_day, 'YYYYMMDD')::integer as date_key,
+    date_day::date as full_date,
     date_day,
     extract(year from date_day) as year,
     extract(month from date_day) as month,
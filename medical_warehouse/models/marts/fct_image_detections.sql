@@ -1,34 +1,43 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_key', 'message_id'],
+    indexes=[
+        {'columns': ['channel_key', 'message_id'], 'unique': True},
+        {'columns': ['channel_key']},
+        {'columns': ['date_key']}
+    ]
+) }}
+
 with detections as (
-    select * from {{ source('telegram', 'yolo_detections') }}
+    select
+        *,
+        -- Detections carry the image folder name (no '@'); messages use the @handle
+        case when channel_name like '@%' then channel_name else '@' || channel_name end as message_channel_name
+    from {{ source('telegram', 'yolo_detections') }}
 ),
 
 messages as (
     select * from {{ ref('stg_telegram_messages') }}
 ),
 
-channels as (
-    select * from {{ ref('dim_channels') }}
-),
-
-dates as (
-    select * from {{ ref('dim_dates') }}
-),
-
 final as (
     select
         d.message_id,
-        c.channel_key,
-        dt.date_key,
+        {{ dbt_utils.generate_surrogate_key(['m.channel_name']) }} as channel_key,
+        to_char(m.message_date, 'YYYYMMDD')::integer as date_key,
         d.detected_objects,
         d.confidence_scores,
         d.classification as image_category,
-        d.image_path
+        d.image_path,
+        -- Watermark: a row is reprocessed when either side changes
+        greatest(d.loaded_at, m.created_at) as updated_at
     from detections d
     -- Join to messages to get the date for the date key
-    join messages m on d.message_id = m.message_id and d.channel_name = m.channel_name
-    -- Join to dimensions
-    left join channels c on d.channel_name = c.channel_name
-    left join dates dt on m.message_date::date = dt.full_date
+    join messages m on d.message_id = m.message_id and d.message_channel_name = m.channel_name
+    {% if is_incremental() %}
+    where d.loaded_at >= {{ incremental_watermark('updated_at') }}
+       or m.created_at >= {{ incremental_watermark('updated_at') }}
+    {% endif %}
 )
 
 select * from final
@@ -0,0 +1,60 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_key', 'message_id', 'token'],
+    indexes=[
+        {'columns': ['created_at']},
+        {'columns': ['product_name', 'mention_date']}
+    ]
+) }}
+
+-- One row per distinct (message, token), tokenized when the message first reaches
+-- fct_messages; later runs only tokenize messages loaded since the previous build
+-- (plus the incremental_lookback overlap, which the merge deduplicates).
+
+with messages as (
+    select
+        message_id,
+        channel_key,
+        message_date,
+        message_text,
+        created_at
+    from {{ ref('fct_messages') }}
+    where message_text is not null
+    {% if is_incremental() %}
+      and created_at >= {{ incremental_watermark('created_at') }}
+    {% endif %}
+),
+
+tokens as (
+    select distinct
+        m.message_id,
+        m.channel_key,
+        m.message_date::date as mention_date,
+        m.created_at,
+        t.token
+    from messages m
+    cross join lateral regexp_split_to_table(lower(m.message_text), '\W+') as t(token)
+    where length(t.token) >= 3
+      and t.token !~ '^[0-9]+$'
+),
+
+stopwords as (
+    select word from {{ ref('stopwords') }}
+),
+
+vocabulary as (
+    select term, product_name, category from {{ ref('product_vocabulary') }}
+)
+
+select
+    tk.message_id,
+    tk.channel_key,
+    tk.mention_date,
+    tk.token,
+    coalesce(v.product_name, tk.token) as product_name,
+    v.category,
+    v.term is not null as is_product,
+    tk.created_at
+from tokens tk
+left join vocabulary v on tk.token = v.term
+where not exists (select 1 from stopwords s where s.word = tk.token)
@@ -14,7 +14,10 @@ renamed as (
         views as view_count,
         forwards as forward_count,
         length(message_text) as message_length,
-        created_at
+        created_at,
+        engagement_updated_at,
+        -- Last time the row changed: first load, or an engagement refresh of its views/forwards
+        greatest(created_at, engagement_updated_at) as updated_at
     from source
     where message_id is not null
 )
@@ -4,54 +4,202 @@
 
 import os
 import sys
-from dagster import asset, Output, MetadataValue
+import asyncio
+import subprocess
+from datetime import date
+from dagster import (
+    asset, Output, MetadataValue, AssetObservation,
+    DailyPartitionsDefinition, StaticPartitionsDefinition, MultiPartitionsDefinition
+)
 
-# Add the project root to the python path so we can import src/scripts
+# Add the project root to the python path so we can import src/scripts, and
+# src/ itself, whose modules import each other as top-level modules (e.g. config)
 sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "src"))
 
 from src.scraper import TelegramScraper
-from scripts.load_to_postgres import load_json_to_postgres
+from scripts.load_to_postgres import load_json_to_postgres, load_engagement_to_postgres
 from src.yolo_detect import main as yolo_main
-from scripts.load_yolo_to_postgres import load_csv as load_yolo_csv
+from scripts.load_yolo_to_postgres import load_detections as load_yolo_detections
+from scripts.compact_lake import compact_lake
+from src.version_stamp import write_version_stamp
+from src.config import CHANNELS
 
-@asset
+# One partition per channel per day, so backfills fan out across channel-days
+# and a failed channel-day can be retried on its own
+PIPELINE_START_DATE = os.getenv("PIPELINE_START_DATE", "2025-01-01")
+channel_day_partitions = MultiPartitionsDefinition({
+    "date": DailyPartitionsDefinition(start_date=PIPELINE_START_DATE),
+    "channel": StaticPartitionsDefinition(CHANNELS),
+})
+
+def scrape_metadata(channel, stats):
+    duration = stats["duration_seconds"]
+    return {
+        "channel": channel,
+        "messages_scraped": stats["messages"],
+        "segments_written": stats["segments"],
+        "images_downloaded": stats["images_downloaded"],
+        "images_skipped": stats["images_skipped"],
+        "images_failed": stats["images_failed"],
+        "images_duplicate": stats["images_duplicate"],
+        "duplicate_ratio": round(stats["images_duplicate"] / stats["images_downloaded"], 4)
+            if stats["images_downloaded"] else 0.0,
+        "bytes_downloaded": stats["bytes"],
+        "duration_seconds": duration,
+        "messages_per_second": round(stats["messages"] / duration, 1) if duration else 0.0,
+    }
+
+def partition_keys(context):
+    """Returns the (date, channel) of the partition being materialized."""
+    keys = context.partition_key.keys_by_dimension
+    return keys["date"], keys["channel"]
+
+@asset(partitions_def=channel_day_partitions)
 def scrape_telegram(context):
     """
-    Scrapes Telegram channels and saves JSON/Images to data lake.
-    """
-    context.log.info("Starting Telegram Scraper...")
-    # NOTE: In a real production run, you might want to call the async main loop properly. 
-    # For now, we assume the scraper class usage or a simplified sync wrapper.
-    # Given the scraper is async, we might need a subprocess call or asyncio.run if not handled by the script.
-    
-    # Running via subprocess to ensure clean async loop handling and environment isolation if needed
-    import subprocess
-    result = subprocess.run(["python", "src/scraper.py"], capture_output=True, text=True)
-    
-    if result.returncode != 0:
-        raise Exception(f"Scraper failed: {result.stderr}")
-    
-    context.log.info(result.stdout)
-    return Output(None, metadata={"status": "Scraping complete"})
+    Scrapes one channel's messages for one day and saves JSON/Images to data lake.
+    Runs in-process; the Telethon session file (TG_SESSION_PATH) persists the login
+    between runs, and per-channel progress streams to Dagster while scraping.
+    Runs of the jobs that scrape are tagged so only one uses the session at a time.
+    """
+    day, channel = partition_keys(context)
+    context.log.info(f"Starting Telegram Scraper for {channel} on {day}...")
+
+    def on_progress(channel_name, stats):
+        if not stats["done"]:
+            context.log.info(
+                f"{channel_name}: {stats['messages']} messages, {stats['images_downloaded']} images "
+                f"({stats['bytes'] / (1024 * 1024):.1f} MB) after {stats['duration_seconds']:.1f}s"
+            )
+            return
+        context.log_event(AssetObservation(
+            asset_key=context.asset_key,
+            partition=context.partition_key,
+            metadata=scrape_metadata(channel_name, stats),
+        ))
+
+    scraper = TelegramScraper(on_progress=on_progress)
+    limiter_metrics = asyncio.run(scraper.run([channel], date.fromisoformat(day)))
+
+    stats = scraper.channel_stats.get(channel)
+    if stats is None or stats["error"]:
+        raise Exception(f"Scraper failed for {channel} on {day}: {stats['error'] if stats else 'no result'}")
+
+    return Output(None, metadata={
+        "status": "Scraping complete",
+        **scrape_metadata(channel, stats),
+        "flood_waits": limiter_metrics["flood_waits"],
+        "rate_limit_wait_seconds": round(limiter_metrics["wait_seconds"], 3),
+    })
 
 @asset(deps=[scrape_telegram])
+def compact_lake_parquet(context):
+    """
+    Compacts new lake files into Parquet partitioned by channel and date for offline analytics.
+    """
+    context.log.info("Compacting lake to Parquet...")
+    stats = compact_lake()
+
+    return Output(None, metadata={
+        "status": "Lake compacted",
+        "files_compacted": stats["files_compacted"],
+        "files_skipped": stats["files_skipped"],
+        "rows_read": stats["rows_read"],
+        "partitions_written": stats["partitions_written"],
+    })
+
+@asset(deps=[scrape_telegram], partitions_def=channel_day_partitions)
 def load_raw_data(context):
     """
-    Loads raw JSON data from data lake to PostgreSQL.
+    Loads the partition's raw JSON data from data lake to PostgreSQL.
     """
-    context.log.info("Loading JSON to Postgres...")
-    load_json_to_postgres()
-    return Output(None, metadata={"status": "Raw data loaded"})
+    day, channel = partition_keys(context)
+    context.log.info(f"Loading JSON to Postgres for {channel} on {day}...")
+    stats = load_json_to_postgres(partition_date=day, channel=channel)
+    if stats is None:
+        raise Exception("Raw data load failed, see loader output for details.")
+
+    return Output(None, metadata={
+        "status": "Raw data loaded",
+        "files_loaded": stats["files_loaded"],
+        "files_skipped": stats["files_skipped"],
+        "rows_read": stats["rows_read"],
+        "rows_inserted": stats["rows_inserted"],
+        "rows_per_second": stats["rows_per_second"],
+    })
 
 @asset(deps=[load_raw_data])
+def refresh_engagement(context):
+    """
+    Re-polls views/forwards for every channel's most recent messages and
+    bulk-updates them in raw.telegram_messages, so view-based reports stay
+    current without re-scraping history.
+    """
+    context.log.info("Refreshing engagement for recent messages...")
+    scraper = TelegramScraper()
+    limiter_metrics = asyncio.run(scraper.run(refresh=True))
+    failed = {channel: stats["error"] for channel, stats in scraper.channel_stats.items() if stats["error"]}
+    for channel, error in failed.items():
+        context.log.warning(f"Engagement refresh failed for {channel}: {error}")
+
+    stats = load_engagement_to_postgres()
+    if stats is None:
+        raise Exception("Engagement load failed, see loader output for details.")
+
+    return Output(None, metadata={
+        "status": "Engagement refreshed",
+        "messages_polled": sum(s["messages"] for s in scraper.channel_stats.values()),
+        "channels_failed": len(failed),
+        "rows_updated": stats["rows_updated"],
+        "rows_per_second": stats["rows_per_second"],
+        "requests": limiter_metrics["requests"],
+    })
+
+@asset(deps=[load_raw_data], partitions_def=channel_day_partitions)
 def enrich_data_yolo(context):
     """
-    Runs YOLO detection on images and loads results to Postgres.
+    Runs YOLO detection on the partition's images and loads results to Postgres.
     """
-    context.log.info("Running YOLO Enrichment...")
-    yolo_main() # Runs detection -> saves CSV
-    
-    context.log.info("Loading YOLO results to Postgres...")
-    load_yolo_csv() # Loads CSV -> Postgres
-    
-    return Output(None, metadata={"status": "Enrichment complete"})
+    day, channel = partition_keys(context)
+
+    context.log.info(f"Running YOLO Enrichment for {channel} on {day}...")
+    # Detections stream straight into Postgres via COPY; no shared CSV for concurrent partitions to race on
+    stats = yolo_main(channel=channel, day=day, sink=load_yolo_detections)
+    if stats is None:
+        raise Exception("YOLO enrichment failed, see the detection log for details.")
+    load_stats = stats.get("load", {})
+
+    return Output(None, metadata={
+        "status": "Enrichment complete",
+        "images_inferred": stats.get("inferred", 0),
+        "cache_hits": stats.get("cache_hits", 0),
+        "images_unchanged": stats.get("unchanged", 0),
+        "images_per_second": stats.get("images_per_second", 0.0),
+        "rows_loaded": load_stats.get("rows_upserted", 0),
+        "load_rows_per_second": load_stats.get("rows_per_second", 0.0),
+    })
+
+@asset(deps=[load_raw_data, enrich_data_yolo, refresh_engagement])
+def dbt_marts(context):
+    """
+    Rebuilds the dbt marts (incrementally) from the raw tables, then stamps a
+    new warehouse version. The API's cached reports read the marts, so the
+    stamp is only written once they hold the newly loaded data; stamping at
+    load time would let a request cache pre-dbt results under the new version.
+    """
+    project_dir = os.path.join(os.getcwd(), "medical_warehouse")
+    context.log.info("Running dbt...")
+    result = subprocess.run(
+        ["dbt", "run", "--project-dir", project_dir, "--profiles-dir", project_dir],
+        capture_output=True, text=True
+    )
+    context.log.info(result.stdout[-5000:])
+    if result.returncode != 0:
+        raise Exception(f"dbt run failed:\n{result.stdout[-2000:]}{result.stderr[-2000:]}")
+
+    version = write_version_stamp("dbt_marts")
+    return Output(None, metadata={
+        "status": "Marts rebuilt",
+        "warehouse_version": version,
+    })
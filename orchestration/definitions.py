@@ -9,5 +9,9 @@ all_assets = load_assets_from_modules([assets])
 
 defs = Definitions(
     assets=all_assets,
-    jobs=[jobs.daily_pipeline_job],
+    jobs=[jobs.scrape_job, jobs.daily_pipeline_job, jobs.lake_compaction_job, jobs.engagement_refresh_job,
+          jobs.warehouse_transform_job],
+    schedules=[jobs.daily_pipeline_schedule, jobs.engagement_refresh_schedule,
+               jobs.warehouse_transform_schedule],
+    sensors=[jobs.load_after_scrape_sensor, jobs.transform_after_refresh_sensor],
 )
@@ -1,7 +1,74 @@
-from dagster import define_asset_job, AssetSelection
+from dagster import (
+    define_asset_job, AssetSelection, ScheduleDefinition, build_schedule_from_partitioned_job,
+    run_status_sensor, DagsterRunStatus, RunRequest
+)
+from .assets import channel_day_partitions
+
+# Runs that use the Telegram client share one session file; dagster_home/dagster.yaml
+# limits the queued run coordinator to one run with this tag at a time. Only the
+# scraping jobs carry it, so loads and YOLO enrichment still run in parallel.
+TELEGRAM_SESSION_TAGS = {"telegram/session": "scraper"}
 
-# Define a job that materializes all our assets
+# Scrapes one channel-day partition; serialized through the session tag
+scrape_job = define_asset_job(
+    name="scrape_job",
+    selection=AssetSelection.assets("scrape_telegram"),
+    partitions_def=channel_day_partitions,
+    tags=TELEGRAM_SESSION_TAGS
+)
+
+# Loads and enriches one channel-day partition, started for each successful scrape
 daily_pipeline_job = define_asset_job(
     name="daily_pipeline_job",
-    selection=AssetSelection.all()
+    selection=AssetSelection.assets("load_raw_data", "enrich_data_yolo"),
+    partitions_def=channel_day_partitions
+)
+
+# Compaction spans every partition, so it runs as its own unpartitioned job
+lake_compaction_job = define_asset_job(
+    name="lake_compaction_job",
+    selection=AssetSelection.assets("compact_lake_parquet")
+)
+
+# Runs every channel for the previous day, once that day is complete
+daily_pipeline_schedule = build_schedule_from_partitioned_job(scrape_job)
+
+@run_status_sensor(
+    run_status=DagsterRunStatus.SUCCESS, monitored_jobs=[scrape_job], request_job=daily_pipeline_job
+)
+def load_after_scrape_sensor(context):
+    """Queues the load/enrich run for the partition a scrape run just finished."""
+    partition_key = context.dagster_run.tags.get("dagster/partition")
+    if partition_key:
+        return RunRequest(run_key=context.dagster_run.run_id, partition_key=partition_key)
+
+# Views/forwards keep growing for days after a post; re-poll recent messages a few times a day
+engagement_refresh_job = define_asset_job(
+    name="engagement_refresh_job",
+    selection=AssetSelection.assets("refresh_engagement"),
+    tags=TELEGRAM_SESSION_TAGS
+)
+
+engagement_refresh_schedule = ScheduleDefinition(
+    job=engagement_refresh_job,
+    cron_schedule="0 */6 * * *"
+)
+
+# The marts (and the API cache version) are rebuilt once the day's partitions have loaded
+warehouse_transform_job = define_asset_job(
+    name="warehouse_transform_job",
+    selection=AssetSelection.assets("dbt_marts")
+)
+
+warehouse_transform_schedule = ScheduleDefinition(
+    job=warehouse_transform_job,
+    cron_schedule="0 3 * * *"
+)
+
+@run_status_sensor(
+    run_status=DagsterRunStatus.SUCCESS, monitored_jobs=[engagement_refresh_job],
+    request_job=warehouse_transform_job
 )
+def transform_after_refresh_sensor(context):
+    """Rebuilds the marts after an engagement refresh, outside the session-tagged run."""
+    return RunRequest(run_key=context.dagster_run.run_id)
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import psycopg2
+from dotenv import load_dotenv
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+sys.path.extend([PROJECT_ROOT, os.path.join(PROJECT_ROOT, "src"), SCRIPTS_DIR])
+from generate_synthetic_data import generate, synthetic_channels
+from benchmark_search import percentile
+
+load_dotenv()
+
+RESULTS_PATH = os.path.join(PROJECT_ROOT, "benchmarks", "results.jsonl")
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "medical_bench")
+REGRESSION_THRESHOLD = 0.2  # Flag stages that got >20% slower than the previous comparable run
+
+# Marts the API reads from public.*; dbt builds them in its target schema (raw)
+API_RELATIONS = ["dim_channels", "dim_dates", "fct_messages", "fct_image_detections",
+                 "agg_product_mentions_daily", "agg_channel_daily"]
+
+def admin_connection():
+    conn = psycopg2.connect(
+        dbname="postgres",
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432")
+    )
+    conn.autocommit = True
+    return conn
+
+def recreate_database(name):
+    """Drops and recreates the benchmark database, so every run starts from the same empty state."""
+    if name == os.getenv("DB_NAME") or name == os.getenv("POSTGRES_DB"):
+        raise ValueError(f"Refusing to recreate {name}: it is the configured warehouse database.")
+    conn = admin_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE);')
+        cursor.execute(f'CREATE DATABASE "{name}";')
+    finally:
+        conn.close()
+
+def point_environment_at(db_name, workdir):
+    """Routes every module's DB settings (read at import time) and runtime files to the benchmark."""
+    os.environ.update({
+        "DB_NAME": db_name,
+        "POSTGRES_DB": db_name,
+        "POSTGRES_USER": os.getenv("DB_USER", os.getenv("POSTGRES_USER", "postgres")),
+        "POSTGRES_PASSWORD": os.getenv("DB_PASSWORD", os.getenv("POSTGRES_PASSWORD", "postgres")),
+        "POSTGRES_HOST": os.getenv("DB_HOST", os.getenv("POSTGRES_HOST", "localhost")),
+        "POSTGRES_PORT": os.getenv("DB_PORT", os.getenv("POSTGRES_PORT", "5432")),
+        "API_CACHE_TTL": "0",  # Measure the queries, not the result cache
+        "METRICS_LOG_PATH": os.path.join(workdir, "logs", "metrics.jsonl"),
+        "WAREHOUSE_VERSION_FILE": os.path.join(workdir, "data", "warehouse_version.json"),
+    })
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def bench_load_json():
+    from load_to_postgres import load_json_to_postgres
+    stats, seconds = timed(load_json_to_postgres)
+    if stats is None:
+        raise RuntimeError("load_json_to_postgres failed")
+    return {"seconds": round(seconds, 3), "rows": stats["rows_read"], "rows_per_second": stats["rows_per_second"]}
+
+def bench_yolo():
+    from yolo_detect import main as yolo_main
+    stats, seconds = timed(yolo_main)
+    if stats is None:
+        raise RuntimeError("yolo_detect.main failed")
+    return {"seconds": round(seconds, 3), "images": stats["images"], "images_per_second": stats["images_per_second"]}
+
+def bench_yolo_load():
+    from load_yolo_to_postgres import load_csv
+    stats, seconds = timed(load_csv)
+    if stats is None:
+        raise RuntimeError("load_yolo_to_postgres.load_csv failed")
+    return {"seconds": round(seconds, 3), "rows": stats["rows_read"], "rows_per_second": stats["rows_per_second"]}
+
+def bench_dbt(db_name):
+    env = {**os.environ, "DB_NAME": db_name}
+    project_dir = os.path.join(PROJECT_ROOT, "medical_warehouse")
+    started = time.perf_counter()
+    for command in (["dbt", "seed"], ["dbt", "run"]):
+        subprocess.run(
+            command + ["--project-dir", project_dir, "--profiles-dir", project_dir],
+            env=env, check=True, capture_output=True, text=True
+        )
+    return {"seconds": round(time.perf_counter() - started, 3)}
+
+def expose_marts_for_api():
+    """Creates public views over the dbt marts, which the API reads from public.*; returns what is missing."""
+    from load_to_postgres import get_connection
+    conn = get_connection()
+    missing = []
+    try:
+        cursor = conn.cursor()
+        for relation in API_RELATIONS:
+            cursor.execute("SELECT to_regclass(%s)", (f"raw.{relation}",))
+            if cursor.fetchone()[0] is None:
+                missing.append(relation)
+                continue
+            cursor.execute(f"CREATE OR REPLACE VIEW public.{relation} AS SELECT * FROM raw.{relation};")
+        conn.commit()
+    finally:
+        conn.close()
+    return missing
+
+def bench_api(requests, channel):
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    endpoints = {
+        "top_products": ("/api/reports/top-products", {"limit": 10}),
+        "channel_activity": (f"/api/channels/{channel}/activity", {}),
+        "visual_content": ("/api/reports/visual-content", {}),
+        "search_fts": ("/api/search/messages", {"query": "paracetamol delivery", "limit": 20}),
+    }
+    results = {}
+    # Entered as a context manager so pooled asyncpg connections stay on one event loop
+    client = TestClient(app).__enter__()
+    try:
+        for name, (path, params) in endpoints.items():
+            client.get(path, params=params)  # Warm the pool
+            timings = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(path, params=params)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+            results[name] = {"p50_ms": round(percentile(timings, 50), 3), "p95_ms": round(percentile(timings, 95), 3)}
+    finally:
+        client.__exit__(None, None, None)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def stage_cost(metrics):
+    """The number compared between runs: wall time for batch stages, p50 latency for endpoints."""
+    return metrics.get("seconds", metrics.get("p50_ms"))
+
+def load_history(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(current, history, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares a run with the latest earlier run that used the same parameters.
+    Returns (baseline, [(stage, old, new, change), ...]) where change is the
+    relative slowdown; stages slower than `threshold` are regressions.
+    """
+    baseline = next((r for r in reversed(history) if r["params"] == current["params"]), None)
+    if baseline is None:
+        return None, []
+    rows = []
+    for stage, metrics in current["results"].items():
+        old = baseline["results"].get(stage)
+        if not old or not stage_cost(old) or stage_cost(metrics) is None:
+            continue
+        change = stage_cost(metrics) / stage_cost(old) - 1
+        rows.append((stage, stage_cost(old), stage_cost(metrics), change))
+    return baseline, rows
+
+def flatten(results):
+    flat = {}
+    for stage, metrics in results.items():
+        if stage == "api":
+            for endpoint, latency in metrics.items():
+                flat[f"api.{endpoint}"] = latency
+        else:
+            flat[stage] = metrics
+    return flat
+
+def run_suite(channels, messages, image_ratio, api_requests, db_name, run_dbt, workdir):
+    recreate_database(db_name)
+    point_environment_at(db_name, workdir)
+
+    print(f"Generating {channels} channels x {messages:,} messages in {workdir}...")
+    data_stats, seconds = timed(generate, workdir, channels, messages, image_ratio)
+    print(f"  {data_stats['messages']:,} messages, {data_stats['images']:,} images in {seconds:.2f}s")
+
+    # The pipeline modules resolve data/ and logs/ relative to the working directory
+    os.chdir(workdir)
+    results = {}
+    results["load_json"] = bench_load_json()
+    results["yolo"] = bench_yolo()
+    results["yolo_load"] = bench_yolo_load()
+    if run_dbt:
+        results["dbt"] = bench_dbt(db_name)
+
+    missing = expose_marts_for_api()
+    if missing:
+        print(f"Skipping API benchmark, marts not built: {', '.join(missing)} (run with --dbt)")
+    else:
+        results["api"] = bench_api(api_requests, synthetic_channels(1)[0])
+    return data_stats, flatten(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the loaders, YOLO enrichment and API on synthetic data.")
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=1000, help="Messages per channel.")
+    parser.add_argument("--image-ratio", type=float, default=0.3)
+    parser.add_argument("--api-requests", type=int, default=50, help="Timed requests per endpoint.")
+    parser.add_argument("--db", default=BENCH_DB_NAME, help="Scratch database, dropped and recreated on every run.")
+    parser.add_argument("--dbt", action="store_true", help="Build the marts with dbt so the API endpoints can be measured.")
+    parser.add_argument("--workdir", help="Directory for the synthetic lake (default: a temp dir, removed afterwards).")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the run is appended to.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any stage regressed.")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="telegram-bench-"))
+    results_path = os.path.abspath(args.results)
+    try:
+        data_stats, results = run_suite(
+            args.channels, args.messages, args.image_ratio, args.api_requests, args.db, args.dbt, workdir
+        )
+    finally:
+        os.chdir(PROJECT_ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "params": {"channels": args.channels, "messages": args.messages, "image_ratio": args.image_ratio,
+                   "api_requests": args.api_requests, "dbt": args.dbt},
+        "data": data_stats,
+        "results": results,
+    }
+    baseline, rows = compare(run, load_history(results_path), args.threshold)
+
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    print(f"\n{'stage':<24}{'result':>40}")
+    for stage, metrics in results.items():
+        print(f"{stage:<24}{', '.join(f'{k}={v}' for k, v in metrics.items()):>40}")
+
+    regressions = [r for r in rows if r[3] > args.threshold]
+    if baseline:
+        print(f"\nCompared with {baseline['commit']} ({baseline['ts']}):")
+        for stage, old, new, change in rows:
+            flag = "  REGRESSION" if change > args.threshold else ""
+            print(f"  {stage:<24}{old:>10} -> {new:<10} ({change:+.0%}){flag}")
+    else:
+        print("\nNo earlier run with the same parameters to compare against.")
+    print(f"Appended results to {results_path}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,123 @@
+import os
+import time
+import random
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# DB Config
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+# Words the synthetic messages are built from; also used as search terms
+VOCABULARY = [
+    "paracetamol", "amoxicillin", "vitamin", "serum", "cream", "lotion", "insulin",
+    "ibuprofen", "sunscreen", "shampoo", "syrup", "tablet", "capsule", "delivery",
+    "price", "discount", "available", "pharmacy", "original", "stock", "addis",
+    "bole", "order", "call", "new", "skin", "hair", "baby", "mask", "gel"
+]
+
+def get_connection():
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+
+def build_dataset(cursor, rows):
+    """Generates `rows` synthetic messages server-side, shaped like fct_messages, with its indexes."""
+    print(f"Generating {rows:,} synthetic messages in bench.fct_messages...")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS bench;")
+    cursor.execute("DROP TABLE IF EXISTS bench.fct_messages;")
+    cursor.execute("""
+        CREATE TABLE bench.fct_messages AS
+        SELECT
+            g AS message_id,
+            md5((g %% 50)::text) AS channel_key,
+            timestamp '2024-01-01' + (g %% 700) * interval '1 day' + (g %% 86400) * interval '1 second' AS message_date,
+            (
+                SELECT string_agg(w[1 + floor(random() * array_length(w, 1))::int], ' ')
+                FROM generate_series(1, 12 + (g %% 20)), (SELECT %s::text[] AS w) v
+            ) AS message_text,
+            (random() * 5000)::int AS view_count
+        FROM generate_series(1, %s) g;
+    """, (VOCABULARY, rows))
+    cursor.execute("ALTER TABLE bench.fct_messages ADD COLUMN search_vector tsvector;")
+    cursor.execute("UPDATE bench.fct_messages SET search_vector = to_tsvector('simple', coalesce(message_text, ''));")
+    cursor.execute("CREATE INDEX ON bench.fct_messages USING gin (search_vector);")
+    cursor.execute("CREATE INDEX ON bench.fct_messages USING gin (message_text gin_trgm_ops);")
+    cursor.execute("ANALYZE bench.fct_messages;")
+
+QUERIES = {
+    # The original endpoint: unindexed leading-wildcard ILIKE, newest first
+    "ilike_seqscan": """
+        SET LOCAL enable_bitmapscan = off;
+        SELECT message_id FROM bench.fct_messages
+        WHERE message_text ILIKE %(pattern)s
+        ORDER BY message_date DESC LIMIT 20
+    """,
+    "substring_trgm": """
+        SELECT message_id FROM bench.fct_messages
+        WHERE message_text ILIKE %(pattern)s
+        ORDER BY message_date DESC, channel_key DESC, message_id DESC LIMIT 20
+    """,
+    "fts_ranked": """
+        SELECT message_id, ts_rank_cd(search_vector, websearch_to_tsquery('simple', %(term)s)) AS rank
+        FROM bench.fct_messages
+        WHERE search_vector @@ websearch_to_tsquery('simple', %(term)s)
+        ORDER BY rank DESC, channel_key DESC, message_id DESC LIMIT 20
+    """,
+    "fts_count": """
+        SELECT count(*) FROM bench.fct_messages
+        WHERE search_vector @@ websearch_to_tsquery('simple', %(term)s)
+    """,
+}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def run_benchmark(cursor, queries, seed=42):
+    rng = random.Random(seed)
+    # Two-word phrases keep result sets realistic instead of matching every row
+    terms = [" ".join(rng.sample(VOCABULARY, 2)) for _ in range(queries)]
+    results = {}
+    for name, sql in QUERIES.items():
+        timings = []
+        for term in terms:
+            params = {"term": term, "pattern": f"%{term}%"}
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+            cursor.connection.rollback()  # Resets SET LOCAL
+        results[name] = (percentile(timings, 50), percentile(timings, 99))
+        print(f"{name:<16} p50={results[name][0]:8.2f} ms   p99={results[name][1]:8.2f} ms")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p50/p99 latency of message search strategies on synthetic data.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--reuse", action="store_true", help="Reuse bench.fct_messages from a previous run.")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if not args.reuse:
+            build_dataset(cursor, args.rows)
+            conn.commit()
+        run_benchmark(cursor, args.queries)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Allow imports from src/ when run as a script or from Dagster
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from jsonl_sink import iter_lake_records
+
+RAW_DATA_PATH = "data/raw/telegram_messages"
+PARQUET_PATH = "data/processed/telegram_messages_parquet"
+MANIFEST_NAME = "_manifest.json"
+# Rows buffered before the touched partitions are written out, bounding memory however large the lake
+COMPACT_BATCH_ROWS = int(os.getenv("COMPACT_BATCH_ROWS", 100000))
+
+# Legacy JSON arrays plus the scraper's line-delimited segments
+LAKE_FILE_SUFFIXES = (".json", ".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+# Stable on-disk schema: every partition file has exactly these columns, in this order
+MESSAGE_SCHEMA = pa.schema([
+    ("message_id", pa.int64()),
+    ("channel_name", pa.string()),
+    ("message_date", pa.timestamp("us", tz="UTC")),
+    ("message_text", pa.string()),
+    ("has_media", pa.bool_()),
+    ("image_path", pa.string()),
+    ("views", pa.int64()),
+    ("forwards", pa.int64()),
+])
+
+# Hive partition columns, encoded in the directory names (channel=<name>/date=<YYYY-MM-DD>)
+PARTITION_SCHEMA = pa.schema([
+    ("channel", pa.string()),
+    ("date", pa.date32()),
+])
+
+def parse_message_date(value):
+    """Parses the scraper's str(datetime) into an aware UTC datetime."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def normalize_record(record):
+    """Coerces a lake record to MESSAGE_SCHEMA's column set and types."""
+    return {
+        "message_id": int(record["message_id"]),
+        "channel_name": record.get("channel_name"),
+        "message_date": parse_message_date(record["message_date"]),
+        "message_text": record.get("message_text"),
+        "has_media": bool(record.get("has_media")),
+        "image_path": record.get("image_path"),
+        "views": int(record.get("views") or 0),
+        "forwards": int(record.get("forwards") or 0),
+    }
+
+def partition_dir(root, channel_name, day):
+    return os.path.join(root, f"channel={quote(channel_name, safe='')}", f"date={day.isoformat()}")
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def iter_lake_files(raw_path):
+    """Yields lake files in date-folder order."""
+    for date_folder in sorted(os.listdir(raw_path)):
+        folder_path = os.path.join(raw_path, date_folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for file_name in sorted(os.listdir(folder_path)):
+            if file_name.endswith(LAKE_FILE_SUFFIXES):
+                yield os.path.join(folder_path, file_name)
+
+def write_partition(directory, records):
+    """
+    Merges records into the partition's single data.parquet file. Existing rows
+    are kept unless a record with the same message_id replaces them (newer
+    scrapes carry fresher view/forward counts). Written via temp file + rename.
+    """
+    path = os.path.join(directory, "data.parquet")
+    merged = {}
+    if os.path.exists(path):
+        for row in pq.read_table(path, schema=MESSAGE_SCHEMA).to_pylist():
+            merged[row["message_id"]] = row
+    for record in records:
+        merged[record["message_id"]] = record
+
+    rows = [merged[k] for k in sorted(merged)]
+    table = pa.Table.from_pylist(rows, schema=MESSAGE_SCHEMA)
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, ".data.parquet.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return len(rows)
+
+def compact_lake(raw_path=RAW_DATA_PATH, parquet_path=PARQUET_PATH, full_rebuild=False, batch_rows=COMPACT_BATCH_ROWS):
+    """
+    Compacts new or changed lake files into Parquet partitioned by channel and
+    message date. Files already compacted with the same size/mtime are skipped.
+    Only partitions that receive new records are rewritten. Records are grouped
+    per partition in batches of at most batch_rows, so memory stays bounded; a
+    partition touched by several batches is merged once per batch.
+    Returns a stats dict.
+    """
+    started = time.perf_counter()
+    os.makedirs(parquet_path, exist_ok=True)
+    manifest = {} if full_rebuild else load_manifest(parquet_path)
+    stats = {"files_compacted": 0, "files_skipped": 0, "rows_read": 0, "partitions_written": 0}
+
+    # Group new records by partition, so each partition file is rewritten once per batch
+    pending = {}
+    buffered = 0
+    seen = {}
+
+    def flush():
+        nonlocal pending, buffered
+        for (channel_name, day), records in sorted(pending.items()):
+            write_partition(partition_dir(parquet_path, channel_name, day), records)
+            stats["partitions_written"] += 1
+        pending, buffered = {}, 0
+        # Record files only after their partitions are durable; a crash re-processes them (idempotent)
+        manifest.update(seen)
+        seen.clear()
+        save_manifest(parquet_path, manifest)
+
+    for file_path in iter_lake_files(raw_path):
+        st = os.stat(file_path)
+        if manifest.get(file_path) == [st.st_size, st.st_mtime_ns]:
+            stats["files_skipped"] += 1
+            continue
+
+        for record in iter_lake_records(file_path):
+            if record.get("message_id") is None or not record.get("message_date"):
+                continue
+            row = normalize_record(record)
+            key = (row["channel_name"] or "unknown", row["message_date"].date())
+            pending.setdefault(key, []).append(row)
+            stats["rows_read"] += 1
+            buffered += 1
+            if buffered >= batch_rows:
+                # The current file is recorded by a later flush, once all its rows are written
+                flush()
+
+        seen[file_path] = [st.st_size, st.st_mtime_ns]
+        stats["files_compacted"] += 1
+
+    flush()
+
+    elapsed = time.perf_counter() - started
+    stats["duration_seconds"] = round(elapsed, 3)
+    print(
+        f"Compacted {stats['files_compacted']} files ({stats['rows_read']} messages) into "
+        f"{stats['partitions_written']} partitions, skipped {stats['files_skipped']} unchanged "
+        f"in {elapsed:.2f}s."
+    )
+    return stats
+
+def open_dataset(parquet_path=PARQUET_PATH):
+    """
+    Opens the compacted lake as a pyarrow dataset. Filters on channel/date prune
+    partitions; column selection reads only the requested columns, e.g.
+    open_dataset().to_table(columns=["views"], filter=ds.field("channel") == "@CheMed123")
+    """
+    return ds.dataset(
+        parquet_path,
+        format="parquet",
+        schema=pa.unify_schemas([MESSAGE_SCHEMA, PARTITION_SCHEMA]),
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+        exclude_invalid_files=False,
+        ignore_prefixes=[".", "_"],
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the raw Telegram lake into partitioned Parquet.")
+    parser.add_argument("--raw-path", default=RAW_DATA_PATH, help="Lake root with <date>/ folders.")
+    parser.add_argument("--output", default=PARQUET_PATH, help="Parquet dataset root.")
+    parser.add_argument(
+        "--full-rebuild", action="store_true",
+        help="Ignore the compaction manifest and re-read every lake file."
+    )
+    args = parser.parse_args()
+    compact_lake(args.raw_path, args.output, full_rebuild=args.full_rebuild)
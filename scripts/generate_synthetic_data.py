@@ -0,0 +1,89 @@
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+# Allow imports from src/ and sibling scripts when run as a script or from the benchmark suite
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from jsonl_sink import JsonlSink
+from benchmark_search import VOCABULARY
+
+RAW_DATA_PATH = os.path.join("data", "raw", "telegram_messages")
+IMAGE_DATA_PATH = os.path.join("data", "raw", "images")
+
+def synthetic_channels(count):
+    return [f"@synthetic_channel_{i:03d}" for i in range(count)]
+
+def generate(root, channels=3, messages=1000, image_ratio=0.3, days=30, seed=42,
+             start_date=datetime(2026, 1, 1, tzinfo=timezone.utc), batch_size=100):
+    """
+    Writes `channels` x `messages` synthetic messages under root/ in the scraper's
+    lake layout (data/raw/telegram_messages/<date>/<channel>-<run>-<seq>.jsonl),
+    plus a small dummy .jpg for roughly `image_ratio` of them. Messages are
+    spread over `days` days; the content is deterministic for a given seed.
+    Returns counts of what was written.
+    """
+    rng = random.Random(seed)
+    stats = {"channels": channels, "messages": 0, "images": 0, "image_bytes": 0, "segments": 0}
+    per_day = max(1, messages // days)
+
+    for channel in synthetic_channels(channels):
+        channel_dir = channel.replace("@", "")
+        image_dir = os.path.join(IMAGE_DATA_PATH, channel_dir)
+        os.makedirs(os.path.join(root, image_dir), exist_ok=True)
+        sinks = {}
+
+        for message_id in range(1, messages + 1):
+            posted = start_date + timedelta(
+                days=min(days - 1, (message_id - 1) // per_day), seconds=rng.randrange(86400)
+            )
+            folder = posted.strftime("%Y-%m-%d")
+            if folder not in sinks:
+                sinks[folder] = JsonlSink(
+                    os.path.join(root, RAW_DATA_PATH, folder), channel_dir, batch_size=batch_size
+                )
+
+            image_path = None
+            if rng.random() < image_ratio:
+                image_path = os.path.join(image_dir, f"{message_id}.jpg")
+                payload = rng.randbytes(rng.randint(2_000, 20_000))
+                with open(os.path.join(root, image_path), "wb") as f:
+                    f.write(payload)
+                stats["images"] += 1
+                stats["image_bytes"] += len(payload)
+
+            sinks[folder].write({
+                "message_id": message_id,
+                "channel_name": channel,
+                "message_date": str(posted),
+                "message_text": " ".join(rng.choices(VOCABULARY, k=rng.randint(5, 30))),
+                "has_media": image_path is not None,
+                "views": rng.randint(0, 20_000),
+                "forwards": rng.randint(0, 200),
+                "image_path": image_path,
+            })
+            stats["messages"] += 1
+
+        for sink in sinks.values():
+            sink.close()
+            stats["segments"] += len(sink.segments)
+
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Telegram lake data (JSONL + dummy images).")
+    parser.add_argument("--root", default=".", help="Directory to create data/raw/... under.")
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=1000, help="Messages per channel.")
+    parser.add_argument("--image-ratio", type=float, default=0.3)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    stats = generate(args.root, args.channels, args.messages, args.image_ratio, args.days, args.seed)
+    print(
+        f"Generated {stats['messages']:,} messages in {stats['segments']} segments and "
+        f"{stats['images']:,} images ({stats['image_bytes'] / (1024 * 1024):.1f} MB) under {args.root}"
+    )
@@ -1,10 +1,20 @@
 import os
+import io
+import sys
 import json
+import time
+import hashlib
+import argparse
 import psycopg2
 from psycopg2 import sql
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Allow imports from src/ when run as a script or from Dagster
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from jsonl_sink import iter_lake_records, is_channel_file
+from instrumentation import traced, record
+
 load_dotenv()
 
 # Database connection parameters
@@ -15,6 +25,21 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 
 RAW_DATA_PATH = "data/raw/telegram_messages"
+ENGAGEMENT_DATA_PATH = "data/raw/telegram_engagement"  # Snapshots written by scraper.py --refresh
+ENGAGEMENT_HISTORY = os.getenv("ENGAGEMENT_HISTORY", "false").lower() == "true"  # Also keep every snapshot
+
+# Legacy JSON arrays plus the scraper's line-delimited segments
+LAKE_FILE_SUFFIXES = (".json", ".jsonl", ".jsonl.gz", ".jsonl.zst")
+LOAD_BATCH_SIZE = 5000  # Messages per COPY batch when streaming a file
+
+# Columns written by the loader, in COPY order
+MESSAGE_COLUMNS = [
+    "message_id", "channel_name", "message_date",
+    "message_text", "has_media", "image_path", "views", "forwards"
+]
+
+# Columns of an engagement snapshot, in COPY order
+ENGAGEMENT_COLUMNS = ["message_id", "channel_name", "views", "forwards", "polled_at"]
 
 def get_connection():
     return psycopg2.connect(
@@ -39,72 +64,469 @@ def setup_raw_schema(cursor):
             image_path TEXT,
             views INTEGER,
             forwards INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            engagement_updated_at TIMESTAMP
+        );
+    """)
+    # Added after the table was first shipped; set when a refresh changes views/forwards
+    cursor.execute("ALTER TABLE raw.telegram_messages ADD COLUMN IF NOT EXISTS engagement_updated_at TIMESTAMP;")
+    setup_unique_index(cursor)
+
+def setup_unique_index(cursor):
+    """
+    Backs ON CONFLICT dedup with a real unique index on (channel_name, message_id).
+    Tables created by older loader versions may hold duplicates, so those are
+    removed (keeping the first row loaded) before the index is built.
+    """
+    cursor.execute("SELECT to_regclass('raw.telegram_messages_channel_message_key');")
+    if cursor.fetchone()[0] is not None:
+        return
+
+    cursor.execute("""
+        DELETE FROM raw.telegram_messages a
+        USING raw.telegram_messages b
+        WHERE a.channel_name = b.channel_name
+          AND a.message_id = b.message_id
+          AND a.id > b.id;
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS telegram_messages_channel_message_key
+        ON raw.telegram_messages (channel_name, message_id);
+    """)
+
+def setup_staging_table(cursor):
+    """Session-local staging table that COPY batches land in before the merge."""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS telegram_messages_stage (
+            message_id INTEGER,
+            channel_name TEXT,
+            message_date TIMESTAMP,
+            message_text TEXT,
+            has_media BOOLEAN,
+            image_path TEXT,
+            views INTEGER,
+            forwards INTEGER
+        );
+    """)
+
+def setup_engagement_tables(cursor, history=False):
+    """Staging table for engagement snapshots and, with history, the snapshot time series."""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS telegram_engagement_stage (
+            message_id INTEGER,
+            channel_name TEXT,
+            views INTEGER,
+            forwards INTEGER,
+            polled_at TIMESTAMP
+        );
+    """)
+    if history:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS raw.message_engagement (
+                channel_name TEXT,
+                message_id INTEGER,
+                polled_at TIMESTAMP,
+                views INTEGER,
+                forwards INTEGER,
+                PRIMARY KEY (channel_name, message_id, polled_at)
+            );
+        """)
+
+def setup_manifest_table(cursor):
+    """Tracks which lake files have already been ingested, and in which state."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS raw.ingest_manifest (
+            file_path TEXT PRIMARY KEY,
+            file_size BIGINT,
+            file_mtime DOUBLE PRECISION,
+            content_hash TEXT,
+            rows_read INTEGER,
+            rows_inserted INTEGER,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
     """)
 
-def load_json_to_postgres():
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of the file contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(cursor):
+    """Returns {file_path: (size, mtime, content_hash)} for every ingested file."""
+    cursor.execute("SELECT file_path, file_size, file_mtime, content_hash FROM raw.ingest_manifest;")
+    return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+def needs_loading(file_path, manifest_entry):
+    """
+    Decides whether a lake file has to be (re)parsed.
+    Returns (load, size, mtime, content_hash). Size + mtime is the cheap check;
+    the content hash is only computed when those differ, so a touched but
+    unchanged file is still skipped.
+    """
+    stat = os.stat(file_path)
+    size, mtime = stat.st_size, stat.st_mtime
+
+    if manifest_entry is None:
+        return True, size, mtime, file_content_hash(file_path)
+
+    known_size, known_mtime, known_hash = manifest_entry
+    if known_size == size and known_mtime == mtime:
+        return False, size, mtime, known_hash
+
+    content_hash = file_content_hash(file_path)
+    return content_hash != known_hash, size, mtime, content_hash
+
+def record_manifest_entry(cursor, file_path, size, mtime, content_hash, rows_read=None, rows_inserted=None):
+    cursor.execute("""
+        INSERT INTO raw.ingest_manifest
+            (file_path, file_size, file_mtime, content_hash, rows_read, rows_inserted, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (file_path) DO UPDATE SET
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            content_hash = EXCLUDED.content_hash,
+            rows_read = COALESCE(EXCLUDED.rows_read, raw.ingest_manifest.rows_read),
+            rows_inserted = COALESCE(EXCLUDED.rows_inserted, raw.ingest_manifest.rows_inserted),
+            loaded_at = CASE WHEN EXCLUDED.rows_read IS NULL
+                             THEN raw.ingest_manifest.loaded_at
+                             ELSE EXCLUDED.loaded_at END;
+    """, (file_path, size, mtime, content_hash, rows_read, rows_inserted))
+
+def is_lake_file(file_name):
+    """Matches finished lake files, ignoring in-flight temp files from the scraper."""
+    return not file_name.startswith(".") and file_name.endswith(LAKE_FILE_SUFFIXES)
+
+def iter_pending_files(cursor, root, manifest, stats, partition_date=None, channel=None):
+    """
+    Yields (file_path, size, mtime, content_hash) for the lake files under root
+    (one folder per date) that are new or changed since the manifest, in date
+    and name order. Unchanged files are counted in stats["files_skipped"].
+    """
+    date_folders = [partition_date] if partition_date else sorted(os.listdir(root))
+    for date_folder in date_folders:
+        folder_path = os.path.join(root, date_folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        for file_name in sorted(os.listdir(folder_path)):
+            if not is_lake_file(file_name):
+                continue
+            if channel and not is_channel_file(file_name, channel):
+                continue
+
+            file_path = os.path.join(folder_path, file_name)
+            load, size, mtime, content_hash = needs_loading(file_path, manifest.get(file_path))
+            if not load:
+                # Refresh size/mtime so the next run takes the cheap path again
+                if manifest[file_path][:2] != (size, mtime):
+                    record_manifest_entry(cursor, file_path, size, mtime, content_hash)
+                stats["files_skipped"] += 1
+                continue
+            yield file_path, size, mtime, content_hash
+
+def iter_batches(records, size=LOAD_BATCH_SIZE):
+    """Groups a record stream into lists of at most `size` records."""
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _copy_value(value):
+    """Encodes a single value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def messages_to_copy_buffer(messages):
+    """Serialises message dicts into an in-memory COPY text-format buffer."""
+    buffer = io.StringIO()
+    for msg in messages:
+        buffer.write("\t".join(_copy_value(msg.get(col)) for col in MESSAGE_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+@traced("loader.copy_batch")
+def bulk_insert_messages(cursor, messages):
+    """
+    Streams a batch into the staging table with COPY FROM STDIN, then merges it
+    into raw.telegram_messages with a single set-based INSERT ... ON CONFLICT.
+    Returns the number of rows actually inserted.
+    """
+    if not messages:
+        return 0
+
+    cursor.execute("TRUNCATE telegram_messages_stage;")
+    cursor.copy_expert(
+        f"COPY telegram_messages_stage ({', '.join(MESSAGE_COLUMNS)}) FROM STDIN",
+        messages_to_copy_buffer(messages)
+    )
+    cursor.execute(f"""
+        INSERT INTO raw.telegram_messages ({', '.join(MESSAGE_COLUMNS)})
+        SELECT DISTINCT ON (channel_name, message_id) {', '.join(MESSAGE_COLUMNS)}
+        FROM telegram_messages_stage
+        WHERE message_id IS NOT NULL
+        ORDER BY channel_name, message_id
+        ON CONFLICT (channel_name, message_id) DO NOTHING;
+    """)
+    record(rows=len(messages), rows_inserted=cursor.rowcount)
+    return cursor.rowcount
+
+def engagement_to_copy_buffer(snapshots):
+    buffer = io.StringIO()
+    for snapshot in snapshots:
+        buffer.write("\t".join(_copy_value(snapshot.get(col)) for col in ENGAGEMENT_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+@traced("loader.update_engagement")
+def bulk_update_engagement(cursor, snapshots, history=False):
+    """
+    Streams engagement snapshots into the staging table with COPY, then applies
+    the latest snapshot per message to raw.telegram_messages in one set-based
+    UPDATE ... FROM. Only rows whose views/forwards changed are written (and get
+    a new engagement_updated_at, which dbt picks up incrementally). With history
+    the snapshots of known messages are also appended to raw.message_engagement.
+    Returns the number of messages updated.
+    """
+    if not snapshots:
+        return 0
+
+    cursor.execute("TRUNCATE telegram_engagement_stage;")
+    cursor.copy_expert(
+        f"COPY telegram_engagement_stage ({', '.join(ENGAGEMENT_COLUMNS)}) FROM STDIN",
+        engagement_to_copy_buffer(snapshots)
+    )
+    cursor.execute("""
+        UPDATE raw.telegram_messages t
+        SET views = s.views,
+            forwards = s.forwards,
+            engagement_updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT DISTINCT ON (channel_name, message_id) channel_name, message_id, views, forwards
+            FROM telegram_engagement_stage
+            WHERE message_id IS NOT NULL
+            ORDER BY channel_name, message_id, polled_at DESC
+        ) s
+        WHERE t.channel_name = s.channel_name
+          AND t.message_id = s.message_id
+          AND (t.views, t.forwards) IS DISTINCT FROM (s.views, s.forwards);
+    """)
+    updated = cursor.rowcount
+    if history:
+        # Only messages already loaded, so the series never references a message the warehouse lacks
+        cursor.execute("""
+            INSERT INTO raw.message_engagement (channel_name, message_id, polled_at, views, forwards)
+            SELECT s.channel_name, s.message_id, s.polled_at, s.views, s.forwards
+            FROM telegram_engagement_stage s
+            JOIN raw.telegram_messages t
+              ON t.channel_name = s.channel_name AND t.message_id = s.message_id
+            WHERE s.polled_at IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        """)
+    record(rows=len(snapshots), rows_updated=updated)
+    return updated
+
+def insert_messages_row_by_row(cursor, messages):
+    """Original one-INSERT-per-message path, kept for debugging bad rows."""
+    inserted = 0
+    for msg in messages:
+        cursor.execute(f"""
+            INSERT INTO raw.telegram_messages ({', '.join(MESSAGE_COLUMNS)})
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (channel_name, message_id) DO NOTHING
+        """, tuple(msg.get(col) for col in MESSAGE_COLUMNS))
+        inserted += cursor.rowcount
+    return inserted
+
+@traced("loader.load_json_to_postgres")
+def load_json_to_postgres(bulk=True, full_reload=False, partition_date=None, channel=None):
+    """
+    Loads lake JSON files into raw.telegram_messages.
+    Files already recorded in raw.ingest_manifest with the same size/mtime (or
+    content hash) are skipped unless full_reload is set.
+    partition_date (YYYY-MM-DD) and channel restrict the load to that lake
+    folder and that channel's files, e.g. for one Dagster partition.
+    Returns a stats dict, or None if the load failed and was rolled back.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
+    stats = {
+        "files_loaded": 0,
+        "files_skipped": 0,
+        "rows_read": 0,
+        "rows_inserted": 0,
+    }
+    started = time.perf_counter()
+
     try:
         setup_raw_schema(cursor)
+        setup_manifest_table(cursor)
+        if bulk:
+            setup_staging_table(cursor)
+        manifest = {} if full_reload else load_manifest(cursor)
         
         # Iterate through date folders in data/raw/telegram_messages
-        for date_folder in os.listdir(RAW_DATA_PATH):
-            folder_path = os.path.join(RAW_DATA_PATH, date_folder)
-            if not os.path.isdir(folder_path):
-                continue
-                
-            for json_file in os.listdir(folder_path):
-                if not json_file.endswith(".json"):
-                    continue
-                    
-                file_path = os.path.join(folder_path, json_file)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    messages = json.load(f)
-                    
-                for msg in messages:
-                    # Check if message already exists to avoid duplicates
-                    cursor.execute("""
-                        SELECT 1 FROM raw.telegram_messages 
-                        WHERE message_id = %s AND channel_name = %s
-                    """, (msg['message_id'], msg['channel_name']))
-                    
-                    if cursor.fetchone():
-                        continue
-                        
-                    insert_query = """
-                        INSERT INTO raw.telegram_messages (
-                            message_id, channel_name, message_date, 
-                            message_text, has_media, image_path, views, forwards
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_query, (
-                        msg['message_id'],
-                        msg['channel_name'],
-                        msg['message_date'],
-                        msg['message_text'],
-                        msg['has_media'],
-                        msg['image_path'],
-                        msg['views'],
-                        msg['forwards']
-                    ))
-                
-                print(f"Loaded {len(messages)} messages from {json_file}")
+        for file_path, size, mtime, content_hash in iter_pending_files(
+            cursor, RAW_DATA_PATH, manifest, stats, partition_date, channel
+        ):
+            # Stream-parse the file so memory is bounded by the batch size
+            read = 0
+            inserted = 0
+            for messages in iter_batches(iter_lake_records(file_path)):
+                if bulk:
+                    inserted += bulk_insert_messages(cursor, messages)
+                else:
+                    inserted += insert_messages_row_by_row(cursor, messages)
+                read += len(messages)
+
+            record_manifest_entry(cursor, file_path, size, mtime, content_hash, read, inserted)
+            stats["files_loaded"] += 1
+            stats["rows_read"] += read
+            stats["rows_inserted"] += inserted
+            print(f"Loaded {inserted}/{read} new messages from {file_path}")
         
         conn.commit()
-        print("Data loading completed successfully.")
+        elapsed = time.perf_counter() - started
+        rate = stats["rows_read"] / elapsed if elapsed > 0 else 0.0
+        stats["duration_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(rate, 1)
+        record(
+            files=stats["files_loaded"], files_skipped=stats["files_skipped"],
+            rows=stats["rows_read"], rows_inserted=stats["rows_inserted"]
+        )
+        print(
+            f"Data loading completed successfully. Loaded {stats['files_loaded']} files, "
+            f"skipped {stats['files_skipped']} unchanged. Read {stats['rows_read']} messages, "
+            f"inserted {stats['rows_inserted']} in {elapsed:.2f}s ({rate:,.0f} rows/sec)."
+        )
+        return stats
         
     except Exception as e:
         conn.rollback()
         print(f"Error loading data: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+@traced("loader.load_engagement_to_postgres")
+def load_engagement_to_postgres(history=ENGAGEMENT_HISTORY, full_reload=False, partition_date=None, channel=None):
+    """
+    Applies the engagement snapshots written by scraper.py --refresh to
+    raw.telegram_messages, so views/forwards of already-loaded messages stay
+    current. Snapshot files go through the same ingest manifest as message
+    files. With history, every snapshot is also kept in raw.message_engagement.
+    Returns a stats dict, or None if the load failed and was rolled back.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    stats = {
+        "files_loaded": 0,
+        "files_skipped": 0,
+        "rows_read": 0,
+        "rows_updated": 0,
+    }
+    started = time.perf_counter()
+
+    try:
+        setup_raw_schema(cursor)
+        setup_manifest_table(cursor)
+        setup_engagement_tables(cursor, history)
+        manifest = {} if full_reload else load_manifest(cursor)
+
+        # Files are applied in date/name order, so a later poll of a message wins
+        for file_path, size, mtime, content_hash in iter_pending_files(
+            cursor, ENGAGEMENT_DATA_PATH, manifest, stats, partition_date, channel
+        ):
+            read = 0
+            updated = 0
+            for snapshots in iter_batches(iter_lake_records(file_path)):
+                updated += bulk_update_engagement(cursor, snapshots, history)
+                read += len(snapshots)
+
+            record_manifest_entry(cursor, file_path, size, mtime, content_hash, read, updated)
+            stats["files_loaded"] += 1
+            stats["rows_read"] += read
+            stats["rows_updated"] += updated
+            print(f"Updated {updated}/{read} messages from {file_path}")
+
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        rate = stats["rows_read"] / elapsed if elapsed > 0 else 0.0
+        stats["duration_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(rate, 1)
+        record(
+            files=stats["files_loaded"], files_skipped=stats["files_skipped"],
+            rows=stats["rows_read"], rows_updated=stats["rows_updated"]
+        )
+        print(
+            f"Engagement refresh completed. Loaded {stats['files_loaded']} files, "
+            f"skipped {stats['files_skipped']} unchanged. Read {stats['rows_read']} snapshots, "
+            f"updated {stats['rows_updated']} messages in {elapsed:.2f}s ({rate:,.0f} rows/sec)."
+        )
+        return stats
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error loading engagement: {e}")
+        return None
     finally:
         cursor.close()
         conn.close()
 
 if __name__ == "__main__":
-    if os.path.exists(RAW_DATA_PATH):
-        load_json_to_postgres()
+    parser = argparse.ArgumentParser(description="Load raw Telegram JSON into raw.telegram_messages.")
+    parser.add_argument(
+        "--row-by-row", action="store_true",
+        help="Insert one message per statement instead of the COPY bulk path."
+    )
+    parser.add_argument(
+        "--full-reload", action="store_true",
+        help="Ignore the ingest manifest and re-parse every file in the lake."
+    )
+    parser.add_argument("--date", help="Only load the lake folder for this date (YYYY-MM-DD).")
+    parser.add_argument("--channel", help="Only load files for this channel.")
+    parser.add_argument(
+        "--engagement", action="store_true",
+        help="Apply the views/forwards snapshots from scraper.py --refresh instead of loading messages."
+    )
+    parser.add_argument(
+        "--history", action="store_true", default=ENGAGEMENT_HISTORY,
+        help="With --engagement, also append every snapshot to raw.message_engagement."
+    )
+    args = parser.parse_args()
+
+    if args.engagement:
+        if os.path.exists(ENGAGEMENT_DATA_PATH):
+            load_engagement_to_postgres(
+                history=args.history, full_reload=args.full_reload,
+                partition_date=args.date, channel=args.channel
+            )
+        else:
+            print(f"Path {ENGAGEMENT_DATA_PATH} does not exist. Run the scraper with --refresh first.")
+    elif os.path.exists(RAW_DATA_PATH):
+        load_json_to_postgres(
+            bulk=not args.row_by_row, full_reload=args.full_reload,
+            partition_date=args.date, channel=args.channel
+        )
     else:
         print(f"Path {RAW_DATA_PATH} does not exist. Run the scraper first.")
@@ -1,8 +1,16 @@
 import os
+import io
+import sys
 import csv
+import time
+import argparse
 import psycopg2
 from dotenv import load_dotenv
 
+# Allow imports from src/ when run as a script or from Dagster
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from instrumentation import traced, record
+
 load_dotenv()
 
 # DB Config
@@ -14,6 +22,17 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 
 CSV_PATH = os.path.join("data", "processed", "yolo_detections.csv")
 
+# Column order of yolo_detect's CSV rows, as COPYed
+DETECTION_COLUMNS = [
+    "image_path", "channel_name", "message_id",
+    "detected_objects", "confidence_scores", "classification"
+]
+
+def loaded_path(csv_path):
+    """Where a pending CSV is moved once its rows are in Postgres."""
+    root, ext = os.path.splitext(csv_path)
+    return f"{root}.loaded{ext}"
+
 def get_connection():
     return psycopg2.connect(
         dbname=DB_NAME,
@@ -35,55 +54,162 @@ def setup_table(cursor):
             loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
     """)
-    # Optional: Truncate to avoid duplicates on re-run, or handle upsert. 
-    # For now, let's truncate for simplicity in this pipeline step.
-    cursor.execute("TRUNCATE TABLE raw.yolo_detections;")
+    # One detection per message; re-classified images overwrite their previous row
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS yolo_detections_channel_message_key
+        ON raw.yolo_detections (channel_name, message_id);
+    """)
+
+def setup_staging_table(cursor):
+    """Session-local landing table for COPY; seq preserves file order so the last row per message wins."""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS yolo_detections_stage (
+            seq BIGSERIAL,
+            image_path TEXT,
+            channel_name TEXT,
+            message_id TEXT,
+            detected_objects TEXT,
+            confidence_scores TEXT,
+            classification TEXT
+        );
+    """)
+    cursor.execute("TRUNCATE yolo_detections_stage;")
 
-def load_csv():
-    if not os.path.exists(CSV_PATH):
-        print(f"File not found: {CSV_PATH}. Run src/yolo_detect.py first.")
-        return
+class CsvRowStream:
+    """
+    Read-only file-like view of an iterable of detection rows as CSV text, so
+    COPY can stream rows as they are produced without an intermediate file.
+    Only one COPY buffer of rows is held in memory at a time.
+    """
 
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            data, self.pending = self.pending, ""
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+def copy_detections(cursor, stream, header=False):
+    """
+    COPYs CSV detections from a file-like stream into the stage table, then
+    upserts them into raw.yolo_detections with one set-based INSERT.
+    Returns (rows_read, rows_upserted).
+    """
+    setup_staging_table(cursor)
+    cursor.copy_expert(
+        f"COPY yolo_detections_stage ({', '.join(DETECTION_COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT csv{', HEADER true' if header else ''})",
+        stream
+    )
+    rows_read = cursor.rowcount
+    cursor.execute(f"""
+        INSERT INTO raw.yolo_detections ({', '.join(DETECTION_COLUMNS)})
+        SELECT DISTINCT ON (channel_name, message_id::integer)
+            image_path, channel_name, message_id::integer,
+            detected_objects, confidence_scores, classification
+        FROM yolo_detections_stage
+        WHERE message_id ~ '^[0-9]+$'
+        ORDER BY channel_name, message_id::integer, seq DESC
+        ON CONFLICT (channel_name, message_id) DO UPDATE SET
+            image_path = EXCLUDED.image_path,
+            detected_objects = EXCLUDED.detected_objects,
+            confidence_scores = EXCLUDED.confidence_scores,
+            classification = EXCLUDED.classification,
+            loaded_at = CURRENT_TIMESTAMP;
+    """)
+    return rows_read, cursor.rowcount
+
+def load_stream(stream, header=False, source="stream"):
+    """
+    Loads one CSV stream in a single transaction and reports throughput.
+    Returns a stats dict, or None if the load failed and was rolled back.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    
+    started = time.perf_counter()
+
     try:
         setup_table(cursor)
-        
-        with open(CSV_PATH, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader) # Skip header
-            
-            data = []
-            for row in reader:
-                # Row structure: [path, channel, msg_id, objects, confs, class]
-                data.append((
-                    row[0], # image_path
-                    row[1], # channel_name
-                    int(row[2]), # message_id
-                    row[3], # detected_objects
-                    row[4], # confidence_scores
-                    row[5]  # classification
-                ))
-            
-            if data:
-                insert_query = """
-                    INSERT INTO raw.yolo_detections 
-                    (image_path, channel_name, message_id, detected_objects, confidence_scores, classification)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                cursor.executemany(insert_query, data)
-                conn.commit()
-                print(f"Successfully loaded {len(data)} detection records to raw.yolo_detections.")
-            else:
-                print("CSV is empty, nothing loaded.")
+        rows_read, rows_upserted = copy_detections(cursor, stream, header)
+        conn.commit()
+
+        elapsed = time.perf_counter() - started
+        rate = rows_read / elapsed if elapsed > 0 else 0.0
+        record(rows=rows_read, rows_upserted=rows_upserted)
+        if rows_read:
+            print(
+                f"Upserted {rows_upserted} of {rows_read} detection records from {source} into "
+                f"raw.yolo_detections in {elapsed:.2f}s ({rate:,.0f} rows/sec)."
+            )
+        else:
+            print(f"No detections in {source}, nothing loaded.")
+        return {
+            "rows_read": rows_read,
+            "rows_upserted": rows_upserted,
+            "duration_seconds": round(elapsed, 3),
+            "rows_per_second": round(rate, 1),
+        }
 
     except Exception as e:
         conn.rollback()
         print(f"Error loading YOLO data: {e}")
+        return None
     finally:
         cursor.close()
         conn.close()
 
+@traced("yolo_loader.load_csv")
+def load_csv(csv_path=CSV_PATH):
+    """
+    Streams a pending detections CSV into raw.yolo_detections with COPY, then
+    moves it aside (yolo_detections.csv -> yolo_detections.loaded.csv).
+    Memory use does not depend on the file size.
+    """
+    if not os.path.exists(csv_path):
+        print(f"No pending detections at {csv_path}, nothing to load.")
+        return None
+
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        stats = load_stream(f, header=True, source=csv_path)
+
+    if stats is not None:
+        # yolo_detect only appends new detections, so consume the file once loaded
+        os.replace(csv_path, loaded_path(csv_path))
+    return stats
+
+@traced("yolo_loader.load_detections")
+def load_detections(rows):
+    """
+    Streams detection rows (CSV_HEADER order, e.g. straight from
+    yolo_detect.main(sink=load_detections)) into raw.yolo_detections with COPY,
+    without writing an intermediate CSV.
+    """
+    return load_stream(CsvRowStream(rows), source="detection engine")
+
 if __name__ == "__main__":
-    load_csv()
+    parser = argparse.ArgumentParser(description="Load YOLO detections into raw.yolo_detections.")
+    parser.add_argument(
+        "--from-engine", action="store_true",
+        help="Run detection and stream the rows straight into Postgres instead of loading the pending CSV."
+    )
+    args = parser.parse_args()
+
+    if args.from_engine:
+        from yolo_detect import main as yolo_main
+        yolo_main(sink=load_detections)
+    else:
+        load_csv()
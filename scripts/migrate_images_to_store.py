@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+# Allow imports from src/ when run as a script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from image_store import PackedImageStore, IMAGE_STORE_PATH, RAW_IMAGE_DIR
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+def iter_image_files(image_dir):
+    for channel_dir in sorted(os.listdir(image_dir)):
+        folder = os.path.join(image_dir, channel_dir)
+        if not os.path.isdir(folder):
+            continue
+        for file_name in sorted(os.listdir(folder)):
+            name, ext = os.path.splitext(file_name)
+            if ext.lower() in IMAGE_SUFFIXES and name.isdigit():
+                yield os.path.join(folder, file_name)
+
+def migrate(image_dir=RAW_IMAGE_DIR, store_path=IMAGE_STORE_PATH, delete=False):
+    """
+    Packs the per-photo files under image_dir into the packed store. Images
+    already in the store are skipped, so the migration can be re-run or
+    resumed. Hard-linked copies (deduplicated reposts) are indexed at the
+    first copy's bytes. With delete, each file is removed once the store is
+    flushed and its bytes hash to the indexed SHA-256.
+    Returns a stats dict.
+    """
+    started = time.perf_counter()
+    store = PackedImageStore(store_path, image_dir=image_dir)
+    stats = {"packed": 0, "linked": 0, "skipped": 0, "bytes": 0, "deleted": 0, "mismatched": 0}
+    migrated = []
+    seen_inodes = {}
+
+    try:
+        for image_path in iter_image_files(image_dir):
+            st = os.stat(image_path)
+            if store.contains(image_path):
+                stats["skipped"] += 1
+            elif (st.st_dev, st.st_ino) in seen_inodes and store.link(image_path, seen_inodes[(st.st_dev, st.st_ino)]):
+                stats["linked"] += 1
+            else:
+                with open(image_path, "rb") as f:
+                    store.put(image_path, f.read())
+                stats["packed"] += 1
+                stats["bytes"] += st.st_size
+            seen_inodes.setdefault((st.st_dev, st.st_ino), image_path)
+            migrated.append(image_path)
+        store.flush()
+
+        if delete:
+            for image_path in migrated:
+                with open(image_path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                if digest != store.content_hash(image_path):
+                    stats["mismatched"] += 1
+                    continue
+                os.remove(image_path)
+                stats["deleted"] += 1
+            for channel_dir in os.listdir(image_dir):
+                folder = os.path.join(image_dir, channel_dir)
+                if os.path.isdir(folder) and not os.listdir(folder):
+                    os.rmdir(folder)
+    finally:
+        store_stats = store.stats()
+        store.close()
+
+    elapsed = time.perf_counter() - started
+    stats["duration_seconds"] = round(elapsed, 3)
+    print(
+        f"Packed {stats['packed']} images ({stats['bytes'] / (1024 * 1024):.1f} MB), linked {stats['linked']} "
+        f"copies, skipped {stats['skipped']} already stored in {elapsed:.2f}s. Store: {store_stats['images']} "
+        f"images in {store_stats['shards']} shard(s)."
+    )
+    if delete:
+        print(f"Deleted {stats['deleted']} files; kept {stats['mismatched']} whose bytes did not match the store.")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate data/raw/images/<channel>/<id>.jpg into the packed image store.")
+    parser.add_argument("--image-dir", default=RAW_IMAGE_DIR)
+    parser.add_argument("--store", default=IMAGE_STORE_PATH, help="Packed store directory (shards + index).")
+    parser.add_argument("--delete", action="store_true", help="Remove each file once it is verified in the store.")
+    args = parser.parse_args()
+    migrate(args.image_dir, args.store, delete=args.delete)
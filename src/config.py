@@ -6,6 +6,8 @@ load_dotenv()
 TG_API_ID = os.getenv("TG_API_ID")
 TG_API_HASH = os.getenv("TG_API_HASH")
 TG_PHONE = os.getenv("TG_PHONE")
+# Telethon session file (auth key), kept between runs so the scraper does not log in again
+TG_SESSION_PATH = os.getenv("TG_SESSION_PATH", "scraper_session")
 
 CHANNELS = [
     "@lobelia4cosmetics",
@@ -17,3 +19,30 @@ SCRAPE_LIMIT = 50  # Number of messages per channel per run
 RAW_DATA_PATH = "data/raw/telegram_messages"
 IMAGE_DATA_PATH = "data/raw/images"
 LOG_DIR = "logs"
+
+# Media download pipeline
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))  # Concurrent photo downloads per channel
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("DOWNLOAD_QUEUE_SIZE", 32))  # Pending downloads before the iterator waits
+
+# Raw message sink
+SINK_BATCH_SIZE = int(os.getenv("SINK_BATCH_SIZE", 100))  # Messages per durable JSONL segment
+SINK_COMPRESSION = os.getenv("SINK_COMPRESSION") or None  # None, "gzip" or "zstd"
+
+# Rate limiting / scheduling
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", 5))  # Telegram requests per second, shared by all channels
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 10))
+MAX_CONCURRENT_CHANNELS = int(os.getenv("MAX_CONCURRENT_CHANNELS", 3))
+MAX_FLOOD_RETRIES = int(os.getenv("MAX_FLOOD_RETRIES", 3))  # Resume attempts per channel after a FloodWaitError
+
+# Near-duplicate image detection at download time (needs pillow)
+IMAGE_DEDUP = os.getenv("IMAGE_DEDUP", "true").lower() == "true"
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 6))  # Differing dHash bits (of 64) for a repost
+
+# Historical backfill (scraper.py --backfill)
+BACKFILL_WINDOW_SIZE = int(os.getenv("BACKFILL_WINDOW_SIZE", 5000))  # Message ids per min_id/max_id window
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 4))  # Windows scraped concurrently per process
+
+# Engagement refresh (scraper.py --refresh): views/forwards keep growing after the first scrape
+ENGAGEMENT_DATA_PATH = "data/raw/telegram_engagement"
+REFRESH_WINDOW_IDS = int(os.getenv("REFRESH_WINDOW_IDS", 2000))  # Most recent message ids re-polled per channel
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", 100))  # Ids per get_messages request (Telegram caps it at 100)
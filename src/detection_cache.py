@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import hashlib
+
+class DetectionCache:
+    """
+    Persistent, content-addressed store of detection results (SQLite).
+    - detections: results keyed by (image content hash, model version), so an
+      image is only inferred once per model, whatever its path.
+    - images: per-path size/mtime/hash so unchanged files are not rehashed, and
+      the (hash, model) last exported to the CSV so rows are only emitted once.
+    With a PackedImageStore, hashes come from the store's index instead of the files.
+    The database runs in WAL mode so readers never wait on a writer, and hashes and
+    results are committed per window (flush), keeping write transactions short for
+    partitioned runs sharing the file. Export marks are staged in a temporary table
+    until the caller's rows are durable (commit).
+    """
+
+    def __init__(self, path, store=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.store = store
+        # Partitioned runs can share the cache file; wait for another writer instead of failing
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS detections (
+                content_hash TEXT,
+                model_version TEXT,
+                classification TEXT,
+                detected_objects TEXT,
+                confidence_scores TEXT,
+                PRIMARY KEY (content_hash, model_version)
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                image_path TEXT PRIMARY KEY,
+                file_size INTEGER,
+                file_mtime REAL,
+                content_hash TEXT,
+                exported_hash TEXT,
+                exported_model TEXT
+            );
+            -- Per connection, and writing it takes no lock on the shared file
+            CREATE TEMP TABLE pending_exports (
+                image_path TEXT PRIMARY KEY,
+                exported_hash TEXT,
+                exported_model TEXT
+            );
+        """)
+
+    @staticmethod
+    def hash_file(image_path, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def content_hash(self, image_path):
+        """Returns the file's SHA-256, reusing the stored one while size/mtime are unchanged."""
+        if self.store is not None:
+            # Hashed once when the image was packed; the stored bytes never change
+            content_hash = self.store.content_hash(image_path)
+            if content_hash is None:
+                raise FileNotFoundError(image_path)
+            self.conn.execute(
+                "INSERT INTO images (image_path, content_hash) VALUES (?, ?) "
+                "ON CONFLICT (image_path) DO UPDATE SET content_hash = excluded.content_hash",
+                (image_path, content_hash)
+            )
+            return content_hash
+
+        stat = os.stat(image_path)
+        row = self.conn.execute(
+            "SELECT file_size, file_mtime, content_hash FROM images WHERE image_path = ?", (image_path,)
+        ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        content_hash = self.hash_file(image_path)
+        self.conn.execute("""
+            INSERT INTO images (image_path, file_size, file_mtime, content_hash) VALUES (?, ?, ?, ?)
+            ON CONFLICT (image_path) DO UPDATE SET
+                file_size = excluded.file_size,
+                file_mtime = excluded.file_mtime,
+                content_hash = excluded.content_hash
+        """, (image_path, stat.st_size, stat.st_mtime, content_hash))
+        return content_hash
+
+    def get(self, content_hash, model_version):
+        """Returns (classification, objects, confidences) or None."""
+        row = self.conn.execute("""
+            SELECT classification, detected_objects, confidence_scores FROM detections
+            WHERE content_hash = ? AND model_version = ?
+        """, (content_hash, model_version)).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, content_hash, model_version, result):
+        classification, objects, confs = result
+        self.conn.execute("""
+            INSERT OR REPLACE INTO detections
+                (content_hash, model_version, classification, detected_objects, confidence_scores)
+            VALUES (?, ?, ?, ?, ?)
+        """, (content_hash, model_version, classification, objects, confs))
+
+    def is_exported(self, image_path, content_hash, model_version):
+        row = self.conn.execute(
+            "SELECT exported_hash, exported_model FROM images WHERE image_path = ?", (image_path,)
+        ).fetchone()
+        return row is not None and row[0] == content_hash and row[1] == model_version
+
+    def mark_exported(self, image_path, content_hash, model_version):
+        """Stages the mark; it is written to the shared file by commit()."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pending_exports (image_path, exported_hash, exported_model) VALUES (?, ?, ?)",
+            (image_path, content_hash, model_version)
+        )
+
+    def flush(self):
+        """Commits hashes and results so far; staged export marks stay pending."""
+        self.conn.commit()
+
+    def commit(self):
+        """Records the staged export marks, in one short write transaction."""
+        self.conn.execute("""
+            UPDATE images SET exported_hash = p.exported_hash, exported_model = p.exported_model
+            FROM pending_exports p WHERE images.image_path = p.image_path
+        """)
+        self.conn.execute("DELETE FROM pending_exports")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,132 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from image_store import read_image
+
+# COCO classes that indicate a product is on display
+PRODUCT_CLASSES = {"bottle", "cup", "bowl", "vase", "box", "book", "cell phone", "toothbrush"}
+
+def categorize(objects):
+    """Maps detected object labels to the warehouse image categories."""
+    has_person = "person" in objects
+    has_product = any(obj in PRODUCT_CLASSES for obj in objects)
+    if has_person and has_product:
+        return "Promotional"
+    if has_product:
+        return "Product Display"
+    if has_person:
+        return "Lifestyle"
+    return "Other"
+
+class MockBackend:
+    """Wraps a per-image classify function (e.g. classify_image_mock) as a batch backend."""
+    name = "mock"
+
+    def __init__(self, classify, version="1"):
+        self.classify = classify
+        # Part of the detection cache key; bump when the classify logic changes
+        self.model_version = f"mock-{version}"
+
+    @staticmethod
+    def preprocess(image_path):
+        # The mock never looks at pixels, so there is nothing to decode
+        return image_path
+
+    def predict(self, inputs):
+        return [self.classify(image_path) for image_path in inputs]
+
+class UltralyticsBackend:
+    """YOLOv8 backend. Images are decoded in the worker pool and inferred in batches."""
+    name = "ultralytics"
+
+    def __init__(self, weights="yolov8n.pt", confidence=0.25):
+        from ultralytics import YOLO  # Heavy import, only paid when this backend is used
+        self.model = YOLO(weights)
+        self.confidence = confidence
+        self.name = f"ultralytics:{weights}"
+        self.model_version = self.name
+
+    @staticmethod
+    def preprocess(image_path):
+        import cv2
+        import numpy as np
+        # Decoded straight from the packed store's mmap (or the file's bytes), without a temp file
+        data = read_image(image_path)
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)  # BGR, which is what ultralytics expects
+        if image is None:
+            raise ValueError(f"Could not decode image: {image_path}")
+        return image
+
+    def predict(self, inputs):
+        outputs = []
+        for result in self.model(inputs, conf=self.confidence, verbose=False):
+            labels = [result.names[int(c)] for c in result.boxes.cls.tolist()]
+            scores = [f"{s:.2f}" for s in result.boxes.conf.tolist()]
+            outputs.append((categorize(labels), "|".join(labels), "|".join(scores)))
+        return outputs
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class DetectionEngine:
+    """
+    Runs a backend over a stream of image paths.
+    Decoding/preprocessing runs in a thread or process pool one batch ahead of
+    inference, so the model is never waiting on disk and at most two batches
+    of decoded images are held in memory.
+    """
+
+    def __init__(self, backend, batch_size=32, workers=4, use_processes=False):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.stats = {"images": 0, "failed": 0, "batches": 0, "duration_seconds": 0.0, "images_per_second": 0.0}
+
+    def _infer(self, batch, futures):
+        ready, inputs = [], []
+        for image_path, future in zip(batch, futures):
+            try:
+                inputs.append(future.result())
+                ready.append(image_path)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.warning(f"Skipping {image_path}: {e}")
+
+        if not ready:
+            return []
+        self.stats["batches"] += 1
+        self.stats["images"] += len(ready)
+        return list(zip(ready, self.backend.predict(inputs)))
+
+    def run(self, image_paths):
+        """Yields (image_path, (classification, objects, confidences)) for every image."""
+        started = time.perf_counter()
+        executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        preprocess = type(self.backend).preprocess
+
+        with executor_cls(max_workers=self.workers) as pool:
+            pending = None
+            for batch in iter_batches(image_paths, self.batch_size):
+                futures = [pool.submit(preprocess, image_path) for image_path in batch]
+                if pending:
+                    yield from self._infer(*pending)
+                pending = (batch, futures)
+            if pending:
+                yield from self._infer(*pending)
+
+        # Totals across calls, so one engine can be run over several windows of a stream
+        elapsed = self.stats["duration_seconds"] + time.perf_counter() - started
+        self.stats["duration_seconds"] = round(elapsed, 3)
+        self.stats["images_per_second"] = round(self.stats["images"] / elapsed, 1) if elapsed > 0 else 0.0
+        logging.info(
+            f"{self.backend.name} backend: {self.stats['images']} images in {elapsed:.2f}s "
+            f"({self.stats['images_per_second']} images/sec, batch={self.batch_size}, workers={self.workers})"
+        )
@@ -0,0 +1,225 @@
+import io
+import os
+import sqlite3
+import hashlib
+import logging
+import argparse
+
+try:
+    from PIL import Image
+except ImportError:  # Perceptual dedup is optional
+    Image = None
+
+IMAGE_INDEX_PATH = os.path.join("data", "processed", "image_index.sqlite")
+RAW_IMAGE_DIR = os.path.join("data", "raw", "images")
+
+def dhash(image, size=8):
+    """
+    64-bit difference hash of an image file path or its bytes: the image is
+    shrunk to (size+1) x size greyscale pixels and each bit records whether a
+    pixel is brighter than its right neighbour. Re-encoded, resized or lightly
+    edited copies of a photo land within a few bits of each other.
+    """
+    if Image is None:
+        raise ImportError("Perceptual hashing requires the 'pillow' package")
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray, memoryview)) else image
+    with Image.open(source) as image:
+        pixels = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes under Hamming distance. A search only
+    descends into children whose edge distance is within max_distance of the
+    query's distance to the node (triangle inequality), so lookups touch a
+    small part of the tree instead of every stored hash.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, item, {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """Returns [(distance, item), ...] within max_distance, nearest first."""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[1]))
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results)
+
+class ImageIndex:
+    """
+    Persistent perceptual-hash index of downloaded images (SQLite), shared by
+    all channels. Every image is linked to a canonical image: itself, or the
+    first indexed image within max_distance bits of its dHash. Only canonical
+    images are kept in the in-memory BK-tree, which is built on first lookup.
+    """
+
+    def __init__(self, path=IMAGE_INDEX_PATH, max_distance=6, exists=os.path.exists):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Concurrent scrapes and partitions share the file; wait for another writer instead of failing
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                image_path TEXT PRIMARY KEY,
+                channel TEXT,
+                phash TEXT,
+                canonical_path TEXT
+            )
+        """)
+        self.max_distance = max_distance
+        self.exists = exists  # Whether a canonical image is still stored (image_store.image_exists for packed stores)
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = BKTree()
+            for image_path, phash in self.conn.execute(
+                "SELECT image_path, phash FROM images WHERE canonical_path = image_path"
+            ):
+                self._tree.add(int(phash, 16), image_path)
+        return self._tree
+
+    def canonical_for(self, image_path):
+        row = self.conn.execute(
+            "SELECT canonical_path FROM images WHERE image_path = ?", (image_path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add(self, image_path, channel, phash=None):
+        """Indexes an image and returns its canonical path (image_path itself if it is new)."""
+        known = self.canonical_for(image_path)
+        if known is not None:
+            return known
+
+        phash = dhash(image_path) if phash is None else phash
+        matches = self.tree.search(phash, self.max_distance)
+        canonical = next((path for _, path in matches if path != image_path and self.exists(path)), image_path)
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO images (image_path, channel, phash, canonical_path) VALUES (?, ?, ?, ?)",
+            (image_path, channel, f"{phash:016x}", canonical)
+        )
+        self.conn.commit()
+        if canonical == image_path:
+            self.tree.add(phash, image_path)
+        return canonical
+
+    def channel_stats(self):
+        """Returns {channel: {"images", "duplicates", "duplicate_ratio"}} over everything indexed."""
+        stats = {}
+        for channel, images, duplicates in self.conn.execute("""
+            SELECT channel, COUNT(*), SUM(canonical_path != image_path) FROM images GROUP BY channel
+        """):
+            stats[channel] = {
+                "images": images,
+                "duplicates": duplicates,
+                "duplicate_ratio": round(duplicates / images, 4) if images else 0.0,
+            }
+        return stats
+
+    def close(self):
+        self.conn.close()
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_to_canonical(image_path, canonical_path):
+    """
+    Replaces a duplicate's file with a hard link to its canonical image when
+    both hold exactly the same bytes, so they are stored once. Perceptual
+    matches that differ in any byte (a re-encoded repost, or a similar but
+    distinct product photo) keep their own file; the index still records their
+    canonical, which YOLO uses to reuse its detection. Returns the bytes freed
+    (0 if the files differ or linking failed).
+    """
+    tmp_path = image_path + ".link"
+    try:
+        size = os.path.getsize(image_path)
+        if os.path.samefile(image_path, canonical_path):
+            return 0
+        if size != os.path.getsize(canonical_path) or file_sha256(image_path) != file_sha256(canonical_path):
+            return 0
+        os.link(canonical_path, tmp_path)
+        os.replace(tmp_path, image_path)
+        return size
+    except OSError as e:
+        # e.g. a different filesystem; the duplicate stays a separate file but is still indexed
+        logging.warning(f"Could not link {image_path} to {canonical_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return 0
+
+def index_images(image_dir=RAW_IMAGE_DIR, index_path=IMAGE_INDEX_PATH, max_distance=6, link=False):
+    """Indexes images already on disk (e.g. downloaded before dedup was enabled)."""
+    index = ImageIndex(index_path, max_distance)
+    freed = 0
+    try:
+        for channel_dir in sorted(os.listdir(image_dir)):
+            folder = os.path.join(image_dir, channel_dir)
+            if not os.path.isdir(folder):
+                continue
+            for file_name in sorted(os.listdir(folder)):
+                if not file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    continue
+                image_path = os.path.join(folder, file_name)
+                try:
+                    canonical = index.add(image_path, f"@{channel_dir}")
+                except Exception as e:
+                    logging.warning(f"Could not hash {image_path}: {e}")
+                    continue
+                if link and canonical != image_path:
+                    freed += link_to_canonical(image_path, canonical)
+        return index.channel_stats(), freed
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index downloaded images by perceptual hash and report reposts.")
+    parser.add_argument("--image-dir", default=RAW_IMAGE_DIR)
+    parser.add_argument("--max-distance", type=int, default=6, help="Hamming distance (of 64 bits) for a near-duplicate.")
+    parser.add_argument("--link", action="store_true", help="Replace byte-identical duplicates with hard links to their canonical image.")
+    args = parser.parse_args()
+
+    stats, freed = index_images(args.image_dir, max_distance=args.max_distance, link=args.link)
+    for channel, channel_stats in sorted(stats.items()):
+        print(
+            f"{channel}: {channel_stats['duplicates']} of {channel_stats['images']} images are reposts "
+            f"({channel_stats['duplicate_ratio']:.1%})"
+        )
+    if args.link:
+        print(f"Freed {freed / (1024 * 1024):.1f} MB")
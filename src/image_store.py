@@ -0,0 +1,233 @@
+import os
+import mmap
+import uuid
+import sqlite3
+import hashlib
+import threading
+
+# "files": one JPEG per photo under data/raw/images/<channel>/<id>.jpg (default)
+# "packed": photos appended to large shard files, located through an index
+IMAGE_STORE = os.getenv("IMAGE_STORE", "files")
+IMAGE_STORE_PATH = os.getenv("IMAGE_STORE_PATH", os.path.join("data", "raw", "image_store"))
+IMAGE_SHARD_SIZE = int(os.getenv("IMAGE_SHARD_SIZE", 1024 * 1024 * 1024))  # Bytes per shard before a new one is started
+RAW_IMAGE_DIR = os.path.join("data", "raw", "images")
+
+def image_key(image_path):
+    """Maps a logical image path (data/raw/images/{channel}/{msg_id}.jpg) to (channel, message_id)."""
+    parts = os.path.normpath(image_path).split(os.sep)
+    return parts[-2], int(os.path.splitext(parts[-1])[0])
+
+class PackedImageStore:
+    """
+    Append-only packed image store. Photos are appended to shard files
+    (shard-<writer>-<seq>.pack) and an SQLite index maps (channel, message_id)
+    to (shard, offset, length, sha256). Every store instance appends to its
+    own shards, so concurrent writers never interleave bytes; the index is the
+    only shared state. Reads are zero-copy memoryview slices of mmapped shards.
+
+    Images keep their logical path (data/raw/images/<channel>/<id>.jpg) in the
+    lake and the warehouse; the store resolves it, so nothing downstream changes.
+    """
+
+    def __init__(self, root=IMAGE_STORE_PATH, shard_size=IMAGE_SHARD_SIZE, image_dir=RAW_IMAGE_DIR, commit_every=64):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.shard_size = shard_size
+        self.image_dir = image_dir
+        self.commit_every = max(1, commit_every)
+        self.lock = threading.RLock()
+        # Shared by the scraper's event loop and the detection engine's preprocessing threads
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=60, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                channel TEXT,
+                message_id INTEGER,
+                shard_id INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                sha256 TEXT,
+                PRIMARY KEY (channel, message_id)
+            ) WITHOUT ROWID;
+        """)
+        self.writer_id = uuid.uuid4().hex[:8]
+        self._shard = None  # (shard_id, unbuffered file, bytes written)
+        self._shard_seq = 0
+        # Index rows not yet committed: (channel, message_id) -> (shard_id, offset, length, sha256).
+        # Held in memory so the shared index is only write-locked for one short commit per batch.
+        self._unsynced = {}
+        self._maps = {}  # shard_id -> mmap
+
+    # Writing
+
+    def _rotate(self):
+        if self._shard is not None:
+            self._sync()
+            self._shard[1].close()
+        self._shard_seq += 1
+        name = f"shard-{self.writer_id}-{self._shard_seq:05d}.pack"
+        shard_id = self.conn.execute("INSERT INTO shards (name) VALUES (?)", (name,)).lastrowid
+        self.conn.commit()
+        # Unbuffered, so bytes are visible to readers' mmaps as soon as they are written
+        self._shard = (shard_id, open(os.path.join(self.root, name), "ab", buffering=0), 0)
+
+    def _sync(self):
+        # Shard bytes are durable before the index rows pointing at them are committed
+        if self._shard is not None:
+            os.fsync(self._shard[1].fileno())
+        if self._unsynced:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO images (channel, message_id, shard_id, offset, length, sha256)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(*key, *location) for key, location in self._unsynced.items()])
+            self.conn.commit()
+            self._unsynced = {}
+
+    def _index(self, key, location):
+        self._unsynced[key] = location
+        if len(self._unsynced) >= self.commit_every:
+            self._sync()
+
+    def put(self, image_path, data):
+        """Appends an image and indexes it under its logical path. Returns its SHA-256."""
+        channel, message_id = image_key(image_path)
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            if self._shard is None or (self._shard[2] and self._shard[2] + len(data) > self.shard_size):
+                self._rotate()
+            shard_id, f, offset = self._shard
+            f.write(data)
+            self._shard = (shard_id, f, offset + len(data))
+            self._index((channel, message_id), (shard_id, offset, len(data), content_hash))
+        return content_hash
+
+    def link(self, image_path, canonical_path):
+        """Indexes image_path at the canonical image's bytes (e.g. a repost); returns False if unknown."""
+        location = self.locate(canonical_path)
+        if location is None:
+            return False
+        with self.lock:
+            self._index(image_key(image_path), location)
+        return True
+
+    def flush(self):
+        with self.lock:
+            self._sync()
+
+    # Reading
+
+    def locate(self, image_path):
+        """Returns (shard_id, offset, length, sha256) or None."""
+        try:
+            channel, message_id = image_key(image_path)
+        except (ValueError, IndexError):
+            return None
+        with self.lock:
+            if (channel, message_id) in self._unsynced:
+                return self._unsynced[(channel, message_id)]
+            return self.conn.execute("""
+                SELECT shard_id, offset, length, sha256 FROM images WHERE channel = ? AND message_id = ?
+            """, (channel, message_id)).fetchone()
+
+    def contains(self, image_path):
+        return self.locate(image_path) is not None
+
+    def content_hash(self, image_path):
+        location = self.locate(image_path)
+        return location[3] if location else None
+
+    def _map(self, shard_id, end):
+        with self.lock:
+            mapped = self._maps.get(shard_id)
+            if mapped is None or len(mapped) < end:
+                # (Re)map once the shard has grown past the mapped length; old views stay valid
+                name = self.conn.execute("SELECT name FROM shards WHERE shard_id = ?", (shard_id,)).fetchone()[0]
+                with open(os.path.join(self.root, name), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[shard_id] = mapped
+            return mapped
+
+    def get(self, image_path):
+        """Returns the image bytes as a zero-copy memoryview, or None."""
+        location = self.locate(image_path)
+        if location is None:
+            return None
+        shard_id, offset, length, _ = location
+        return memoryview(self._map(shard_id, offset + length))[offset:offset + length]
+
+    def iter_paths(self, channel=None, batch_size=1000):
+        """Yields the logical paths of stored images in (channel, message_id) order."""
+        self.flush()
+        last = ("", -1) if channel is None else (channel, -1)
+        while True:
+            with self.lock:
+                if channel is None:
+                    rows = self.conn.execute("""
+                        SELECT channel, message_id FROM images WHERE (channel, message_id) > (?, ?)
+                        ORDER BY channel, message_id LIMIT ?
+                    """, (*last, batch_size)).fetchall()
+                else:
+                    rows = self.conn.execute("""
+                        SELECT channel, message_id FROM images WHERE channel = ? AND message_id > ?
+                        ORDER BY message_id LIMIT ?
+                    """, (channel, last[1], batch_size)).fetchall()
+            if not rows:
+                return
+            for image_channel, message_id in rows:
+                yield os.path.join(self.image_dir, image_channel, f"{message_id}.jpg")
+            last = rows[-1]
+
+    def stats(self):
+        self.flush()
+        with self.lock:
+            images, stored_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM images").fetchone()
+            shards = self.conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+        return {"images": images, "bytes": stored_bytes, "shards": shards}
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            if self._shard is not None:
+                self._shard[1].close()
+                self._shard = None
+            # Maps still referenced by a caller's memoryview are released when it is
+            self._maps.clear()
+            self.conn.close()
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def default_store():
+    """The process-wide packed store when IMAGE_STORE=packed, else None (plain files)."""
+    global _default_store
+    if IMAGE_STORE != "packed":
+        return None
+    with _default_lock:
+        if _default_store is None:
+            _default_store = PackedImageStore()
+        return _default_store
+
+def close_default_store():
+    global _default_store
+    with _default_lock:
+        if _default_store is not None:
+            _default_store.close()
+            _default_store = None
+
+def image_exists(image_path):
+    store = default_store()
+    return store.contains(image_path) if store is not None else os.path.exists(image_path)
+
+def read_image(image_path):
+    """Returns an image's bytes: a zero-copy view from the packed store, or the file's contents."""
+    store = default_store()
+    if store is not None:
+        data = store.get(image_path)
+        if data is None:
+            raise FileNotFoundError(image_path)
+        return data
+    with open(image_path, "rb") as f:
+        return f.read()
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import queue
+import atexit
+import inspect
+import logging
+import threading
+import functools
+import contextvars
+from datetime import datetime, timezone
+
+# Every finished span is appended here as one JSON line ("" disables the file output)
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH", os.path.join("logs", "metrics.jsonl"))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class MetricsRegistry:
+    """
+    In-process aggregates of finished spans and counters, used to render the
+    Prometheus text format. Thread-safe; the JSON lines file has the raw events.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}  # (name, labels) -> {"count", "sum", "errors"}
+        self.counters = {}  # (name, labels) -> total
+
+    def record_span(self, name, labels, duration, failed, counts):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.spans.setdefault(key, {"count": 0, "sum": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["sum"] += duration
+            entry["errors"] += int(failed)
+            for counter, value in counts.items():
+                self._add(f"{name}.{counter}", labels, value)
+
+    def incr(self, name, labels, value):
+        with self.lock:
+            self._add(name, labels, value)
+
+    def _add(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def render_prometheus(self):
+        """Renders the aggregates in the Prometheus text exposition format."""
+        lines = [
+            "# HELP pipeline_span_duration_seconds Time spent in instrumented spans.",
+            "# TYPE pipeline_span_duration_seconds summary",
+        ]
+        with self.lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), entry in spans:
+            label_str = _format_labels({"span": name, **dict(labels)})
+            lines.append(f"pipeline_span_duration_seconds_sum{label_str} {entry['sum']:.6f}")
+            lines.append(f"pipeline_span_duration_seconds_count{label_str} {entry['count']}")
+        lines += [
+            "# HELP pipeline_span_errors_total Instrumented spans that raised.",
+            "# TYPE pipeline_span_errors_total counter",
+        ]
+        for (name, labels), entry in spans:
+            lines.append(f"pipeline_span_errors_total{_format_labels({'span': name, **dict(labels)})} {entry['errors']}")
+        lines += [
+            "# HELP pipeline_events_total Counters (rows, bytes, images, retries, ...).",
+            "# TYPE pipeline_events_total counter",
+        ]
+        for (name, labels), total in counters:
+            lines.append(f"pipeline_events_total{_format_labels({'event': name, **dict(labels)})} {total}")
+        return "\n".join(lines) + "\n"
+
+class MetricsWriter:
+    """
+    Appends JSON lines from a background thread, so emitting an event (e.g. for
+    every API request, on the event loop) never waits on file I/O. Lines queued
+    while a write is in progress are appended together in one write.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def write(self, path, line):
+        self._ensure_started()
+        self.queue.put((path, line))
+
+    def flush(self):
+        """Blocks until every queued line has been written."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def _ensure_started(self):
+        # Also restarts the thread in a forked child, where it no longer runs
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            by_path = {}
+            for path, line in items:
+                by_path.setdefault(path, []).append(line)
+            for path, lines in by_path.items():
+                try:
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(line + "\n" for line in lines))
+                except OSError as e:
+                    logging.warning(f"Could not write metrics to {path}: {e}")
+            for _ in items:
+                self.queue.task_done()
+
+registry = MetricsRegistry()
+writer = MetricsWriter()
+atexit.register(writer.flush)
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+
+def emit(event, path=None):
+    """Queues one event for the JSON lines metrics log; see flush()."""
+    path = METRICS_LOG_PATH if path is None else path
+    if not path:
+        return
+    writer.write(path, json.dumps(event, default=str))
+
+def flush():
+    """Waits until every emitted event is in the metrics log (also run at exit)."""
+    writer.flush()
+
+class Span:
+    """
+    Times a block of work. Use as a context manager or, via traced(), as a
+    decorator. Labels identify the span and should stay low-cardinality
+    (channel, route); counts are accumulated with add() while it runs.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.counts = {}
+        self.duration = None
+        self._token = None
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        failed = exc_type is not None
+        registry.record_span(self.name, self.labels, self.duration, failed, self.counts)
+        emit({
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "type": "span",
+            "name": self.name,
+            "labels": self.labels,
+            "duration_seconds": round(self.duration, 6),
+            "status": "error" if failed else "ok",
+            "error": repr(exc) if failed else None,
+            "counts": self.counts,
+        })
+        return False
+
+def span(name, **labels):
+    return Span(name, **labels)
+
+def traced(name):
+    """Decorator that runs each call of a sync or async function in a span."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(**counts):
+    """Adds counts (rows, bytes, images, ...) to the innermost active span, if any."""
+    active = _current_span.get()
+    if active is not None:
+        active.add(**counts)
+
+def label(**labels):
+    """Adds labels to the innermost active span, e.g. the channel a traced call handles."""
+    active = _current_span.get()
+    if active is not None:
+        active.labels.update(labels)
+
+def incr(name, value=1, **labels):
+    """Increments a standalone counter (e.g. retries) outside any span's counts."""
+    registry.incr(name, labels, value)
+    emit({
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "type": "counter",
+        "name": name,
+        "labels": labels,
+        "value": value,
+    })
@@ -0,0 +1,109 @@
+import os
+import io
+import gzip
+import json
+import uuid
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd output is optional
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {
+    None: ".jsonl",
+    "gzip": ".jsonl.gz",
+    "zstd": ".jsonl.zst",
+}
+
+class JsonlSink:
+    """
+    Append-only, line-delimited JSON writer for the data lake.
+    Records are buffered and flushed every `batch_size` records into a new
+    segment file named {prefix}-{run_id}-{seq}.jsonl[.gz|.zst]. Each segment is
+    written to a temp file, fsynced and renamed into place, so a segment is
+    either fully present or absent. A later run adds new segments instead of
+    overwriting earlier ones.
+    """
+
+    def __init__(self, directory, prefix, batch_size=100, compression=None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+
+        self.directory = directory
+        self.prefix = prefix
+        self.batch_size = max(1, batch_size)
+        self.compression = compression
+        self.run_id = f"{datetime.now().strftime('%H%M%S')}{uuid.uuid4().hex[:4]}"
+        self.buffer = []
+        self.segments = []
+        self.records_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        """Buffers a record. Returns the flushed batch when a flush happened, else None."""
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Durably writes buffered records as one segment and returns them."""
+        if not self.buffer:
+            return []
+
+        batch, self.buffer = self.buffer, []
+        name = f"{self.prefix}-{self.run_id}-{len(self.segments) + 1:05d}{COMPRESSION_SUFFIXES[self.compression]}"
+        final_path = os.path.join(self.directory, name)
+        tmp_path = os.path.join(self.directory, f".{name}.tmp")
+
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch).encode("utf-8")
+        if self.compression == "gzip":
+            payload = gzip.compress(payload)
+        elif self.compression == "zstd":
+            payload = zstandard.ZstdCompressor().compress(payload)
+
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+
+        self.segments.append(final_path)
+        self.records_written += len(batch)
+        return batch
+
+    def close(self):
+        return self.flush()
+
+def is_channel_file(file_name, channel):
+    """Matches a channel's segments ({channel}-{run}-{seq}.jsonl*) and legacy {channel}.json files."""
+    name = channel.replace("@", "")
+    return file_name.startswith(f"{name}-") or file_name == f"{name}.json"
+
+def open_lake_file(path):
+    """Opens a lake file (.json, .jsonl, .jsonl.gz, .jsonl.zst) as a text stream."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the 'zstandard' package")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_lake_records(path):
+    """Yields message dicts one at a time from a lake file without loading it whole."""
+    if path.endswith(".json"):
+        # Legacy pretty-printed array written by older scraper versions
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    with open_lake_file(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
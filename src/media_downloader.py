@@ -0,0 +1,152 @@
+import os
+import time
+import hashlib
+import logging
+import asyncio
+from telethon import errors
+from image_dedup import dhash, link_to_canonical
+
+class MediaDownloader:
+    """
+    Bounded producer/consumer pipeline for photo downloads.
+    The message iterator submits photos to a queue while a pool of worker
+    coroutines downloads them, so iteration is no longer blocked on each file.
+    When the queue is full, submit() waits, which keeps memory bounded.
+    If a shared RateLimiter is given, every download takes a token, and a
+    FloodWaitError pauses the limiter before the download is retried once.
+    If an ImageIndex is given as `dedup`, each download is perceptually hashed
+    and a near-duplicate of an already stored image is recorded against it as
+    its canonical, so YOLO reuses the canonical's detection. A repost keeps its
+    own bytes unless they are identical to the canonical's, in which case it
+    becomes a hard link to it (or, in the packed store, is indexed at its bytes).
+    If a PackedImageStore is given as `store`, photos are downloaded to memory
+    and appended to it under their path instead of being written as files.
+    """
+
+    def __init__(self, client, label, workers=4, queue_size=32, limiter=None, dedup=None, store=None):
+        self.client = client
+        self.label = label
+        self.limiter = limiter
+        self.dedup = dedup
+        self.store = store
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._tasks = []
+        self._started = None
+        self.stats = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0, "duplicates": 0, "bytes_deduplicated": 0}
+        self.failed_paths = []  # Taken by the caller (take_failures) to schedule retries
+
+    @staticmethod
+    def already_downloaded(path, expected_size):
+        """A photo is skipped when the target exists with the expected size."""
+        if not expected_size or not os.path.exists(path):
+            return False
+        return os.path.getsize(path) == expected_size
+
+    async def start(self):
+        self._started = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, media, path, expected_size=None):
+        if self.store is not None:
+            # The store only indexes complete images
+            done = self.store.contains(path)
+        else:
+            # Images are only indexed once fully downloaded
+            indexed = self.dedup is not None and os.path.exists(path) and self.dedup.canonical_for(path) is not None
+            done = indexed or self.already_downloaded(path, expected_size)
+        if done:
+            self.stats["skipped"] += 1
+            return
+        await self.queue.put((media, path))
+
+    async def _worker(self):
+        while True:
+            media, path = await self.queue.get()
+            try:
+                if self.store is not None:
+                    await self._download_to_store(media, path)
+                else:
+                    await self._download(media, path)
+                    self.stats["downloaded"] += 1
+                    self.stats["bytes"] += os.path.getsize(path)
+                    if self.dedup is not None:
+                        await self._deduplicate(path)
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.failed_paths.append(path)
+                logging.warning(f"Failed to download {path}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def _download(self, media, target):
+        """Downloads to a file path, or to memory when target is `bytes`."""
+        for attempt in range(2):
+            try:
+                if self.limiter:
+                    await self.limiter.acquire()
+                return await self.client.download_media(media, file=target)
+            except errors.FloodWaitError as e:
+                if self.limiter is None or attempt:
+                    raise
+                self.limiter.pause(e.seconds)
+
+    async def _download_to_store(self, media, path):
+        data = await self._download(media, bytes)
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += len(data)
+        if self.dedup is not None:
+            try:
+                canonical = self.dedup.add(path, self.label, await asyncio.to_thread(dhash, data))
+            except Exception as e:
+                logging.warning(f"Could not hash {path}: {str(e)}")
+                canonical = path
+            if canonical != path:
+                self.stats["duplicates"] += 1
+                # Only byte-identical copies share storage; near-duplicates keep their own bytes
+                if self.store.content_hash(canonical) == hashlib.sha256(data).hexdigest() and self.store.link(path, canonical):
+                    self.stats["bytes_deduplicated"] += len(data)
+                    return
+        self.store.put(path, data)
+
+    async def _deduplicate(self, path):
+        try:
+            phash = await asyncio.to_thread(dhash, path)
+        except Exception as e:
+            logging.warning(f"Could not hash {path}: {str(e)}")
+            return
+        canonical = self.dedup.add(path, self.label, phash)
+        if canonical != path:
+            self.stats["duplicates"] += 1
+            self.stats["bytes_deduplicated"] += link_to_canonical(path, canonical)
+
+    async def drain(self):
+        """Waits until every photo submitted so far has been downloaded or has failed."""
+        await self.queue.join()
+
+    def take_failures(self):
+        """Returns and forgets the paths whose download failed since the last call."""
+        failed, self.failed_paths = self.failed_paths, []
+        return failed
+
+    async def close(self):
+        """Waits for queued downloads to finish, stops the workers and logs throughput."""
+        try:
+            await self.queue.join()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        self.stats["duration_seconds"] = round(elapsed, 3)
+        rate = self.stats["downloaded"] / elapsed if elapsed > 0 else 0.0
+        mb_rate = self.stats["bytes"] / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+        logging.info(
+            f"Media for {self.label}: {self.stats['downloaded']} downloaded, "
+            f"{self.stats['skipped']} skipped, {self.stats['failed']} failed, "
+            f"{self.stats['duplicates']} reposts in {elapsed:.2f}s "
+            f"({rate:.1f} images/sec, {mb_rate:.2f} MB/sec)"
+        )
+        return self.stats
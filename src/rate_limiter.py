@@ -0,0 +1,54 @@
+import time
+import asyncio
+
+class RateLimiter:
+    """
+    Token bucket shared by every coroutine that talks to Telegram.
+    `rate` tokens are added per second up to `burst`; each API request takes one.
+    pause() blocks all callers until a flood wait has passed, so one channel's
+    FloodWaitError throttles the whole client instead of just that coroutine.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.metrics = {
+            "requests": 0,
+            "wait_seconds": 0.0,
+            "flood_waits": 0,
+            "flood_wait_seconds": 0.0,
+        }
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        started = self.clock()
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.rate <= 0:  # Unlimited
+                    break
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+        self.metrics["requests"] += 1
+        self.metrics["wait_seconds"] += self.clock() - started
+
+    def pause(self, seconds):
+        """Stops every acquire() until `seconds` from now."""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.metrics["flood_waits"] += 1
+        self.metrics["flood_wait_seconds"] += seconds
@@ -1,10 +1,52 @@
 import os
 import json
+import time
 import logging
 import asyncio
-from datetime import datetime
+import argparse
+from datetime import datetime, date, timedelta, timezone
 from telethon import TelegramClient, errors
-from config import TG_API_ID, TG_API_HASH, TG_PHONE, CHANNELS, RAW_DATA_PATH, IMAGE_DATA_PATH, LOG_DIR, SCRAPE_LIMIT
+from config import TG_API_ID, TG_API_HASH, TG_PHONE, TG_SESSION_PATH, CHANNELS, RAW_DATA_PATH, IMAGE_DATA_PATH, LOG_DIR, SCRAPE_LIMIT
+from config import DOWNLOAD_WORKERS, DOWNLOAD_QUEUE_SIZE, SINK_BATCH_SIZE, SINK_COMPRESSION
+from config import RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, MAX_CONCURRENT_CHANNELS, MAX_FLOOD_RETRIES
+from config import BACKFILL_WINDOW_SIZE, BACKFILL_CONCURRENCY, IMAGE_DEDUP, PHASH_MAX_DISTANCE
+from config import ENGAGEMENT_DATA_PATH, REFRESH_WINDOW_IDS, REFRESH_BATCH_SIZE
+from media_downloader import MediaDownloader
+from jsonl_sink import JsonlSink
+from rate_limiter import RateLimiter
+import image_dedup
+import image_store
+from instrumentation import traced, record, label, incr
+
+# iter_messages fetches history in pages of this many messages per API request
+MESSAGES_PER_REQUEST = 100
+
+# One checkpoint file per backfill window: <BACKFILL_DIR>/<channel>/<low>-<high>.json
+BACKFILL_DIR = os.path.join(LOG_DIR, "backfill")
+
+def backfill_windows(first_id, last_id, window_size=BACKFILL_WINDOW_SIZE):
+    """
+    Splits message ids first_id..last_id into inclusive (low, high) windows,
+    oldest first. Boundaries are aligned to multiples of window_size, so a
+    resumed backfill maps onto the same windows (and checkpoints) even when
+    the channel has grown in the meantime.
+    """
+    windows = []
+    if first_id > last_id:
+        return windows
+    low = (max(1, first_id) - 1) // window_size * window_size + 1
+    while low <= last_id:
+        windows.append((low, low + window_size - 1))
+        low += window_size
+    return windows
+
+def refresh_batches(last_id, window=REFRESH_WINDOW_IDS, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Splits the `window` most recent message ids up to last_id into id lists of
+    at most batch_size, newest first, for get_messages(ids=...).
+    """
+    ids = list(range(last_id, max(0, last_id - window), -1))
+    return [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
 
 # Set up logging
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -18,10 +60,25 @@ console.setLevel(logging.INFO)
 logging.getLogger("").addHandler(console)
 
 class TelegramScraper:
-    def __init__(self):
-        self.client = TelegramClient('scraper_session', TG_API_ID, TG_API_HASH)
+    def __init__(self, session=TG_SESSION_PATH, on_progress=None):
+        """
+        session: Telethon session file; reusing it across runs skips the login.
+        on_progress: optional callback(channel, stats) invoked after every flushed
+        batch and once more (stats["done"] = True) when a channel finishes.
+        """
+        os.makedirs(os.path.dirname(session) or ".", exist_ok=True)
+        # flood_sleep_threshold=0 surfaces every FloodWaitError to our scheduler
+        # instead of letting Telethon sleep silently inside a single request
+        self.client = TelegramClient(session, TG_API_ID, TG_API_HASH, flood_sleep_threshold=0)
+        self.limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
         self.checkpoints_file = os.path.join(LOG_DIR, "checkpoints.json")
         self.checkpoints = self.load_checkpoints()
+        # Message ids per channel whose photo failed to download, retried on the next scrape
+        self.failed_downloads_file = os.path.join(LOG_DIR, "failed_downloads.json")
+        self.on_progress = on_progress
+        self.channel_stats = {}
+        self.image_index = None  # Opened by run() when IMAGE_DEDUP is on
+        self.image_store = None  # Packed store when IMAGE_STORE=packed, else photos are written as files
 
     def load_checkpoints(self):
         if os.path.exists(self.checkpoints_file):
@@ -30,75 +87,559 @@ class TelegramScraper:
         return {}
 
     def save_checkpoints(self):
-        with open(self.checkpoints_file, 'w') as f:
+        # Backfill shards and scheduled scrapes share the file, and checkpoints only move
+        # forward: reload it and keep each channel's higher id, so a stale copy never wins
+        for channel, last_id in self.load_checkpoints().items():
+            self.checkpoints[channel] = max(last_id, self.checkpoints.get(channel, 0))
+        # Write-then-rename so a crash never leaves a truncated checkpoints file
+        tmp_file = self.checkpoints_file + ".tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(self.checkpoints, f, indent=4)
+        os.replace(tmp_file, self.checkpoints_file)
+
+    def load_failed_downloads(self):
+        if os.path.exists(self.failed_downloads_file):
+            with open(self.failed_downloads_file, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_failed_downloads(self, channel_username, message_ids):
+        failed = self.load_failed_downloads()
+        if message_ids:
+            failed[channel_username] = sorted(set(message_ids))
+        else:
+            failed.pop(channel_username, None)
+        tmp_file = self.failed_downloads_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(failed, f, indent=4)
+        os.replace(tmp_file, self.failed_downloads_file)
+
+    def record_failed_downloads(self, channel_username, downloader):
+        """Adds the message ids of the downloader's failed photos to the retry list."""
+        failed = [image_store.image_key(path)[1] for path in downloader.take_failures()]
+        if failed:
+            known = self.load_failed_downloads().get(channel_username, [])
+            self.save_failed_downloads(channel_username, known + failed)
+
+    async def settle_batch(self, channel_username, batch, downloader, commit=True):
+        """
+        Waits for the batch's photos before the checkpoint moves past it, so a
+        crash never leaves messages behind the checkpoint with queued photos.
+        Failed photos are put on the retry list first.
+        """
+        if not batch:
+            return
+        await downloader.drain()
+        self.record_failed_downloads(channel_username, downloader)
+        if commit:
+            self.commit_batch(channel_username, batch)
+
+    async def retry_failed_downloads(self, channel_username, entity, img_store_path, downloader):
+        """Re-fetches the photos of messages on the channel's retry list."""
+        message_ids = self.load_failed_downloads().get(channel_username, [])
+        if not message_ids:
+            return
+        logging.info(f"Retrying {len(message_ids)} failed photo downloads for {channel_username}")
+        for start in range(0, len(message_ids), MESSAGES_PER_REQUEST):
+            await self.limiter.acquire()
+            messages = await self.client.get_messages(entity, ids=message_ids[start:start + MESSAGES_PER_REQUEST])
+            for message in messages:
+                # Deleted messages, or photos removed since, have nothing left to fetch
+                if message is not None and message.photo:
+                    expected_size = message.file.size if message.file else None
+                    await downloader.submit(message.photo, os.path.join(img_store_path, f"{message.id}.jpg"), expected_size)
+        await downloader.drain()
+        # Only the ids that failed again stay on the list
+        self.save_failed_downloads(
+            channel_username, [image_store.image_key(path)[1] for path in downloader.take_failures()]
+        )
+
+    def commit_batch(self, channel_username, batch):
+        """Advances the channel checkpoint once a batch has been durably written."""
+        if not batch:
+            return
+        latest_id = max(msg["message_id"] for msg in batch)
+        if latest_id > self.checkpoints.get(channel_username, 0):
+            self.checkpoints[channel_username] = latest_id
+            self.save_checkpoints()
+
+    def report_progress(self, channel_username, **updates):
+        """Updates the channel's running stats and forwards a snapshot to on_progress."""
+        stats = self.channel_stats.setdefault(channel_username, {
+            "messages": 0, "segments": 0, "images_downloaded": 0, "images_skipped": 0,
+            "images_failed": 0, "images_duplicate": 0, "bytes": 0, "duration_seconds": 0.0,
+            "done": False, "error": None,
+        })
+        stats.update(updates)
+        if self.on_progress:
+            self.on_progress(channel_username, dict(stats))
+
+    def media_progress(self, downloader):
+        return {
+            "images_downloaded": downloader.stats["downloaded"],
+            "images_skipped": downloader.stats["skipped"],
+            "images_failed": downloader.stats["failed"],
+            "images_duplicate": downloader.stats["duplicates"],
+            "bytes": downloader.stats["bytes"],
+        }
 
-    async def scrape_channel(self, channel_username, limit=SCRAPE_LIMIT):
-        logging.info(f"Starting scrape for {channel_username}...")
+    async def message_record(self, message, channel_username, img_store_path, downloader):
+        """Builds the lake record for a message, queueing its photo (if any) for download."""
+        msg_data = {
+            "message_id": message.id,
+            "channel_name": channel_username,
+            "message_date": str(message.date),
+            "message_text": message.text or "",
+            "has_media": message.photo is not None,
+            "views": message.views or 0,
+            "forwards": message.forwards or 0,
+            "image_path": None
+        }
+
+        if message.photo:
+            image_filename = f"{message.id}.jpg"
+            image_path = os.path.join(img_store_path, image_filename)
+            expected_size = message.file.size if message.file else None
+            await downloader.submit(message.photo, image_path, expected_size)
+            msg_data["image_path"] = image_path
+        return msg_data
+
+    @traced("scraper.scrape_channel")
+    async def scrape_channel(self, channel_username, limit=SCRAPE_LIMIT, day=None):
+        """
+        Scrapes new messages since the channel checkpoint, oldest first (a channel
+        without one starts at its `limit` newest messages). With `day` set, scrapes
+        exactly the messages posted on that (UTC) date instead, into the lake
+        folder for that date, without reading or moving the checkpoint, so any
+        day can be backfilled or retried on its own.
+        """
+        logging.info(f"Starting scrape for {channel_username}{f' on {day}' if day else ''}...")
+        label(channel=channel_username)
+        started = time.perf_counter()
         try:
+            await self.limiter.acquire()
             entity = await self.client.get_entity(channel_username)
             channel_name = entity.title
             
-            # Use checkpoint to resume
-            offset_id = self.checkpoints.get(channel_username, 0)
+            if day is None:
+                # Use checkpoint to resume
+                offset_id = self.checkpoints.get(channel_username, 0)
+                if not offset_id:
+                    # First run: start `limit` messages below the latest one, so the newest
+                    # messages are scraped (oldest first) rather than the channel's oldest ever
+                    await self.limiter.acquire()
+                    latest = await self.client.get_messages(entity, limit=1)
+                    offset_id = max(0, latest[0].id - limit) if latest else 0
+                window = dict(limit=limit, min_id=offset_id)
+                day_end = None
+                folder = datetime.now().strftime("%Y-%m-%d")
+            else:
+                day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+                day_end = day_start + timedelta(days=1)
+                window = dict(limit=None, offset_date=day_start)
+                folder = day.isoformat()
             
-            messages = []
             count = 0
             
             # Sort directory by date
-            today = datetime.now().strftime("%Y-%m-%d")
-            store_path = os.path.join(RAW_DATA_PATH, today)
+            store_path = os.path.join(RAW_DATA_PATH, folder)
             os.makedirs(store_path, exist_ok=True)
             
             img_store_path = os.path.join(IMAGE_DATA_PATH, channel_username.replace("@", ""))
-            os.makedirs(img_store_path, exist_ok=True)
+            if self.image_store is None:
+                os.makedirs(img_store_path, exist_ok=True)
 
-            async for message in self.client.iter_messages(entity, limit=limit, min_id=offset_id):
-                msg_data = {
-                    "message_id": message.id,
-                    "channel_name": channel_username,
-                    "message_date": str(message.date),
-                    "message_text": message.text or "",
-                    "has_media": message.photo is not None,
-                    "views": message.views or 0,
-                    "forwards": message.forwards or 0,
-                    "image_path": None
-                }
-
-                if message.photo:
-                    image_filename = f"{message.id}.jpg"
-                    image_path = os.path.join(img_store_path, image_filename)
-                    await self.client.download_media(message.photo, file=image_path)
-                    msg_data["image_path"] = image_path
-
-                messages.append(msg_data)
-                count += 1
-                
-                # Update checkpoint with the latest ID seen
-                if message.id > self.checkpoints.get(channel_username, 0):
-                    self.checkpoints[channel_username] = message.id
-
-            if messages:
-                json_filename = f"{channel_username.replace('@', '')}.json"
-                with open(os.path.join(store_path, json_filename), "w", encoding="utf-8") as f:
-                    json.dump(messages, f, ensure_ascii=False, indent=4)
-                
-                self.save_checkpoints()
-                logging.info(f"Successfully scraped {count} messages from {channel_username}")
+            # Messages are streamed to JSONL segments in batches instead of held in memory
+            sink = JsonlSink(
+                store_path, channel_username.replace("@", ""),
+                batch_size=SINK_BATCH_SIZE, compression=SINK_COMPRESSION
+            )
+
+            # Photos are fetched by a worker pool while iteration continues
+            downloader = MediaDownloader(
+                self.client, channel_username,
+                workers=DOWNLOAD_WORKERS, queue_size=DOWNLOAD_QUEUE_SIZE, limiter=self.limiter,
+            dedup=self.image_index, store=self.image_store
+            )
+            await downloader.start()
+            try:
+                await self.retry_failed_downloads(channel_username, entity, img_store_path, downloader)
+                # Oldest first, so every flushed batch can safely move the checkpoint forward
+                async for message in self.client.iter_messages(entity, reverse=True, **window):
+                    if day_end is not None and message.date >= day_end:
+                        break
+                    if count % MESSAGES_PER_REQUEST == 0:
+                        await self.limiter.acquire()
+                    msg_data = await self.message_record(message, channel_username, img_store_path, downloader)
+                    count += 1
+                    batch = sink.write(msg_data)
+                    if batch:
+                        await self.settle_batch(channel_username, batch, downloader, commit=day is None)
+                        self.report_progress(
+                            channel_username, messages=sink.records_written, segments=len(sink.segments),
+                            duration_seconds=round(time.perf_counter() - started, 3),
+                            **self.media_progress(downloader)
+                        )
+            finally:
+                # Persist whatever was read before an error so it is not re-scraped,
+                # once its photos are done
+                batch = sink.close()
+                await downloader.close()
+                self.record_failed_downloads(channel_username, downloader)
+                if day is None:
+                    self.commit_batch(channel_username, batch)
+                self.report_progress(
+                    channel_username, messages=sink.records_written, segments=len(sink.segments),
+                    **self.media_progress(downloader)
+                )
+
+            if count:
+                logging.info(f"Successfully scraped {count} messages from {channel_username} into {len(sink.segments)} segment(s)")
             else:
                 logging.info(f"No new messages found for {channel_username}")
 
-        except errors.FloodWaitError as e:
-            logging.error(f"Rate limited. Need to wait for {e.seconds} seconds")
-            await asyncio.sleep(e.seconds)
+        except errors.FloodWaitError:
+            # Handled by scrape_with_retries, which pauses every channel and resumes this one
+            raise
         except Exception as e:
             logging.error(f"Error scraping {channel_username}: {str(e)}")
+            self.report_progress(channel_username, error=str(e))
+
+        self.report_progress(
+            channel_username, done=True, duration_seconds=round(time.perf_counter() - started, 3)
+        )
+        stats = self.channel_stats[channel_username]
+        record(
+            messages=stats["messages"], images=stats["images_downloaded"],
+            images_failed=stats["images_failed"], images_duplicate=stats["images_duplicate"],
+            bytes=stats["bytes"]
+        )
+        return stats
+
+    def window_checkpoint_path(self, channel_username, low, high):
+        return os.path.join(BACKFILL_DIR, channel_username.replace("@", ""), f"{low}-{high}.json")
+
+    def load_window_checkpoint(self, channel_username, low, high):
+        path = self.window_checkpoint_path(channel_username, low, high)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {"last_id": low - 1, "messages": 0, "done": False}
+
+    def save_window_checkpoint(self, channel_username, low, high, checkpoint):
+        path = self.window_checkpoint_path(channel_username, low, high)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(checkpoint, f, indent=4)
+        os.replace(tmp_file, path)
+
+    async def backfill_window(self, channel_username, entity, low, high, first_id, top_id, totals):
+        """
+        Scrapes message ids max(low, first_id)..high oldest first, resuming after
+        the window's checkpoint. Records go to the lake folder of their message date, as in a
+        day scrape; the window checkpoint advances after every durable segment
+        and is marked done once the window has been read to the end. The top
+        window (high > top_id) is never marked done, so ids posted after this
+        run are picked up from its checkpoint by the next backfill.
+        """
+        checkpoint = self.load_window_checkpoint(channel_username, low, high)
+        if checkpoint["done"]:
+            return checkpoint
+        checkpoint["last_id"] = max(checkpoint["last_id"], first_id - 1)
+
+        img_store_path = os.path.join(IMAGE_DATA_PATH, channel_username.replace("@", ""))
+        if self.image_store is None:
+            os.makedirs(img_store_path, exist_ok=True)
+        prefix = channel_username.replace("@", "")
+
+        def commit(batch):
+            if not batch:
+                return
+            checkpoint["last_id"] = max(checkpoint["last_id"], max(msg["message_id"] for msg in batch))
+            checkpoint["messages"] += len(batch)
+            self.save_window_checkpoint(channel_username, low, high, checkpoint)
+            totals["messages"] += len(batch)
+            totals["segments"] += 1
+            self.report_progress(channel_username, messages=totals["messages"], segments=totals["segments"])
+
+        downloader = MediaDownloader(
+            self.client, channel_username,
+            workers=DOWNLOAD_WORKERS, queue_size=DOWNLOAD_QUEUE_SIZE, limiter=self.limiter,
+            dedup=self.image_index, store=self.image_store
+        )
+        await downloader.start()
+        sink, folder, count = None, None, 0
+        try:
+            # min_id/max_id are exclusive; messages arrive in ascending id (and date) order,
+            # so one sink per date folder is open at a time
+            async for message in self.client.iter_messages(
+                entity, reverse=True, limit=None, min_id=checkpoint["last_id"], max_id=high + 1
+            ):
+                if count % MESSAGES_PER_REQUEST == 0:
+                    await self.limiter.acquire()
+                count += 1
+                message_folder = message.date.astimezone(timezone.utc).strftime("%Y-%m-%d")
+                if message_folder != folder:
+                    if sink is not None:
+                        commit(sink.close())
+                    folder = message_folder
+                    sink = JsonlSink(
+                        os.path.join(RAW_DATA_PATH, folder), prefix,
+                        batch_size=SINK_BATCH_SIZE, compression=SINK_COMPRESSION
+                    )
+                commit(sink.write(await self.message_record(message, channel_username, img_store_path, downloader)))
+            checkpoint["last_id"] = max(checkpoint["last_id"], min(high, top_id))
+            checkpoint["done"] = high <= top_id
+        finally:
+            # Persist whatever was read before an error so a retry resumes after it
+            if sink is not None:
+                commit(sink.close())
+            await downloader.close()
+            self.record_failed_downloads(channel_username, downloader)
+            for key, value in self.media_progress(downloader).items():
+                totals[key] += value
+            self.save_window_checkpoint(channel_username, low, high, checkpoint)
+
+        logging.info(f"Backfilled {channel_username} ids {low}-{high}: {checkpoint['messages']} messages")
+        return checkpoint
+
+    async def backfill_window_with_retries(self, channel_username, entity, low, high, first_id, top_id, totals, semaphore):
+        for attempt in range(MAX_FLOOD_RETRIES + 1):
+            async with semaphore:
+                try:
+                    return await self.backfill_window(channel_username, entity, low, high, first_id, top_id, totals)
+                except errors.FloodWaitError as e:
+                    logging.warning(
+                        f"Rate limited backfilling {channel_username} ids {low}-{high}. "
+                        f"Pausing all requests for {e.seconds} seconds, then resuming the window"
+                    )
+                    self.limiter.pause(e.seconds)
+                    incr("scraper.flood_retries", channel=channel_username)
+        raise RuntimeError(f"Gave up on {channel_username} ids {low}-{high} after {MAX_FLOOD_RETRIES} flood waits")
+
+    @traced("scraper.backfill_channel")
+    async def backfill_channel(self, channel_username, window_size=BACKFILL_WINDOW_SIZE,
+                               concurrency=BACKFILL_CONCURRENCY, shard=0, shards=1):
+        """
+        Backfills a channel's history from its checkpoint up to its latest
+        message by splitting the id range into min_id/max_id windows and
+        scraping up to `concurrency` of them at once. Each window resumes from
+        its own checkpoint. With shards > 1 only every shards-th window is taken
+        (starting at `shard`), so separate processes, each with its own
+        session, can split a backfill. The channel checkpoint moves to the top
+        of the range once every window is done.
+        """
+        logging.info(f"Starting backfill for {channel_username}...")
+        label(channel=channel_username)
+        started = time.perf_counter()
+        totals = {"messages": 0, "segments": 0, "images_downloaded": 0, "images_skipped": 0,
+                  "images_failed": 0, "images_duplicate": 0, "bytes": 0}
+        try:
+            await self.limiter.acquire()
+            entity = await self.client.get_entity(channel_username)
+            await self.limiter.acquire()
+            latest = await self.client.get_messages(entity, limit=1)
+            top_id = latest[0].id if latest else 0
+            start_id = self.checkpoints.get(channel_username, 0) + 1
+
+            windows = backfill_windows(start_id, top_id, window_size)
+            mine = [w for i, w in enumerate(windows) if i % shards == shard]
+            logging.info(
+                f"{channel_username}: ids {start_id}-{top_id} in {len(windows)} windows, "
+                f"{len(mine)} in shard {shard}/{shards}"
+            )
+
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            results = await asyncio.gather(*[
+                self.backfill_window_with_retries(channel_username, entity, low, high, start_id, top_id, totals, semaphore)
+                for low, high in mine
+            ], return_exceptions=True)
+            failures = [r for r in results if isinstance(r, Exception)]
+            for failure in failures:
+                logging.error(f"Backfill window failed for {channel_username}: {failure}")
+
+            # Other shards may still be running; only the last to finish advances the checkpoint.
+            # The top window stays open but counts once it has been read up to top_id.
+            if not failures and all(
+                checkpoint["done"] or checkpoint["last_id"] >= top_id
+                for checkpoint in (self.load_window_checkpoint(channel_username, low, high) for low, high in windows)
+            ):
+                self.commit_batch(channel_username, [{"message_id": top_id}])
+            self.report_progress(
+                channel_username, **totals, error=f"{len(failures)} window(s) failed" if failures else None
+            )
+
+        except errors.FloodWaitError:
+            raise
+        except Exception as e:
+            logging.error(f"Error backfilling {channel_username}: {str(e)}")
+            self.report_progress(channel_username, **totals, error=str(e))
+
+        self.report_progress(
+            channel_username, done=True, duration_seconds=round(time.perf_counter() - started, 3)
+        )
+        stats = self.channel_stats[channel_username]
+        record(
+            messages=stats["messages"], images=stats["images_downloaded"],
+            images_failed=stats["images_failed"], images_duplicate=stats["images_duplicate"],
+            bytes=stats["bytes"]
+        )
+        return stats
+
+    @traced("scraper.refresh_engagement")
+    async def refresh_engagement(self, channel_username, window=REFRESH_WINDOW_IDS, batch_size=REFRESH_BATCH_SIZE):
+        """
+        Re-polls views and forwards for the channel's `window` most recent
+        message ids (below its latest message), fetched by id list in batches
+        of batch_size instead of re-reading history. The latest id comes from
+        Telegram rather than the checkpoint, which date-mode scrapes (Dagster
+        partitions) never move. Snapshots are written to today's engagement
+        lake folder for load_to_postgres.py --engagement to apply. The
+        checkpoint is not moved.
+        """
+        logging.info(f"Refreshing engagement for {channel_username}...")
+        label(channel=channel_username)
+        started = time.perf_counter()
+        try:
+            await self.limiter.acquire()
+            entity = await self.client.get_entity(channel_username)
+            await self.limiter.acquire()
+            latest = await self.client.get_messages(entity, limit=1)
+            last_id = latest[0].id if latest else 0
+
+            sink = JsonlSink(
+                os.path.join(ENGAGEMENT_DATA_PATH, datetime.now().strftime("%Y-%m-%d")),
+                channel_username.replace("@", ""),
+                batch_size=SINK_BATCH_SIZE, compression=SINK_COMPRESSION
+            )
+            try:
+                for ids in refresh_batches(last_id, window, batch_size):
+                    await self.limiter.acquire()
+                    messages = await self.client.get_messages(entity, ids=ids)
+                    polled_at = datetime.now(timezone.utc).isoformat()
+                    for message in messages:
+                        # Deleted (or never used) ids come back as None
+                        if message is None:
+                            continue
+                        sink.write({
+                            "message_id": message.id,
+                            "channel_name": channel_username,
+                            "views": getattr(message, "views", None) or 0,
+                            "forwards": getattr(message, "forwards", None) or 0,
+                            "polled_at": polled_at,
+                        })
+            finally:
+                sink.close()
+                self.report_progress(channel_username, messages=sink.records_written, segments=len(sink.segments))
+
+            logging.info(
+                f"Refreshed engagement for {sink.records_written} of the last {min(window, last_id)} "
+                f"message ids in {channel_username}"
+            )
 
-    async def run(self):
+        except errors.FloodWaitError:
+            raise
+        except Exception as e:
+            logging.error(f"Error refreshing engagement for {channel_username}: {str(e)}")
+            self.report_progress(channel_username, error=str(e))
+
+        self.report_progress(
+            channel_username, done=True, duration_seconds=round(time.perf_counter() - started, 3)
+        )
+        stats = self.channel_stats[channel_username]
+        record(messages=stats["messages"])
+        return stats
+
+    async def scrape_with_retries(self, channel_username, semaphore, day=None, backfill=None, refresh=False):
+        """
+        Scrapes one channel under the concurrency cap. On a flood wait the shared
+        limiter is paused for everyone and the channel is resumed from its
+        checkpoint (or its day window restarted), rather than abandoned.
+        backfill: optional (shard, shards) to run backfill_channel instead.
+        refresh: run refresh_engagement instead.
+        """
+        for attempt in range(MAX_FLOOD_RETRIES + 1):
+            async with semaphore:
+                try:
+                    if backfill is not None:
+                        shard, shards = backfill
+                        await self.backfill_channel(channel_username, shard=shard, shards=shards)
+                    elif refresh:
+                        await self.refresh_engagement(channel_username)
+                    else:
+                        await self.scrape_channel(channel_username, day=day)
+                    return
+                except errors.FloodWaitError as e:
+                    logging.warning(
+                        f"Rate limited on {channel_username}. Pausing all requests for {e.seconds} seconds, "
+                        f"then resuming from message {self.checkpoints.get(channel_username, 0)}"
+                    )
+                    self.limiter.pause(e.seconds)
+                    incr("scraper.flood_retries", channel=channel_username)
+        logging.error(f"Giving up on {channel_username} after {MAX_FLOOD_RETRIES} flood waits")
+        self.report_progress(channel_username, error=f"Gave up after {MAX_FLOOD_RETRIES} flood waits")
+
+    async def run(self, channels=None, day=None, backfill=None, refresh=False):
         await self.client.start(phone=TG_PHONE)
-        tasks = [self.scrape_channel(channel) for channel in CHANNELS]
-        await asyncio.gather(*tasks)
+        self.image_store = image_store.default_store()
+        if IMAGE_DEDUP and image_dedup.Image is not None:
+            self.image_index = image_dedup.ImageIndex(
+                max_distance=PHASH_MAX_DISTANCE, exists=image_store.image_exists
+            )
+        elif IMAGE_DEDUP:
+            logging.warning("IMAGE_DEDUP is on but pillow is not installed; reposts will not be deduplicated")
+        try:
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+            tasks = [self.scrape_with_retries(channel, semaphore, day, backfill, refresh) for channel in channels or CHANNELS]
+            await asyncio.gather(*tasks)
+        finally:
+            # The client is bound to this event loop; the session file keeps the login for the next run
+            await self.client.disconnect()
+            if self.image_index is not None:
+                for channel, stats in sorted(self.image_index.channel_stats().items()):
+                    logging.info(
+                        f"{channel}: {stats['duplicates']} of {stats['images']} indexed images are reposts "
+                        f"({stats['duplicate_ratio']:.1%})"
+                    )
+                self.image_index.close()
+                self.image_index = None
+            if self.image_store is not None:
+                self.image_store.flush()
+                self.image_store = None
+
+        metrics = self.limiter.metrics
+        logging.info(
+            f"Issued {metrics['requests']} requests, waited {metrics['wait_seconds']:.1f}s on the rate limiter, "
+            f"{metrics['flood_waits']} flood waits ({metrics['flood_wait_seconds']:.0f}s)"
+        )
+        return metrics
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Telegram channels into the raw data lake.")
+    parser.add_argument(
+        "--channel", action="append",
+        help="Channel to scrape (repeatable). Defaults to every channel in config.CHANNELS."
+    )
+    parser.add_argument(
+        "--date", type=date.fromisoformat,
+        help="Scrape only messages posted on this UTC date (YYYY-MM-DD) instead of resuming from the checkpoint."
+    )
+    parser.add_argument(
+        "--backfill", action="store_true",
+        help="Scrape each channel's full history from its checkpoint in concurrent message-id windows."
+    )
+    parser.add_argument(
+        "--shard", default="0/1",
+        help="With --backfill, take only this process's share of the windows, as INDEX/COUNT (e.g. 1/4). "
+             "Give each process its own TG_SESSION_PATH."
+    )
+    parser.add_argument(
+        "--refresh", action="store_true",
+        help="Re-poll views/forwards for each channel's most recent message ids instead of scraping new messages."
+    )
+    args = parser.parse_args()
+
+    backfill = tuple(int(part) for part in args.shard.split("/")) if args.backfill else None
     scraper = TelegramScraper()
-    asyncio.run(scraper.run())
+    asyncio.run(scraper.run(args.channel, args.date, backfill, args.refresh))
@@ -0,0 +1,30 @@
+import os
+import json
+import uuid
+from datetime import datetime, timezone
+
+# Written by the pipeline once dbt has rebuilt the marts; read by the API to invalidate cached reports
+VERSION_FILE = os.getenv("WAREHOUSE_VERSION_FILE", os.path.join("data", "warehouse_version.json"))
+
+def write_version_stamp(source, path=VERSION_FILE):
+    """Records that the warehouse changed. Written atomically; returns the new version."""
+    now = datetime.now(timezone.utc)
+    stamp = {
+        "version": f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        "source": source,
+        "written_at": now.isoformat(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, path)
+    return stamp["version"]
+
+def read_version_stamp(path=VERSION_FILE):
+    """Returns the current warehouse version, or "0" if no load has stamped it yet."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return "0"
@@ -2,12 +2,31 @@ import os
 import csv
 import logging
 import random
+import hashlib
+import argparse
+from detection_engine import DetectionEngine, MockBackend, UltralyticsBackend, iter_batches
+from detection_cache import DetectionCache
+from jsonl_sink import iter_lake_records, is_channel_file
+from instrumentation import traced, record
+from image_dedup import ImageIndex, IMAGE_INDEX_PATH
+from image_store import default_store, image_exists
 
 # Paths
 RAW_IMAGE_DIR = os.path.join("data", "raw", "images")
+RAW_DATA_PATH = os.path.join("data", "raw", "telegram_messages")
 OUTPUT_CSV = os.path.join("data", "processed", "yolo_detections.csv")
+CACHE_PATH = os.path.join("data", "processed", "detection_cache.sqlite")
+CSV_HEADER = ["image_path", "channel_name", "message_id", "detected_objects", "confidence_scores", "classification"]
 LOG_DIR = "logs"
 
+# Engine settings
+MOCK_VERSION = "2"  # v2: stable SHA-256 seeding, so cached v1 results are recomputed once
+DETECTION_BACKEND = os.getenv("DETECTION_BACKEND", "mock")  # "mock" or "ultralytics"
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "yolov8n.pt")
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", 32))
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", 4))
+DETECTION_WINDOW = int(os.getenv("DETECTION_WINDOW", 2048))  # Images checked against the cache per engine run
+
 # Ensure directories exist
 os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -33,61 +52,218 @@ def classify_image_mock(image_path):
         ("Lifestyle", "person|dog", "0.75|0.60"),
         ("Other", "chair|table", "0.50|0.45")
     ]
-    # Deterministic based on hash so repeated runs give same result for same file
-    seed = hash(image_path)
-    random.seed(seed)
+    # Deterministic across processes: seed from a SHA-256 of the normalised path
+    # (built-in hash() is salted per interpreter), and use a private RNG so
+    # parallel callers never share or clobber the global random state.
+    normalised = "/".join(os.path.normpath(image_path).split(os.sep))
+    seed = int.from_bytes(hashlib.sha256(normalised.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
     
-    return random.choice(choices)
+    return rng.choice(choices)
+
+def build_backend(name=DETECTION_BACKEND):
+    if name == "mock":
+        return MockBackend(classify_image_mock, version=MOCK_VERSION)
+    if name == "ultralytics":
+        return UltralyticsBackend(YOLO_WEIGHTS)
+    raise ValueError(f"Unknown detection backend: {name}")
+
+def iter_image_paths(image_dir=RAW_IMAGE_DIR):
+    """Walks channel directories lazily, yielding image file paths."""
+    for root, dirs, files in os.walk(image_dir):
+        for file in files:
+            if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                yield os.path.join(root, file)
 
-def main():
+def iter_partition_image_paths(day, channel, raw_data_path=RAW_DATA_PATH):
+    """Yields the downloaded images referenced by one channel's lake files for one date folder."""
+    folder_path = os.path.join(raw_data_path, day)
+    if not os.path.isdir(folder_path):
+        return
+    seen = set()
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.startswith(".") or not is_channel_file(file_name, channel):
+            continue
+        for message in iter_lake_records(os.path.join(folder_path, file_name)):
+            image_path = message.get("image_path")
+            if image_path and image_path not in seen and image_exists(image_path):
+                seen.add(image_path)
+                yield image_path
+
+def parse_image_path(image_path):
+    """Extracts (channel_name, message_id) from data/raw/images/{channel}/{msg_id}.jpg."""
+    path_parts = os.path.normpath(image_path).split(os.sep)
     try:
-        logging.info("Starting MOCK Object Detection Pipeline...")
-        
-        # Prepare CSV output
-        with open(OUTPUT_CSV, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Header
-            writer.writerow(["image_path", "channel_name", "message_id", "detected_objects", "confidence_scores", "classification"])
-
-            logging.info(f"Scanning images in {RAW_IMAGE_DIR}...")
-            
-            # Walk through channel directories
-            count = 0
-            if os.path.exists(RAW_IMAGE_DIR):
-                for root, dirs, files in os.walk(RAW_IMAGE_DIR):
-                    for file in files:
-                        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                            image_path = os.path.join(root, file)
-                            
-                            # Extract metadata from path: data/raw/images/{channel}/{msg_id}.jpg
-                            path_parts = os.path.normpath(image_path).split(os.sep)
-                            try:
-                                channel_name = path_parts[-2]
-                                message_id = os.path.splitext(path_parts[-1])[0]
-                            except IndexError:
-                                logging.warning(f"Could not parse path: {image_path}")
-                                continue
-
-                            # Mock Inference
-                            classification, objects, confs = classify_image_mock(image_path)
-                            
-                            writer.writerow([
-                                image_path,
-                                channel_name,
-                                message_id,
-                                objects,
-                                confs,
-                                classification
-                            ])
-                            
-                            count += 1
-            else:
-                 logging.warning(f"Directory {RAW_IMAGE_DIR} does not exist. No images to scan.")
-
-            logging.info(f"Completed! Processed {count} images. Results saved to {OUTPUT_CSV}")
+        return path_parts[-2], os.path.splitext(path_parts[-1])[0]
+    except IndexError:
+        return None
+
+def iter_detection_rows(engine, image_paths, cache, model_version, stats, window=DETECTION_WINDOW, index=None):
+    """
+    Yields one CSV_HEADER row per image without an exported detection for
+    model_version, reusing cached results (also those of the canonical image
+    of a repost, given the scraper's ImageIndex) and running the rest through the
+    engine. Paths are handled in windows so that at most one window of rows is
+    buffered however the hits and misses are distributed. Each window's hashes and
+    results are flushed to the cache before its rows are yielded, so no write
+    transaction stays open while the consumer works. Rows are marked exported as
+    they are produced; the caller commits the cache once they are durable.
+    """
+    def to_row(image_path, content_hash, result):
+        parsed = parse_image_path(image_path)
+        if parsed is None:
+            logging.warning(f"Could not parse path: {image_path}")
+            return None
+        classification, objects, confs = result
+        cache.mark_exported(image_path, content_hash, model_version)
+        stats["rows_written"] += 1
+        return [image_path, parsed[0], parsed[1], objects, confs, classification]
+
+    for paths in iter_batches(image_paths, window):
+        # content hash -> paths waiting on it; byte-identical copies (e.g. reposts
+        # the scraper hard-linked to their original) are inferred once per window
+        pending = {}
+        ready = []
+        for image_path in paths:
+            content_hash = cache.content_hash(image_path)
+            if cache.is_exported(image_path, content_hash, model_version):
+                stats["unchanged"] += 1
+                continue
+            cached = cache.get(content_hash, model_version)
+            if not cached and index is not None:
+                canonical = index.canonical_for(image_path)
+                if canonical and canonical != image_path and image_exists(canonical):
+                    cached = cache.get(cache.content_hash(canonical), model_version)
+                    if cached:
+                        stats["duplicate_hits"] += 1
+                        cache.put(content_hash, model_version, cached)
+            if cached:
+                # Only images without a cached result for this model reach the engine
+                stats["cache_hits"] += 1
+                row = to_row(image_path, content_hash, cached)
+                if row:
+                    ready.append(row)
+                continue
+            pending.setdefault(content_hash, []).append(image_path)
+
+        if pending:
+            # Hashes are committed before inference, results once per engine batch
+            cache.flush()
+            first_paths = {group[0]: content_hash for content_hash, group in pending.items()}
+            for image_path, result in engine.run(list(first_paths)):
+                content_hash = first_paths[image_path]
+                cache.put(content_hash, model_version, result)
+                stats["inferred"] += 1
+                if stats["inferred"] % engine.batch_size == 0:
+                    cache.flush()
+                for position, same_image in enumerate(pending[content_hash]):
+                    if position:
+                        stats["cache_hits"] += 1
+                    row = to_row(same_image, content_hash, result)
+                    if row:
+                        ready.append(row)
 
+        cache.flush()
+        yield from ready
+
+class SinkError(RuntimeError):
+    """The detection sink failed to load the rows; nothing was recorded as exported."""
+
+@traced("yolo.main")
+def main(backend=None, batch_size=DETECTION_BATCH_SIZE, workers=DETECTION_WORKERS, use_processes=False,
+         channel=None, day=None, output_csv=OUTPUT_CSV, sink=None):
+    """
+    Classifies images that have no exported detection for the current model yet.
+    Results are cached by image content hash + model version, and new rows are
+    appended to output_csv, which load_yolo_to_postgres consumes and upserts.
+    With a sink (e.g. load_yolo_to_postgres.load_detections) the rows are
+    streamed to it instead and no CSV is written; it must return its stats, or
+    None on failure, in which case SinkError is raised and the rows are
+    re-exported on the next run.
+    channel and day (YYYY-MM-DD) restrict the scan to that channel's images,
+    and to those referenced by that day's lake files, e.g. for one Dagster partition.
+    """
+    try:
+        backend = backend or build_backend()
+        model_version = backend.model_version
+        logging.info(f"Starting Object Detection Pipeline ({backend.name} backend)...")
+
+        store = default_store()
+        if store is None and not os.path.exists(RAW_IMAGE_DIR):
+            logging.warning(f"Directory {RAW_IMAGE_DIR} does not exist. No images to scan.")
+            return None
+
+        cache = DetectionCache(CACHE_PATH, store=store)
+        stats = {"unchanged": 0, "cache_hits": 0, "duplicate_hits": 0, "inferred": 0, "rows_written": 0}
+        # Only read here: the index is written by the scraper (or image_dedup.py) as images are stored
+        index = ImageIndex(IMAGE_INDEX_PATH, exists=image_exists) if os.path.exists(IMAGE_INDEX_PATH) else None
+
+        channel_dir = channel.replace("@", "") if channel else None
+        if day and channel:
+            image_paths = iter_partition_image_paths(day, channel)
+        elif store is not None:
+            # The packed store's index lists images without touching the filesystem
+            image_paths = store.iter_paths(channel_dir)
+        elif channel:
+            image_paths = iter_image_paths(os.path.join(RAW_IMAGE_DIR, channel_dir))
+        else:
+            image_paths = iter_image_paths()
+
+        logging.info(f"Scanning images in {store.root if store is not None else RAW_IMAGE_DIR}...")
+        engine = DetectionEngine(backend, batch_size=batch_size, workers=workers, use_processes=use_processes)
+        rows = iter_detection_rows(engine, image_paths, cache, model_version, stats, index=index)
+
+        if sink is not None:
+            load_stats = sink(rows)
+            if load_stats is None:
+                cache.close()  # Uncommitted: nothing is recorded as exported
+                if index is not None:
+                    index.close()
+                raise SinkError("Detection sink failed to load the rows")
+            stats["load"] = load_stats
+            destination = "the sink"
+        else:
+            # Append to the pending CSV; the loader removes it once it has been loaded
+            write_header = not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0
+            with open(output_csv, mode='a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(CSV_HEADER)
+                writer.writerows(rows)
+            destination = output_csv
+
+        # Rows are durable before the cache records them as exported
+        cache.commit()
+        cache.close()
+        if index is not None:
+            index.close()
+
+        logging.info(
+            f"Completed! {stats['inferred']} images inferred, {stats['cache_hits']} served from cache "
+            f"({stats['duplicate_hits']} via a reposted original), "
+            f"{stats['unchanged']} unchanged. Wrote {stats['rows_written']} rows to {destination}"
+        )
+        record(
+            images=engine.stats["images"], images_failed=engine.stats["failed"],
+            inferred=stats["inferred"], cache_hits=stats["cache_hits"],
+            duplicate_hits=stats["duplicate_hits"], rows=stats["rows_written"]
+        )
+        return {**engine.stats, **stats}
+
+    except SinkError:
+        # The caller (e.g. the Dagster asset) has to see a failed load, not an empty result
+        raise
     except Exception as e:
         logging.critical(f"Fatal error in pipeline: {e}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Classify scraped images and write yolo_detections.csv.")
+    parser.add_argument("--backend", default=DETECTION_BACKEND, choices=["mock", "ultralytics"])
+    parser.add_argument("--batch-size", type=int, default=DETECTION_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DETECTION_WORKERS)
+    parser.add_argument("--processes", action="store_true", help="Preprocess in a process pool instead of threads.")
+    parser.add_argument("--channel", help="Only classify this channel's images.")
+    parser.add_argument("--date", help="With --channel, only images referenced by that day's lake files (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    main(build_backend(args.backend), args.batch_size, args.workers, args.processes, args.channel, args.date)
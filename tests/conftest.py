@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Modules under src/ import their siblings by bare name (as when run as scripts),
+# so src/ must be importable whichever test file is collected first
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
@@ -0,0 +1,131 @@
+import asyncio
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from api.cache import InMemoryBackend, RedisBackend, ResultCache, VersionReader
+from src.version_stamp import write_version_stamp, read_version_stamp
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """Local stand-in for redis.asyncio.Redis (get/set with ex=)."""
+
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+def test_memory_backend_expires_and_evicts_lru():
+    async def _run():
+        clock = FakeClock()
+        backend = InMemoryBackend(maxsize=2, clock=clock)
+        await backend.set("a", 1, ttl=10)
+        await backend.set("b", 2, ttl=10)
+        await backend.get("a")  # "b" is now least recently used
+        await backend.set("c", 3, ttl=10)
+        evicted = await backend.get("b")
+        clock.now = 11
+        expired = await backend.get("a")
+        return evicted, expired
+
+    assert asyncio.run(_run()) == (None, None)
+
+def test_redis_backend_round_trips_json():
+    async def _run():
+        client = FakeRedis()
+        backend = RedisBackend(client)
+        await backend.set("k", [{"product_name": "paracetamol", "mention_count": 3}], ttl=60)
+        return client, await backend.get("k"), await backend.get("missing")
+
+    client, value, missing = asyncio.run(_run())
+    assert list(client.store) == ["api-cache:k"]
+    assert value == [{"product_name": "paracetamol", "mention_count": 3}]
+    assert missing is None
+
+def test_version_stamp_changes_cache_key(tmp_path):
+    path = str(tmp_path / "warehouse_version.json")
+    reader = VersionReader(path)
+    assert reader() == "0"
+
+    version = write_version_stamp("load_raw_data", path)
+    assert read_version_stamp(path) == version
+    assert reader() == version
+
+    cache = ResultCache(InMemoryBackend(), version=reader)
+    before = cache.make_key("top-products", {"limit": 10})
+    write_version_stamp("enrich_data_yolo", path)
+    assert cache.make_key("top-products", {"limit": 10}) != before
+
+def _app(cache, calls):
+    app = FastAPI()
+
+    @app.get("/report")
+    async def report(request: Request, response: Response, limit: int = 10):
+        async def compute():
+            calls.append(limit)
+            return {"limit": limit}
+        return await cache.get_or_compute(request, response, "report", {"limit": limit}, compute)
+
+    return app
+
+def test_cache_hit_and_etag_revalidation():
+    version = ["v1"]
+    cache = ResultCache(InMemoryBackend(), version=lambda: version[0])
+    calls = []
+    client = TestClient(_app(cache, calls))
+
+    first = client.get("/report?limit=5")
+    second = client.get("/report?limit=5")
+    assert first.json() == second.json() == {"limit": 5}
+    assert calls == [5]
+    etag = first.headers["etag"]
+
+    not_modified = client.get("/report?limit=5", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert calls == [5]
+
+    # Different params are a different entry
+    client.get("/report?limit=6")
+    assert calls == [5, 6]
+
+    # A warehouse refresh invalidates both the entry and the ETag
+    version[0] = "v2"
+    refreshed = client.get("/report?limit=5", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+    assert calls == [5, 6, 5]
+    assert cache.stats == {"hits": 1, "misses": 3, "not_modified": 1}
+
+def test_failed_compute_is_not_cached():
+    cache = ResultCache(InMemoryBackend(), version=lambda: "v1")
+    calls = []
+    app = FastAPI()
+
+    @app.get("/report")
+    async def report(request: Request, response: Response):
+        async def compute():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise LookupError("mart missing")
+            return {"ok": True}
+        try:
+            return await cache.get_or_compute(request, response, "report", {}, compute)
+        except LookupError:
+            return {"ok": False}
+
+    client = TestClient(app)
+    failed = client.get("/report")
+    assert failed.json() == {"ok": False}
+    assert "etag" not in failed.headers
+
+    recovered = client.get("/report")
+    assert recovered.json() == {"ok": True}
+    assert calls == [0, 1]
@@ -0,0 +1,52 @@
+import io
+import csv
+import json
+from datetime import datetime
+
+import pytest
+import pyarrow as pa
+from fastapi import HTTPException
+
+from api.export import BatchEncoder, negotiate_format, EXPORT_COLUMNS
+
+ROWS = [
+    (1, "@CheMed123", datetime(2026, 1, 2, 10, 30), "Paracetamol, 500mg\n\"new\"", 120, 3, True, "data/raw/images/CheMed123/1.jpg"),
+    (2, "@CheMed123", datetime(2026, 1, 2, 11, 0), None, 0, 0, False, None),
+]
+
+def stream(fmt, batches):
+    encoder = BatchEncoder(fmt)
+    return encoder.start() + b"".join(encoder.encode(rows) for rows in batches) + encoder.finish()
+
+def test_negotiate_format():
+    assert negotiate_format() == "ndjson"
+    assert negotiate_format("csv", "application/x-ndjson") == "csv"
+    assert negotiate_format(None, "text/csv;q=0.9, application/x-ndjson") == "csv"
+    assert negotiate_format(None, "application/vnd.apache.arrow.stream") == "arrow"
+    assert negotiate_format(None, "*/*") == "ndjson"
+    with pytest.raises(HTTPException) as exc:
+        negotiate_format(None, "image/png")
+    assert exc.value.status_code == 406
+
+def test_ndjson_rows_are_json_objects():
+    lines = stream("ndjson", [ROWS[:1], ROWS[1:]]).decode("utf-8").splitlines()
+    assert [json.loads(line)["message_id"] for line in lines] == [1, 2]
+    assert json.loads(lines[0])["message_date"] == "2026-01-02T10:30:00"
+    assert json.loads(lines[1])["message_text"] is None
+
+def test_csv_has_one_header_and_quotes_text():
+    rows = list(csv.reader(io.StringIO(stream("csv", [ROWS[:1], ROWS[1:]]).decode("utf-8"))))
+    assert rows[0] == EXPORT_COLUMNS
+    assert rows[1][3] == ROWS[0][3]
+    assert len(rows) == 3
+
+def test_arrow_stream_round_trips_batches():
+    reader = pa.ipc.open_stream(stream("arrow", [ROWS[:1], ROWS[1:]]))
+    batches = list(reader)
+    assert [b.num_rows for b in batches] == [1, 1]
+    table = pa.Table.from_batches(batches)
+    assert table.column("message_id").to_pylist() == [1, 2]
+    assert table.column("has_media").to_pylist() == [True, False]
+
+def test_empty_arrow_export_is_a_valid_stream():
+    assert pa.ipc.open_stream(stream("arrow", [])).read_all().num_rows == 0
@@ -0,0 +1,34 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from api.pagination import encode_cursor, decode_cursor
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def test_cursor_round_trip_restores_types():
+    when = datetime(2026, 1, 2, 10, 30)
+    assert decode_cursor(encode_cursor(when, "abc", 7), (datetime, str, int)) == [when, "abc", 7]
+    assert decode_cursor(encode_cursor(0.5, "abc", 7), (float, str, int)) == [0.5, "abc", 7]
+    # A rank that happens to be whole is encoded as an int
+    assert decode_cursor(raw_cursor([1, "abc", 7]), (float, str, int)) == [1.0, "abc", 7]
+
+@pytest.mark.parametrize("cursor, types", [
+    ("not base64!", (float, str, int)),
+    (raw_cursor({"a": 1}), (float, str, int)),
+    (raw_cursor([0.5, "abc"]), (float, str, int)),
+    # Well-formed JSON with the wrong value types for the mode
+    (raw_cursor(["yesterday", "abc", 7]), (datetime, str, int)),
+    (raw_cursor([5, "abc", 7]), (datetime, str, int)),
+    (raw_cursor(["0.5", "abc", 7]), (float, str, int)),
+    (raw_cursor([0.5, "abc", "7"]), (float, str, int)),
+    (raw_cursor([0.5, "abc", True]), (float, str, int)),
+])
+def test_malformed_cursor_is_a_400(cursor, types):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, types)
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,46 @@
+import os
+from src.jsonl_sink import iter_lake_records
+from scripts.generate_synthetic_data import generate, synthetic_channels
+from scripts.benchmark_pipeline import compare, flatten
+
+def _read_lake(root):
+    lake = os.path.join(root, "data", "raw", "telegram_messages")
+    records = []
+    for folder in sorted(os.listdir(lake)):
+        for name in sorted(os.listdir(os.path.join(lake, folder))):
+            records.extend(iter_lake_records(os.path.join(lake, folder, name)))
+    return records
+
+def test_generator_writes_scraper_format(tmp_path):
+    stats = generate(str(tmp_path), channels=2, messages=50, image_ratio=0.5, days=5)
+    records = _read_lake(str(tmp_path))
+
+    assert stats["messages"] == len(records) == 100
+    assert {r["channel_name"] for r in records} == set(synthetic_channels(2))
+    with_images = [r for r in records if r["image_path"]]
+    assert len(with_images) == stats["images"] > 0
+    assert all(r["has_media"] for r in with_images)
+    assert all(os.path.exists(tmp_path / r["image_path"]) for r in with_images)
+    assert len(os.listdir(tmp_path / "data" / "raw" / "telegram_messages")) == 5
+
+def test_generator_is_deterministic(tmp_path):
+    generate(str(tmp_path / "a"), channels=1, messages=20)
+    generate(str(tmp_path / "b"), channels=1, messages=20)
+    assert _read_lake(str(tmp_path / "a")) == _read_lake(str(tmp_path / "b"))
+
+def test_compare_against_latest_run_with_same_params():
+    params = {"channels": 3, "messages": 1000}
+    history = [
+        {"params": params, "results": {"load_json": {"seconds": 1.0}}},
+        {"params": {"channels": 3, "messages": 5000}, "results": {"load_json": {"seconds": 9.0}}},
+        {"params": params, "results": {"load_json": {"seconds": 2.0}, "api.top_products": {"p50_ms": 4.0}}},
+    ]
+    current = {"params": params, "results": {"load_json": {"seconds": 3.0}, "api.top_products": {"p50_ms": 4.0}}}
+
+    baseline, rows = compare(current, history)
+    assert baseline is history[2]
+    assert rows == [("load_json", 2.0, 3.0, 0.5), ("api.top_products", 4.0, 4.0, 0.0)]
+
+def test_flatten_api_results():
+    flat = flatten({"yolo": {"seconds": 1}, "api": {"search_fts": {"p50_ms": 2}}})
+    assert flat == {"yolo": {"seconds": 1}, "api.search_fts": {"p50_ms": 2}}
@@ -0,0 +1,90 @@
+import os
+import json
+import pyarrow.dataset as ds
+from datetime import date
+from scripts.compact_lake import compact_lake, open_dataset
+
+def _message(message_id, channel, when, views=0):
+    return {
+        "message_id": message_id,
+        "channel_name": channel,
+        "message_date": when,
+        "message_text": f"msg {message_id}",
+        "has_media": False,
+        "views": views,
+        "forwards": 0,
+        "image_path": None,
+    }
+
+def _write_jsonl(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+def test_compacts_into_channel_date_partitions(tmp_path):
+    raw = tmp_path / "raw"
+    out = str(tmp_path / "parquet")
+    _write_jsonl(str(raw / "2026-01-02" / "a-1.jsonl"), [
+        _message(1, "@CheMed123", "2026-01-01 23:00:00+00:00"),
+        _message(2, "@CheMed123", "2026-01-02 08:00:00+00:00"),
+    ])
+    # Legacy pretty-printed array
+    os.makedirs(raw / "2026-01-01")
+    with open(raw / "2026-01-01" / "lobelia.json", "w") as f:
+        json.dump([_message(7, "@lobelia4cosmetics", "2026-01-01 09:00:00")], f)
+
+    stats = compact_lake(str(raw), out)
+    assert stats["files_compacted"] == 2
+    assert stats["partitions_written"] == 3
+    assert os.path.exists(os.path.join(out, "channel=%40CheMed123", "date=2026-01-01", "data.parquet"))
+
+    table = open_dataset(out).to_table(
+        columns=["message_id", "views"],
+        filter=(ds.field("channel") == "@CheMed123") & (ds.field("date") == date(2026, 1, 2)),
+    )
+    assert table.to_pylist() == [{"message_id": 2, "views": 0}]
+
+def test_rerun_skips_unchanged_and_merges_updates(tmp_path):
+    raw = tmp_path / "raw"
+    out = str(tmp_path / "parquet")
+    _write_jsonl(str(raw / "2026-01-02" / "a-1.jsonl"), [_message(1, "@a", "2026-01-02 08:00:00+00:00", views=5)])
+    compact_lake(str(raw), out)
+
+    assert compact_lake(str(raw), out)["files_compacted"] == 0
+
+    # A later segment re-scrapes message 1 with more views and adds message 2
+    _write_jsonl(str(raw / "2026-01-03" / "a-2.jsonl"), [
+        _message(1, "@a", "2026-01-02 08:00:00+00:00", views=9),
+        _message(2, "@a", "2026-01-02 09:00:00+00:00"),
+    ])
+    stats = compact_lake(str(raw), out)
+    assert stats["files_compacted"] == 1
+    assert stats["files_skipped"] == 1
+
+    rows = open_dataset(out).to_table(columns=["message_id", "views"]).to_pylist()
+    assert rows == [{"message_id": 1, "views": 9}, {"message_id": 2, "views": 0}]
+
+def test_small_batches_give_the_same_dataset(tmp_path):
+    raw = tmp_path / "raw"
+    _write_jsonl(str(raw / "2026-01-02" / "a-1.jsonl"), [
+        _message(1, "@a", "2026-01-02 08:00:00+00:00", views=5),
+        _message(2, "@b", "2026-01-02 09:00:00+00:00"),
+        _message(3, "@a", "2026-01-02 10:00:00+00:00"),
+    ])
+    _write_jsonl(str(raw / "2026-01-03" / "a-2.jsonl"), [_message(1, "@a", "2026-01-02 08:00:00+00:00", views=9)])
+
+    batched = str(tmp_path / "batched")
+    stats = compact_lake(str(raw), batched, batch_rows=2)
+    # Rows are written every two records, so "@a" is merged twice
+    assert stats["rows_read"] == 4
+    assert stats["partitions_written"] == 3
+
+    whole = str(tmp_path / "whole")
+    compact_lake(str(raw), whole)
+    columns = ["channel", "message_id", "views"]
+    assert (
+        open_dataset(batched).to_table(columns=columns).sort_by("message_id").to_pylist()
+        == open_dataset(whole).to_table(columns=columns).sort_by("message_id").to_pylist()
+    )
+    assert compact_lake(str(raw), batched, batch_rows=2)["files_skipped"] == 2
@@ -0,0 +1,66 @@
+from src.detection_cache import DetectionCache
+
+RESULT = ("Product Display", "bottle|box", "0.92|0.88")
+
+def test_results_keyed_by_content_and_model(tmp_path):
+    cache = DetectionCache(str(tmp_path / "cache.sqlite"))
+    a = tmp_path / "a.jpg"
+    b = tmp_path / "b.jpg"
+    a.write_bytes(b"same-photo")
+    b.write_bytes(b"same-photo")
+
+    hash_a = cache.content_hash(str(a))
+    cache.put(hash_a, "mock-1", RESULT)
+
+    # A repost with identical bytes at another path hits the cache
+    assert cache.get(cache.content_hash(str(b)), "mock-1") == RESULT
+    # A different model version does not
+    assert cache.get(hash_a, "ultralytics:yolov8n.pt") is None
+
+def test_changed_file_gets_new_hash(tmp_path):
+    cache = DetectionCache(str(tmp_path / "cache.sqlite"))
+    img = tmp_path / "1.jpg"
+    img.write_bytes(b"v1")
+    first = cache.content_hash(str(img))
+
+    img.write_bytes(b"v2-longer")
+    assert cache.content_hash(str(img)) != first
+
+def test_export_tracking_survives_reopen(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    img = tmp_path / "1.jpg"
+    img.write_bytes(b"photo")
+
+    cache = DetectionCache(db)
+    content_hash = cache.content_hash(str(img))
+    assert not cache.is_exported(str(img), content_hash, "mock-1")
+    cache.put(content_hash, "mock-1", RESULT)
+    cache.mark_exported(str(img), content_hash, "mock-1")
+    cache.commit()
+    cache.close()
+
+    reopened = DetectionCache(db)
+    assert reopened.is_exported(str(img), reopened.content_hash(str(img)), "mock-1")
+    assert not reopened.is_exported(str(img), content_hash, "mock-2")
+
+def test_flush_releases_the_file_and_keeps_marks_staged(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    img = tmp_path / "1.jpg"
+    img.write_bytes(b"photo")
+
+    writer = DetectionCache(db)
+    content_hash = writer.content_hash(str(img))
+    writer.put(content_hash, "mock-1", RESULT)
+    writer.mark_exported(str(img), content_hash, "mock-1")
+    writer.flush()
+
+    # Another partition's run can write while the first one is still exporting
+    other = DetectionCache(db)
+    assert other.conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    other.put("other-hash", "mock-1", RESULT)
+    other.flush()
+    assert other.get(content_hash, "mock-1") == RESULT
+    assert not other.is_exported(str(img), content_hash, "mock-1")
+
+    writer.commit()
+    assert other.is_exported(str(img), content_hash, "mock-1")
@@ -0,0 +1,48 @@
+from src.detection_engine import DetectionEngine, MockBackend, categorize
+
+class RecordingBackend:
+    name = "recording"
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    @staticmethod
+    def preprocess(image_path):
+        if "corrupt" in image_path:
+            raise ValueError("bad image")
+        return image_path.upper()
+
+    def predict(self, inputs):
+        self.batch_sizes.append(len(inputs))
+        return [("Other", item, "0.50") for item in inputs]
+
+def test_batches_and_preserves_order():
+    backend = RecordingBackend()
+    engine = DetectionEngine(backend, batch_size=4, workers=3)
+    paths = [f"img{i}.jpg" for i in range(10)]
+
+    results = list(engine.run(paths))
+
+    assert [path for path, _ in results] == paths
+    assert results[0][1] == ("Other", "IMG0.JPG", "0.50")
+    assert backend.batch_sizes == [4, 4, 2]
+    assert engine.stats["images"] == 10
+    assert engine.stats["batches"] == 3
+
+def test_failed_preprocess_is_skipped():
+    engine = DetectionEngine(RecordingBackend(), batch_size=2, workers=2)
+    results = list(engine.run(["a.jpg", "corrupt.jpg", "b.jpg"]))
+
+    assert [path for path, _ in results] == ["a.jpg", "b.jpg"]
+    assert engine.stats["failed"] == 1
+
+def test_mock_backend_wraps_classify_function():
+    backend = MockBackend(lambda path: ("Other", path, "0.1"))
+    results = dict(DetectionEngine(backend, batch_size=8).run(["x.jpg"]))
+    assert results["x.jpg"] == ("Other", "x.jpg", "0.1")
+
+def test_categorize():
+    assert categorize(["person", "bottle"]) == "Promotional"
+    assert categorize(["bottle"]) == "Product Display"
+    assert categorize(["person"]) == "Lifestyle"
+    assert categorize(["chair"]) == "Other"
@@ -0,0 +1,77 @@
+import os
+import random
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+from src.image_dedup import dhash, hamming, BKTree, ImageIndex, link_to_canonical
+
+def save_gradient(path, size=(64, 48), noise=0, seed=0, fmt="JPEG", quality=90):
+    rng = random.Random(seed)
+    image = Image.new("L", size)
+    image.putdata([
+        max(0, min(255, (x * 4 + y * 2) % 256 + rng.randint(-noise, noise)))
+        for y in range(size[1]) for x in range(size[0])
+    ])
+    image.save(path, fmt, **({"quality": quality} if fmt == "JPEG" else {}))
+    return str(path)
+
+def test_dhash_matches_reencoded_copy_but_not_other_image(tmp_path):
+    original = save_gradient(tmp_path / "a.jpg")
+    repost = str(tmp_path / "b.jpg")
+    with Image.open(original) as image:
+        image.resize((128, 96)).save(repost, "JPEG", quality=40)
+    Image.effect_noise((64, 48), 80).save(tmp_path / "c.jpg")
+
+    assert hamming(dhash(original), dhash(repost)) <= 6
+    assert hamming(dhash(original), dhash(str(tmp_path / "c.jpg"))) > 6
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(1)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    query = values[42] ^ 0b1011  # 3 bits away from a stored hash
+    expected = sorted((hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= 10)
+    assert tree.search(query, 10) == expected
+    assert tree.search(query, 10)[0] == (3, 42)
+
+def test_index_links_reposts_to_first_copy(tmp_path):
+    index_path = str(tmp_path / "index.sqlite")
+    original = save_gradient(tmp_path / "a.jpg")
+    repost = save_gradient(tmp_path / "b.jpg", quality=50)
+    other = str(tmp_path / "c.jpg")
+    Image.effect_noise((64, 48), 80).save(other)
+
+    index = ImageIndex(index_path)
+    assert index.add(original, "@one") == original
+    assert index.add(repost, "@two") == original
+    assert index.add(other, "@two") == other
+    # Re-adding is a lookup
+    assert index.add(repost, "@two") == original
+    assert index.channel_stats() == {
+        "@one": {"images": 1, "duplicates": 0, "duplicate_ratio": 0.0},
+        "@two": {"images": 2, "duplicates": 1, "duplicate_ratio": 0.5},
+    }
+    index.close()
+
+    # The BK-tree is rebuilt from the file
+    reopened = ImageIndex(index_path)
+    assert reopened.add(save_gradient(tmp_path / "d.jpg", quality=60), "@three") == original
+    reopened.close()
+
+def test_link_to_canonical_only_shares_identical_bytes(tmp_path):
+    original = save_gradient(tmp_path / "a.jpg")
+    copy = save_gradient(tmp_path / "b.jpg")
+    size = os.path.getsize(copy)
+
+    assert link_to_canonical(copy, original) == size
+    assert os.path.samefile(copy, original)
+    assert link_to_canonical(copy, original) == 0
+
+    # A perceptual match with different bytes keeps its own file
+    repost = save_gradient(tmp_path / "c.jpg", quality=50)
+    assert link_to_canonical(repost, original) == 0
+    assert not os.path.samefile(repost, original)
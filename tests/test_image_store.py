@@ -0,0 +1,78 @@
+import os
+import hashlib
+from src.image_store import PackedImageStore, image_key
+from scripts.migrate_images_to_store import migrate
+
+def path(channel, message_id):
+    return os.path.join("data", "raw", "images", channel, f"{message_id}.jpg")
+
+def test_image_key():
+    assert image_key(path("CheMed123", 42)) == ("CheMed123", 42)
+
+def test_put_get_round_trip_and_shard_rotation(tmp_path):
+    store = PackedImageStore(str(tmp_path / "store"), shard_size=10)
+    payloads = {path("a", i): bytes([i]) * 6 for i in range(1, 5)}
+    for image_path, data in payloads.items():
+        assert store.put(image_path, data) == hashlib.sha256(data).hexdigest()
+
+    for image_path, data in payloads.items():
+        view = store.get(image_path)
+        assert isinstance(view, memoryview) and bytes(view) == data
+    # 6-byte images never share a 10-byte shard
+    assert store.stats() == {"images": 4, "bytes": 24, "shards": 4}
+    assert store.get(path("a", 99)) is None
+    store.close()
+
+    reopened = PackedImageStore(str(tmp_path / "store"))
+    assert bytes(reopened.get(path("a", 3))) == payloads[path("a", 3)]
+    reopened.close()
+
+def test_writers_append_to_their_own_shards(tmp_path):
+    first = PackedImageStore(str(tmp_path / "store"))
+    second = PackedImageStore(str(tmp_path / "store"))
+    first.put(path("a", 1), b"one")
+    second.put(path("b", 1), b"two")
+    first.put(path("a", 2), b"three")
+    first.flush()
+    second.flush()
+
+    assert bytes(second.get(path("a", 2))) == b"three"
+    assert bytes(first.get(path("b", 1))) == b"two"
+    assert len([n for n in os.listdir(tmp_path / "store") if n.endswith(".pack")]) == 2
+    first.close()
+    second.close()
+
+def test_link_and_iter_paths(tmp_path):
+    store = PackedImageStore(str(tmp_path / "store"))
+    store.put(path("b", 2), b"x")
+    store.put(path("a", 10), b"original")
+    assert store.link(path("b", 1), path("a", 10))
+    assert not store.link(path("b", 3), path("a", 99))
+
+    assert bytes(store.get(path("b", 1))) == b"original"
+    assert store.stats()["bytes"] == len(b"x") + 2 * len(b"original")
+    assert list(store.iter_paths(batch_size=1)) == [path("a", 10), path("b", 1), path("b", 2)]
+    assert list(store.iter_paths("b")) == [path("b", 1), path("b", 2)]
+    store.close()
+
+def test_migrate_packs_links_and_deletes(tmp_path):
+    image_dir = tmp_path / "images"
+    (image_dir / "a").mkdir(parents=True)
+    (image_dir / "a" / "1.jpg").write_bytes(b"photo one")
+    (image_dir / "a" / "2.jpg").write_bytes(b"photo two")
+    os.link(image_dir / "a" / "1.jpg", image_dir / "a" / "3.jpg")  # A deduplicated repost
+    (image_dir / "a" / "notes.txt").write_text("not an image")
+    store_path = str(tmp_path / "store")
+
+    stats = migrate(str(image_dir), store_path)
+    assert (stats["packed"], stats["linked"], stats["skipped"]) == (2, 1, 0)
+    assert migrate(str(image_dir), store_path)["skipped"] == 3
+
+    stats = migrate(str(image_dir), store_path, delete=True)
+    assert stats["deleted"] == 3
+    assert sorted(os.listdir(image_dir / "a")) == ["notes.txt"]
+
+    store = PackedImageStore(store_path)
+    assert bytes(store.get(str(image_dir / "a" / "3.jpg"))) == b"photo one"
+    assert store.stats()["bytes"] == len(b"photo one") * 2 + len(b"photo two")
+    store.close()
@@ -0,0 +1,84 @@
+import json
+import asyncio
+import pytest
+from src import instrumentation
+from src.instrumentation import span, traced, record, label, incr, registry
+
+@pytest.fixture
+def metrics_log(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(instrumentation, "METRICS_LOG_PATH", str(path))
+    return path
+
+def _events(path):
+    instrumentation.flush()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_span_writes_json_line_with_counts(metrics_log):
+    with span("test.block", stage="load") as s:
+        record(rows=10)
+        record(rows=5, bytes=100)
+
+    event = _events(metrics_log)[0]
+    assert event["name"] == "test.block"
+    assert event["labels"] == {"stage": "load"}
+    assert event["status"] == "ok"
+    assert event["counts"] == {"rows": 15, "bytes": 100}
+    assert event["duration_seconds"] == round(s.duration, 6)
+
+def test_traced_sync_and_async_and_errors(metrics_log):
+    @traced("test.sync")
+    def work(n):
+        label(channel="@a")
+        record(items=n)
+        return n * 2
+
+    @traced("test.async")
+    async def fail():
+        raise ValueError("boom")
+
+    assert work(3) == 6
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+
+    sync_event, async_event = _events(metrics_log)
+    assert sync_event["labels"] == {"channel": "@a"} and sync_event["counts"] == {"items": 3}
+    assert async_event["status"] == "error" and "boom" in async_event["error"]
+
+def test_nested_spans_count_to_innermost(metrics_log):
+    with span("test.outer"):
+        with span("test.inner"):
+            record(rows=1)
+        record(rows=2)
+
+    inner, outer = _events(metrics_log)
+    assert inner["counts"] == {"rows": 1}
+    assert outer["counts"] == {"rows": 2}
+
+def test_prometheus_rendering(metrics_log):
+    with span("test.render", route='/api/"x"'):
+        record(rows=7)
+    incr("test.retries", channel="@b")
+
+    text = registry.render_prometheus()
+    assert 'pipeline_span_duration_seconds_count{span="test.render",route="/api/\\"x\\""} 1' in text
+    assert 'pipeline_events_total{event="test.render.rows",route="/api/\\"x\\""} 7' in text
+    assert 'pipeline_events_total{event="test.retries",channel="@b"} 1' in text
+
+def test_emit_does_not_write_on_the_calling_thread(metrics_log, monkeypatch):
+    import threading
+    writers = []
+    real_open = open
+
+    def tracking_open(path, *args, **kwargs):
+        if str(path) == str(metrics_log):
+            writers.append(threading.current_thread().name)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    for i in range(20):
+        with span("test.many", i=i % 2):
+            pass
+
+    assert len(_events(metrics_log)) == 20
+    assert writers and threading.current_thread().name not in writers
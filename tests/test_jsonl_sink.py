@@ -0,0 +1,47 @@
+import os
+import json
+from src.jsonl_sink import JsonlSink, iter_lake_records, is_channel_file
+
+def test_flushes_segment_every_batch(tmp_path):
+    sink = JsonlSink(str(tmp_path), "test", batch_size=2)
+    assert sink.write({"message_id": 1}) is None
+    flushed = sink.write({"message_id": 2})
+
+    assert [r["message_id"] for r in flushed] == [1, 2]
+    assert len(sink.segments) == 1
+    assert sink.write({"message_id": 3}) is None
+    assert [r["message_id"] for r in sink.close()] == [3]
+    assert len(sink.segments) == 2
+    # No temp files left behind once segments are renamed into place
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in sink.segments)
+
+def test_new_run_does_not_overwrite_previous_segments(tmp_path):
+    first = JsonlSink(str(tmp_path), "test", batch_size=10)
+    first.write({"message_id": 1})
+    first.close()
+    second = JsonlSink(str(tmp_path), "test", batch_size=10)
+    second.write({"message_id": 2})
+    second.close()
+
+    assert len(os.listdir(tmp_path)) == 2
+
+def test_gzip_round_trip(tmp_path):
+    sink = JsonlSink(str(tmp_path), "test", batch_size=10, compression="gzip")
+    records = [{"message_id": i, "message_text": "ሰላም"} for i in range(5)]
+    for record in records:
+        sink.write(record)
+    sink.close()
+
+    assert sink.segments[0].endswith(".jsonl.gz")
+    assert list(iter_lake_records(sink.segments[0])) == records
+
+def test_reads_legacy_json_arrays(tmp_path):
+    path = tmp_path / "test.json"
+    path.write_text(json.dumps([{"message_id": 1}, {"message_id": 2}]))
+    assert [r["message_id"] for r in iter_lake_records(str(path))] == [1, 2]
+
+def test_is_channel_file_matches_segments_and_legacy_files():
+    assert is_channel_file("CheMed123-1201a1b2-00001.jsonl", "@CheMed123")
+    assert is_channel_file("CheMed123.json", "@CheMed123")
+    assert not is_channel_file("CheMed1234-1201a1b2-00001.jsonl", "@CheMed123")
+    assert not is_channel_file("tikvahpharma-1201a1b2-00001.jsonl.gz", "@CheMed123")
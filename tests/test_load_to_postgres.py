@@ -0,0 +1,83 @@
+import os
+from scripts.load_to_postgres import messages_to_copy_buffer, _copy_value, needs_loading, file_content_hash, is_lake_file
+from scripts.load_to_postgres import engagement_to_copy_buffer, iter_pending_files
+
+def test_copy_value_escapes_text_format():
+    # Tabs/newlines/backslashes would otherwise break COPY's row framing
+    assert _copy_value("a\tb\nc\\d\r") == "a\\tb\\nc\\\\d\\r"
+    assert _copy_value(None) == "\\N"
+    assert _copy_value(True) == "t"
+    assert _copy_value(False) == "f"
+    assert _copy_value(42) == "42"
+
+def test_messages_to_copy_buffer_column_order():
+    msg = {
+        "message_id": 7,
+        "channel_name": "@test",
+        "message_date": "2026-01-01 10:00:00+00:00",
+        "message_text": "",
+        "has_media": False,
+        "image_path": None,
+        "views": 10,
+        "forwards": 2
+    }
+    lines = messages_to_copy_buffer([msg, msg]).read().splitlines()
+    assert len(lines) == 2
+    # Empty text must stay an empty string, distinct from NULL
+    assert lines[0].split("\t") == ["7", "@test", "2026-01-01 10:00:00+00:00", "", "f", "\\N", "10", "2"]
+
+def test_needs_loading_new_file(tmp_path):
+    f = tmp_path / "channel.json"
+    f.write_text("[]")
+    load, size, mtime, content_hash = needs_loading(str(f), None)
+    assert load is True
+    assert size == 2
+    assert content_hash == file_content_hash(str(f))
+
+def test_needs_loading_skips_unchanged_and_touched_files(tmp_path):
+    f = tmp_path / "channel.json"
+    f.write_text("[]")
+    _, size, mtime, content_hash = needs_loading(str(f), None)
+
+    # Same size and mtime: skipped without hashing
+    assert needs_loading(str(f), (size, mtime, content_hash))[0] is False
+
+    # Touched (new mtime) but identical content: still skipped
+    os.utime(f, (mtime + 10, mtime + 10))
+    load, _, new_mtime, _ = needs_loading(str(f), (size, mtime, content_hash))
+    assert load is False
+    assert new_mtime == mtime + 10
+
+def test_needs_loading_detects_changed_content(tmp_path):
+    f = tmp_path / "channel.json"
+    f.write_text("[]")
+    _, size, mtime, content_hash = needs_loading(str(f), None)
+
+    f.write_text('[{"message_id": 1}]')
+    assert needs_loading(str(f), (size, mtime, content_hash))[0] is True
+
+def test_is_lake_file_ignores_temp_segments():
+    assert is_lake_file("tikvahpharma.json")
+    assert is_lake_file("tikvahpharma-1030001a2b-00001.jsonl.gz")
+    assert not is_lake_file(".tikvahpharma-1030001a2b-00002.jsonl.tmp")
+    assert not is_lake_file("notes.txt")
+
+def test_engagement_to_copy_buffer_column_order():
+    snapshot = {"channel_name": "@test", "message_id": 7, "views": 1200, "forwards": 3,
+                "polled_at": "2026-01-02T10:00:00+00:00"}
+    lines = engagement_to_copy_buffer([snapshot]).read().splitlines()
+    assert lines == ["7\t@test\t1200\t3\t2026-01-02T10:00:00+00:00"]
+
+def test_iter_pending_files_filters_and_skips_manifest_entries(tmp_path):
+    for folder, name in [("2026-01-01", "test-1-00001.jsonl"), ("2026-01-02", "test-2-00001.jsonl"),
+                         ("2026-01-02", "other-2-00001.jsonl"), ("2026-01-02", ".test-2-00002.jsonl.tmp")]:
+        (tmp_path / folder).mkdir(exist_ok=True)
+        (tmp_path / folder / name).write_text("{}\n")
+    loaded = str(tmp_path / "2026-01-01" / "test-1-00001.jsonl")
+    _, size, mtime, content_hash = needs_loading(loaded, None)
+    stats = {"files_skipped": 0}
+
+    pending = [p for p, *_ in iter_pending_files(None, str(tmp_path), {loaded: (size, mtime, content_hash)}, stats, channel="@test")]
+
+    assert pending == [str(tmp_path / "2026-01-02" / "test-2-00001.jsonl")]
+    assert stats["files_skipped"] == 1
@@ -0,0 +1,39 @@
+import csv
+import io
+from scripts.load_yolo_to_postgres import CsvRowStream, loaded_path
+
+ROWS = [
+    ["data/raw/images/chan/1.jpg", "chan", "1", "person|bottle", "0.85|0.90", "Promotional"],
+    ["data/raw/images/chan/2.jpg", "chan", "2", 'box, "large"', "0.92", "Product Display"],
+]
+
+def test_csv_row_stream_round_trips_rows():
+    stream = CsvRowStream(iter(ROWS))
+    assert list(csv.reader(io.StringIO(stream.read()))) == ROWS
+    assert stream.read() == ""
+
+def test_csv_row_stream_honours_read_size():
+    # COPY reads in fixed-size chunks; reassembled chunks must equal the full CSV
+    expected = CsvRowStream(ROWS).read()
+    stream = CsvRowStream(ROWS)
+    chunks = []
+    while True:
+        chunk = stream.read(7)
+        if not chunk:
+            break
+        assert len(chunk) <= 7
+        chunks.append(chunk)
+    assert "".join(chunks) == expected
+
+def test_csv_row_stream_is_lazy():
+    consumed = []
+    def rows():
+        for row in ROWS:
+            consumed.append(row)
+            yield row
+    stream = CsvRowStream(rows())
+    stream.read(1)
+    assert len(consumed) == 1
+
+def test_loaded_path():
+    assert loaded_path("data/processed/yolo_detections.csv") == "data/processed/yolo_detections.loaded.csv"
@@ -0,0 +1,136 @@
+import os
+import asyncio
+from unittest.mock import MagicMock
+from src.media_downloader import MediaDownloader
+
+class FakeClient:
+    """Writes a fixed payload instead of talking to Telegram."""
+    def __init__(self, payload=b"jpeg-bytes", fail_on=None):
+        self.payload = payload
+        self.fail_on = fail_on
+        self.calls = []
+
+    async def download_media(self, media, file):
+        self.calls.append(file)
+        await asyncio.sleep(0)
+        if file == self.fail_on:
+            raise RuntimeError("boom")
+        with open(file, "wb") as f:
+            f.write(self.payload)
+        return file
+
+def run_downloads(client, paths, expected_size=None, workers=3, queue_size=2):
+    async def _run():
+        downloader = MediaDownloader(client, "@test", workers=workers, queue_size=queue_size)
+        await downloader.start()
+        for path in paths:
+            await downloader.submit(MagicMock(), path, expected_size)
+        return await downloader.close()
+    return asyncio.run(_run())
+
+def test_downloads_all_queued_photos(tmp_path):
+    client = FakeClient()
+    paths = [str(tmp_path / f"{i}.jpg") for i in range(10)]
+    stats = run_downloads(client, paths)
+
+    assert sorted(client.calls) == sorted(paths)
+    assert stats["downloaded"] == 10
+    assert stats["bytes"] == 10 * len(client.payload)
+
+def test_skips_existing_file_with_expected_size(tmp_path):
+    client = FakeClient()
+    existing = tmp_path / "1.jpg"
+    existing.write_bytes(b"jpeg-bytes")
+    partial = tmp_path / "2.jpg"
+    partial.write_bytes(b"jpeg")
+
+    stats = run_downloads(client, [str(existing), str(partial)], expected_size=len(b"jpeg-bytes"))
+
+    # Only the truncated file is fetched again
+    assert client.calls == [str(partial)]
+    assert stats["skipped"] == 1
+    assert stats["downloaded"] == 1
+
+def test_failed_download_does_not_stop_the_pool(tmp_path):
+    paths = [str(tmp_path / f"{i}.jpg") for i in range(4)]
+    client = FakeClient(fail_on=paths[1])
+    stats = run_downloads(client, paths)
+
+    assert stats["failed"] == 1
+    assert stats["downloaded"] == 3
+
+def test_reposts_are_indexed_but_only_exact_copies_linked(tmp_path):
+    import io
+    import pytest
+    Image = pytest.importorskip("PIL.Image")
+    from src.image_dedup import ImageIndex
+
+    def jpeg(quality):
+        buffer = io.BytesIO()
+        image = Image.new("L", (64, 48))
+        image.putdata([(x * 4 + y * 2) % 256 for y in range(48) for x in range(64)])
+        image.save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    index = ImageIndex(str(tmp_path / "index.sqlite"))
+    first, repost, copy = str(tmp_path / "1.jpg"), str(tmp_path / "2.jpg"), str(tmp_path / "3.jpg")
+
+    async def _run():
+        totals = {"duplicates": 0, "bytes_deduplicated": 0}
+        for path, payload in ((first, jpeg(90)), (repost, jpeg(50)), (copy, jpeg(90))):
+            downloader = MediaDownloader(FakeClient(payload), "@test", workers=1, dedup=index)
+            await downloader.start()
+            await downloader.submit(MagicMock(), path, len(payload))
+            stats = await downloader.close()
+            for key in totals:
+                totals[key] += stats[key]
+        return totals
+    stats = asyncio.run(_run())
+
+    assert stats == {"duplicates": 2, "bytes_deduplicated": len(jpeg(90))}
+    assert index.canonical_for(repost) == first and index.canonical_for(copy) == first
+    # The near-duplicate keeps its own bytes; only the identical copy shares them
+    assert not os.path.samefile(first, repost)
+    with open(repost, "rb") as f:
+        assert f.read() == jpeg(50)
+    assert os.path.samefile(first, copy)
+
+    # An indexed repost is not downloaded again although its size no longer matches
+    client = FakeClient(jpeg(50))
+    async def _rerun():
+        downloader = MediaDownloader(client, "@test", dedup=index)
+        await downloader.start()
+        await downloader.submit(MagicMock(), repost, len(jpeg(50)))
+        return await downloader.close()
+    stats = asyncio.run(_rerun())
+    index.close()
+    assert client.calls == [] and stats["skipped"] == 1
+
+def test_downloads_into_packed_store(tmp_path):
+    from src.image_store import PackedImageStore
+
+    class BytesClient(FakeClient):
+        async def download_media(self, media, file):
+            self.calls.append(file)
+            return self.payload
+
+    store = PackedImageStore(str(tmp_path / "store"))
+    paths = [os.path.join("data", "raw", "images", "test", f"{i}.jpg") for i in range(3)]
+
+    async def _run(client):
+        downloader = MediaDownloader(client, "@test", workers=2, store=store)
+        await downloader.start()
+        for image_path in paths:
+            await downloader.submit(MagicMock(), image_path, 10)
+        return await downloader.close()
+
+    client = BytesClient()
+    stats = asyncio.run(_run(client))
+    assert client.calls == [bytes] * 3 and stats["downloaded"] == 3
+    assert all(bytes(store.get(p)) == client.payload for p in paths)
+    assert not os.path.exists(os.path.join("data", "raw", "images", "test"))
+
+    # Already packed images are not fetched again
+    client = BytesClient()
+    assert asyncio.run(_run(client))["skipped"] == 3 and client.calls == []
+    store.close()
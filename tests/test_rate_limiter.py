@@ -0,0 +1,39 @@
+import time
+import asyncio
+from src.rate_limiter import RateLimiter
+
+def test_burst_then_rate_limited():
+    async def _run():
+        limiter = RateLimiter(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+        return limiter, time.monotonic() - started
+
+    limiter, elapsed = asyncio.run(_run())
+    # 2 requests fit the burst, the other 2 wait ~1/20s each
+    assert elapsed >= 0.09
+    assert limiter.metrics["requests"] == 4
+    assert limiter.metrics["wait_seconds"] > 0
+
+def test_pause_blocks_all_callers():
+    async def _run():
+        limiter = RateLimiter(rate=1000, burst=100)
+        limiter.pause(0.1)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+        return limiter, time.monotonic() - started
+
+    limiter, elapsed = asyncio.run(_run())
+    assert elapsed >= 0.09
+    assert limiter.metrics["flood_waits"] == 1
+    assert limiter.metrics["flood_wait_seconds"] == 0.1
+
+def test_zero_rate_is_unlimited():
+    async def _run():
+        limiter = RateLimiter(rate=0)
+        for _ in range(100):
+            await limiter.acquire()
+        return limiter
+
+    assert asyncio.run(_run()).metrics["requests"] == 100
@@ -1,8 +1,11 @@
 import pytest
 import os
 import json
+import asyncio
+from datetime import date, datetime, timezone
+from telethon import errors
 from unittest.mock import MagicMock, AsyncMock
-from src.scraper import TelegramScraper
+from src.scraper import TelegramScraper, backfill_windows, refresh_batches
 
 @pytest.fixture
 def scraper():
@@ -28,8 +31,382 @@ def test_save_checkpoints(tmp_path):
         data = json.load(f)
     assert data == {"@test": 123}
 
+def test_save_checkpoints_keeps_newer_ids_on_disk(tmp_path):
+    # Another process (e.g. a backfill shard) advanced the file after this one loaded it
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    with open(scraper.checkpoints_file, "w") as f:
+        json.dump({"@test": 500, "@other": 40}, f)
+    scraper.checkpoints = {"@test": 300, "@other": 20, "@mine": 7}
+
+    scraper.commit_batch("@other", [{"message_id": 30}])
+
+    with open(scraper.checkpoints_file) as f:
+        assert json.load(f) == {"@test": 500, "@other": 40, "@mine": 7}
+    assert scraper.checkpoints == {"@test": 500, "@other": 40, "@mine": 7}
+
 @pytest.mark.asyncio
 async def test_scrape_channel_logic():
     # This is a bit complex as it involves mocking Telethon iter_messages
     # but we can mock the entire run process for logic validation
     pass
+
+def test_commit_batch_advances_checkpoint(tmp_path):
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {"@test": 10}
+
+    scraper.commit_batch("@test", None)
+    assert not os.path.exists(scraper.checkpoints_file)
+
+    scraper.commit_batch("@test", [{"message_id": 11}, {"message_id": 15}])
+    with open(scraper.checkpoints_file, 'r') as f:
+        assert json.load(f) == {"@test": 15}
+
+def test_flood_wait_pauses_and_resumes_channel():
+    scraper = TelegramScraper()
+    calls = []
+
+    async def fake_scrape(channel_username, day=None):
+        calls.append(channel_username)
+        if len(calls) == 1:
+            raise errors.FloodWaitError(request=None, capture=0)
+
+    scraper.scrape_channel = fake_scrape
+
+    async def _run():
+        await scraper.scrape_with_retries("@test", asyncio.Semaphore(1))
+
+    asyncio.run(_run())
+    assert calls == ["@test", "@test"]
+    assert scraper.limiter.metrics["flood_waits"] == 1
+
+def test_scrape_channel_day_window(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {"@test": 99}
+
+    def message(message_id, day, hour):
+        return MagicMock(
+            id=message_id, date=datetime(2026, 1, day, hour, tzinfo=timezone.utc),
+            text=f"msg {message_id}", photo=None, views=1, forwards=0
+        )
+
+    seen_kwargs = {}
+
+    async def iter_messages(entity, **kwargs):
+        seen_kwargs.update(kwargs)
+        for m in [message(1, 2, 0), message(2, 2, 23), message(3, 3, 0)]:
+            yield m
+
+    scraper.client = MagicMock(get_entity=AsyncMock(return_value=MagicMock(title="Test")))
+    scraper.client.iter_messages = iter_messages
+
+    asyncio.run(scraper.scrape_channel("@test", day=date(2026, 1, 2)))
+
+    assert seen_kwargs["offset_date"] == datetime(2026, 1, 2, tzinfo=timezone.utc)
+    assert "min_id" not in seen_kwargs
+    folder = tmp_path / "raw" / "2026-01-02"
+    lines = [json.loads(l) for f in folder.iterdir() for l in f.read_text().splitlines()]
+    assert [m["message_id"] for m in lines] == [1, 2]
+    # Day scrapes never move the incremental checkpoint
+    assert scraper.checkpoints == {"@test": 99}
+    assert not os.path.exists(scraper.checkpoints_file)
+
+def test_first_scrape_starts_from_newest_messages(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {}
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 2, tzinfo=timezone.utc), text="x", photo=None, views=0, forwards=0)
+        for i in range(1, 101)
+    ]
+    seen_kwargs = []
+
+    async def iter_messages(entity, min_id=0, limit=None, **kwargs):
+        seen_kwargs.append(dict(min_id=min_id, limit=limit, **kwargs))
+        for m in [m for m in messages if m.id > min_id][:limit]:
+            yield m
+
+    scraper.client = MagicMock(
+        get_entity=AsyncMock(return_value=MagicMock(title="Test")),
+        get_messages=AsyncMock(return_value=[messages[-1]]),
+    )
+    scraper.client.iter_messages = iter_messages
+
+    asyncio.run(scraper.scrape_channel("@test", limit=10))
+
+    # Without a checkpoint the window sits just below the latest message
+    assert seen_kwargs == [{"min_id": 90, "limit": 10, "reverse": True}]
+    assert scraper.checkpoints == {"@test": 100}
+
+    # Later runs resume from the checkpoint without looking up the latest message
+    scraper.client.get_messages.reset_mock()
+    asyncio.run(scraper.scrape_channel("@test", limit=10))
+    assert seen_kwargs[-1]["min_id"] == 100
+    scraper.client.get_messages.assert_not_called()
+
+def test_checkpoint_waits_for_photos_and_failed_ones_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.SINK_BATCH_SIZE", 2)
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.failed_downloads_file = str(tmp_path / "failed_downloads.json")
+    scraper.checkpoints = {"@test": 0}
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 2, tzinfo=timezone.utc), text="x", views=0, forwards=0,
+                  photo=f"photo-{i}", file=MagicMock(size=3))
+        for i in range(1, 5)
+    ]
+    downloaded = []
+    committed = []
+
+    async def iter_messages(entity, min_id=0, **kwargs):
+        for m in messages:
+            if m.id > min_id:
+                yield m
+
+    async def download_media(media, file=None):
+        await asyncio.sleep(0)
+        if media == "photo-2" and not downloaded.count("photo-2-failed"):
+            downloaded.append("photo-2-failed")
+            raise ConnectionError("reset")
+        downloaded.append(media)
+        with open(file, "wb") as f:
+            f.write(b"jpg")
+
+    def commit_batch(channel, batch, original=scraper.commit_batch):
+        # Every photo of a committed batch has been attempted
+        ids = {msg["message_id"] for msg in batch}
+        assert all(f"photo-{i}" in downloaded or i == 2 for i in ids)
+        if ids:
+            committed.append(sorted(ids))
+        original(channel, batch)
+
+    scraper.commit_batch = commit_batch
+    scraper.client = MagicMock(
+        get_entity=AsyncMock(return_value=MagicMock(title="Test")),
+        get_messages=AsyncMock(return_value=[messages[1]]),
+        download_media=download_media,
+    )
+    scraper.client.iter_messages = iter_messages
+
+    asyncio.run(scraper.scrape_channel("@test"))
+    assert committed == [[1, 2], [3, 4]]
+    assert scraper.checkpoints == {"@test": 4}
+    with open(scraper.failed_downloads_file) as f:
+        assert json.load(f) == {"@test": [2]}
+
+    # The next scrape fetches the failed photo again and clears it from the list
+    asyncio.run(scraper.scrape_channel("@test"))
+    assert scraper.client.get_messages.call_args.kwargs["ids"] == [2]
+    assert downloaded.count("photo-2") == 1
+    with open(scraper.failed_downloads_file) as f:
+        assert json.load(f) == {}
+
+def test_progress_reported_per_batch_and_on_completion(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.SINK_BATCH_SIZE", 2)
+    events = []
+    scraper = TelegramScraper(on_progress=lambda channel, stats: events.append((channel, stats)))
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {}
+
+    async def iter_messages(entity, **kwargs):
+        for i in range(1, 4):
+            yield MagicMock(id=i, date=datetime(2026, 1, 2, tzinfo=timezone.utc), text="x", photo=None, views=0, forwards=0)
+
+    scraper.client = MagicMock(
+        get_entity=AsyncMock(return_value=MagicMock(title="Test")),
+        get_messages=AsyncMock(return_value=[MagicMock(id=3)]),
+    )
+    scraper.client.iter_messages = iter_messages
+
+    stats = asyncio.run(scraper.scrape_channel("@test"))
+
+    assert [e[1]["messages"] for e in events if not e[1]["done"]] == [2, 3]
+    channel, final = events[-1]
+    assert channel == "@test"
+    assert final["done"] and final["error"] is None
+    assert final["messages"] == 3 and final["segments"] == 2
+    assert stats == final
+
+def test_scrape_error_is_reported(tmp_path):
+    events = []
+    scraper = TelegramScraper(on_progress=lambda channel, stats: events.append(stats))
+    scraper.client = MagicMock(get_entity=AsyncMock(side_effect=ValueError("no such channel")))
+
+    stats = asyncio.run(scraper.scrape_channel("@missing"))
+
+    assert stats["error"] == "no such channel"
+    assert stats["done"] and events[-1]["done"]
+
+def test_backfill_windows_are_aligned():
+    assert backfill_windows(1, 12, 5) == [(1, 5), (6, 10), (11, 15)]
+    # Resuming from a checkpoint maps onto the same window boundaries
+    assert backfill_windows(8, 12, 5) == [(6, 10), (11, 15)]
+    assert backfill_windows(13, 12, 5) == []
+
+def backfill_client(messages, calls):
+    async def iter_messages(entity, min_id=0, max_id=0, **kwargs):
+        calls.append((min_id, max_id))
+        for m in messages:
+            if min_id < m.id < max_id:
+                await asyncio.sleep(0)
+                yield m
+
+    client = MagicMock(
+        get_entity=AsyncMock(return_value=MagicMock(title="Test")),
+        get_messages=AsyncMock(return_value=[messages[-1]]),
+    )
+    client.iter_messages = iter_messages
+    return client
+
+def test_backfill_channel_scrapes_windows_into_date_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.BACKFILL_DIR", str(tmp_path / "backfill"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {"@test": 3}
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 1 + i // 5, tzinfo=timezone.utc), text=f"m{i}", photo=None, views=i, forwards=0)
+        for i in range(1, 13)
+    ]
+    calls = []
+    scraper.client = backfill_client(messages, calls)
+
+    stats = asyncio.run(scraper.backfill_channel("@test", window_size=5, concurrency=2))
+
+    # The first window starts after the checkpoint; bounds are exclusive
+    assert sorted(calls) == [(3, 6), (5, 11), (10, 16)]
+    by_folder = {
+        folder.name: sorted(json.loads(l)["message_id"] for f in folder.iterdir() for l in f.read_text().splitlines())
+        for folder in (tmp_path / "raw").iterdir()
+    }
+    assert by_folder == {"2026-01-01": [4], "2026-01-02": [5, 6, 7, 8, 9], "2026-01-03": [10, 11, 12]}
+    assert stats["messages"] == 9 and stats["done"] and stats["error"] is None
+    with open(tmp_path / "backfill" / "test" / "6-10.json") as f:
+        assert json.load(f) == {"last_id": 10, "messages": 5, "done": True}
+    assert scraper.checkpoints == {"@test": 12}
+
+def test_backfill_resumes_windows_and_skips_done(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.BACKFILL_DIR", str(tmp_path / "backfill"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {}
+    scraper.save_window_checkpoint("@test", 1, 5, {"last_id": 5, "messages": 5, "done": True})
+    scraper.save_window_checkpoint("@test", 6, 10, {"last_id": 7, "messages": 2, "done": False})
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 1, tzinfo=timezone.utc), text="x", photo=None, views=0, forwards=0)
+        for i in range(1, 11)
+    ]
+    calls = []
+    scraper.client = backfill_client(messages, calls)
+
+    stats = asyncio.run(scraper.backfill_channel("@test", window_size=5))
+
+    assert calls == [(7, 11)]
+    assert stats["messages"] == 3
+    assert scraper.checkpoints == {"@test": 10}
+
+def test_backfill_picks_up_ids_posted_after_previous_backfill(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.BACKFILL_DIR", str(tmp_path / "backfill"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {}
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 1, tzinfo=timezone.utc), text="x", photo=None, views=0, forwards=0)
+        for i in range(1, 21)
+    ]
+    calls = []
+    scraper.client = backfill_client(messages[:12], calls)
+    asyncio.run(scraper.backfill_channel("@test", window_size=5))
+    assert scraper.checkpoints == {"@test": 12}
+    # The top window is only partly filled, so it must stay open
+    assert scraper.load_window_checkpoint("@test", 11, 15) == {"last_id": 12, "messages": 2, "done": False}
+
+    # The channel grows to 20 messages before the next backfill
+    calls.clear()
+    scraper.client = backfill_client(messages, calls)
+    stats = asyncio.run(scraper.backfill_channel("@test", window_size=5))
+
+    assert sorted(calls) == [(12, 16), (15, 21)]
+    assert stats["messages"] == 8
+    ids = sorted(
+        json.loads(l)["message_id"] for f in (tmp_path / "raw").rglob("*.jsonl") for l in f.read_text().splitlines()
+    )
+    assert ids == list(range(1, 21))
+    assert scraper.checkpoints == {"@test": 20}
+
+def test_backfill_shard_leaves_checkpoint_until_all_windows_done(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr("src.scraper.IMAGE_DATA_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr("src.scraper.BACKFILL_DIR", str(tmp_path / "backfill"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    scraper.checkpoints = {}
+
+    messages = [
+        MagicMock(id=i, date=datetime(2026, 1, 1, tzinfo=timezone.utc), text="x", photo=None, views=0, forwards=0)
+        for i in range(1, 11)
+    ]
+    calls = []
+    scraper.client = backfill_client(messages, calls)
+
+    asyncio.run(scraper.backfill_channel("@test", window_size=5, shard=1, shards=2))
+
+    assert calls == [(5, 11)]
+    assert scraper.checkpoints == {}
+
+def test_refresh_batches_cover_recent_ids_newest_first():
+    assert refresh_batches(12, window=5, batch_size=2) == [[12, 11], [10, 9], [8]]
+    # A window reaching past the first message stops at id 1
+    assert refresh_batches(3, window=10, batch_size=100) == [[3, 2, 1]]
+    assert refresh_batches(0) == []
+
+def test_refresh_engagement_polls_ids_and_writes_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.scraper.ENGAGEMENT_DATA_PATH", str(tmp_path / "engagement"))
+    scraper = TelegramScraper()
+    scraper.checkpoints_file = str(tmp_path / "checkpoints.json")
+    # Date-mode scrapes leave the checkpoint behind; the window follows the latest message
+    scraper.checkpoints = {"@test": 1}
+
+    requested = []
+    async def get_messages(entity, ids=None, limit=None):
+        if ids is None:
+            return [MagicMock(id=5)]
+        requested.append(ids)
+        # Id 4 was deleted
+        return [None if i == 4 else MagicMock(id=i, views=i * 100, forwards=i) for i in ids]
+    scraper.client = MagicMock(get_entity=AsyncMock(return_value=MagicMock()), get_messages=get_messages)
+
+    stats = asyncio.run(scraper.refresh_engagement("@test", window=4, batch_size=3))
+
+    assert requested == [[5, 4, 3], [2]]
+    records = [
+        json.loads(line)
+        for f in (tmp_path / "engagement").rglob("*.jsonl") for line in f.read_text().splitlines()
+    ]
+    assert sorted((r["message_id"], r["views"], r["forwards"]) for r in records) == [
+        (2, 200, 2), (3, 300, 3), (5, 500, 5)
+    ]
+    assert all(r["channel_name"] == "@test" and r["polled_at"] for r in records)
+    assert stats["messages"] == 3 and stats["done"] and stats["error"] is None
+    # Refreshing never moves the checkpoint
+    assert scraper.checkpoints == {"@test": 1}
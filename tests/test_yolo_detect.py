@@ -0,0 +1,99 @@
+import os
+import sys
+import importlib
+import subprocess
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+@pytest.fixture
+def yolo_detect(tmp_path, monkeypatch):
+    # The module creates its data/ and logs/ folders on import, so import it from a scratch cwd
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(SRC_DIR)
+    return importlib.import_module("yolo_detect")
+
+def test_mock_is_deterministic_and_path_normalised(yolo_detect):
+    path = os.path.join("data", "raw", "images", "chan", "1.jpg")
+    assert yolo_detect.classify_image_mock(path) == yolo_detect.classify_image_mock(path)
+    assert yolo_detect.classify_image_mock(path) == yolo_detect.classify_image_mock("data/raw/images/chan/./1.jpg")
+
+def test_mock_does_not_touch_global_random_state(yolo_detect):
+    import random
+    random.seed(123)
+    expected = random.random()
+    random.seed(123)
+    yolo_detect.classify_image_mock("data/raw/images/chan/1.jpg")
+    assert random.random() == expected
+
+def test_mock_is_stable_across_interpreters(tmp_path):
+    code = (
+        "from yolo_detect import classify_image_mock;"
+        "print([classify_image_mock(f'data/raw/images/c/{i}.jpg')[0] for i in range(20)])"
+    )
+    outputs = set()
+    for hash_seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": hash_seed, "PYTHONPATH": SRC_DIR}
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                                capture_output=True, text=True, check=True)
+        outputs.add(result.stdout)
+    assert len(outputs) == 1
+
+def test_main_streams_rows_to_sink_without_csv(yolo_detect):
+    image_dir = os.path.join("data", "raw", "images", "chan")
+    os.makedirs(image_dir)
+    for i in range(5):
+        with open(os.path.join(image_dir, f"{i}.jpg"), "wb") as f:
+            f.write(bytes([i]) * 10)
+
+    received = []
+    def sink(rows):
+        received.extend(rows)
+        return {"rows_read": len(received)}
+
+    stats = yolo_detect.main(batch_size=2, workers=1, sink=sink)
+    assert stats["load"] == {"rows_read": 5}
+    assert sorted(row[2] for row in received) == ["0", "1", "2", "3", "4"]
+    assert all(row[1] == "chan" for row in received)
+    assert not os.path.exists(yolo_detect.OUTPUT_CSV)
+
+    # Committed as exported, so a second run has nothing to send
+    received.clear()
+    assert yolo_detect.main(batch_size=2, workers=1, sink=sink)["unchanged"] == 5
+    assert received == []
+
+def test_failed_sink_leaves_rows_unexported(yolo_detect):
+    image_dir = os.path.join("data", "raw", "images", "chan")
+    os.makedirs(image_dir)
+    with open(os.path.join(image_dir, "1.jpg"), "wb") as f:
+        f.write(b"x")
+
+    with pytest.raises(yolo_detect.SinkError):
+        yolo_detect.main(workers=1, sink=lambda rows: list(rows) and None)
+    received = []
+    yolo_detect.main(workers=1, sink=lambda rows: received.extend(rows) or {"rows_read": len(received)})
+    assert len(received) == 1
+
+def test_identical_and_reposted_images_are_inferred_once(yolo_detect):
+    from image_dedup import ImageIndex
+    image_dir = os.path.join("data", "raw", "images", "chan")
+    os.makedirs(image_dir)
+    for name, payload in (("1.jpg", b"original"), ("2.jpg", b"original"), ("3.jpg", b"reposted")):
+        with open(os.path.join(image_dir, name), "wb") as f:
+            f.write(payload)
+
+    stats = yolo_detect.main(workers=1, sink=lambda rows: {"rows": len(list(rows))})
+    assert stats["inferred"] == 2 and stats["cache_hits"] == 1 and stats["load"] == {"rows": 3}
+
+    # A repost recorded in the scraper's index reuses its original's cached detection
+    with open(os.path.join(image_dir, "4.jpg"), "wb") as f:
+        f.write(b"reposted again, re-encoded")
+    index = ImageIndex(yolo_detect.IMAGE_INDEX_PATH)
+    original = os.path.join(image_dir, "3.jpg")
+    index.conn.execute("INSERT INTO images VALUES (?, '@chan', '0', ?)", (original, original))
+    index.conn.execute("INSERT INTO images VALUES (?, '@chan', '1', ?)", (os.path.join(image_dir, "4.jpg"), original))
+    index.conn.commit()
+    index.close()
+
+    stats = yolo_detect.main(workers=1, sink=lambda rows: {"rows": len(list(rows))})
+    assert stats["inferred"] == 0 and stats["duplicate_hits"] == 1 and stats["load"] == {"rows": 1}